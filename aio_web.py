@@ -0,0 +1,182 @@
+import asyncio
+import jinja2
+from aiohttp import web
+from typing import Callable, Dict, List, Optional
+from dashboard import Dashboard
+from faction_manager import FactionManager
+from live_feed import HEARTBEAT_INTERVAL
+from metrics import REGISTRY
+
+
+class AioWebServer:
+    """Tableau de bord et keep-alive servis par aiohttp sur la boucle du bot.
+
+    Remplace les deux serveurs Flask lancés dans des threads : mêmes routes,
+    mêmes gabarits, mais aucun thread supplémentaire. Les pages lisent
+    directement l'instantané publié par le stockage du bot. Le tableau de
+    bord écoute sur `port` et le keep-alive sur `keep_alive_port`.
+
+    Le keep-alive (/, /health, /metrics) peut démarrer seul, dès le
+    lancement du bot ; le tableau de bord s'y ajoute quand le serveur
+    Discord affiché est connu.
+    """
+
+    def __init__(self, manager: Optional[FactionManager] = None, host: str = "0.0.0.0", port: int = 5000,
+                 keep_alive_port: int = 8080, template_folder: str = "templates"):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.keep_alive_port = keep_alive_port
+        self.dashboard: Optional[Dashboard] = Dashboard(manager) if manager is not None else None
+        self.templates = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(template_folder),
+            autoescape=jinja2.select_autoescape(["html"])
+        )
+        self._runners: List[web.AppRunner] = []
+
+    def render(self, template: str, context: Dict) -> str:
+        return self.templates.get_template(template).render(**context)
+
+    # Routes
+
+    def cached_page(self, request: web.Request, name: str, render: Callable[[], str]) -> web.Response:
+        """Sert une page rendue une seule fois par version des données, avec ETag, 304 et gzip"""
+        page = self.dashboard.cached(name, render)
+        tags = request.if_none_match
+        if_none_match = (lambda etag: any(tag.value in (etag, "*") for tag in tags)) if tags else None
+        if self.dashboard.is_not_modified(page, if_none_match, request.if_modified_since):
+            response = web.Response(status=304)
+        elif "gzip" in request.headers.get("Accept-Encoding", ""):
+            response = web.Response(body=page.gzip_body, content_type="text/html", charset="utf-8")
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = web.Response(body=page.body, content_type="text/html", charset="utf-8")
+        response.headers["ETag"] = f'"{page.etag}"'
+        response.last_modified = self.dashboard.last_modified(page)
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    async def home(self, request: web.Request) -> web.Response:
+        return self.cached_page(request, "index", lambda: self.render("index.html", self.dashboard.home_context()))
+
+    async def factions(self, request: web.Request) -> web.Response:
+        return self.cached_page(
+            request,
+            "factions?" + request.query_string,
+            lambda: self.render("factions.html", self.dashboard.factions_context(request.query))
+        )
+
+    async def api_factions(self, request: web.Request) -> web.Response:
+        try:
+            return web.json_response(self.dashboard.factions_json(request.query))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+    async def classement(self, request: web.Request) -> web.Response:
+        return self.cached_page(
+            request,
+            "classement?" + request.query_string,
+            lambda: self.render("classement.html", self.dashboard.leaderboard_context(request.query))
+        )
+
+    async def api_classement(self, request: web.Request) -> web.Response:
+        try:
+            return web.json_response(self.dashboard.leaderboard_json(request.query))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+    async def api_quote(self, request: web.Request) -> web.Response:
+        try:
+            return web.json_response(self.dashboard.quote_json(request.query))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+    async def stream(self, request: web.Request) -> web.StreamResponse:
+        """Flux Server-Sent Events des modifications de factions"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        subscription = self.dashboard.feed.subscribe_async()
+        try:
+            await response.write(b"retry: 3000\n\n")
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    await response.write(b": ping\n\n")
+                    continue
+                if message is None:
+                    break
+                await response.write(message.encode("utf-8"))
+        except ConnectionResetError:
+            pass
+        finally:
+            self.dashboard.feed.unsubscribe(subscription)
+        return response
+
+    async def health(self, request: web.Request) -> web.Response:
+        if self.dashboard is None:
+            # Keep-alive démarré, serveur Discord du tableau de bord pas encore connu
+            return web.json_response({"status": "ok", "dashboard": False})
+        return web.json_response(self.dashboard.health())
+
+    async def keep_alive(self, request: web.Request) -> web.Response:
+        return web.Response(text="Le bot est actif")
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        response = web.Response(text=REGISTRY.render())
+        response.headers["Content-Type"] = REGISTRY.CONTENT_TYPE
+        return response
+
+    # Cycle de vie
+
+    def dashboard_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/", self.home)
+        app.router.add_get("/factions", self.factions)
+        app.router.add_get("/api/factions", self.api_factions)
+        app.router.add_get("/classement", self.classement)
+        app.router.add_get("/api/classement", self.api_classement)
+        app.router.add_get("/api/quote", self.api_quote)
+        app.router.add_get("/api/stream", self.stream)
+        app.router.add_get("/health", self.health)
+        return app
+
+    def keep_alive_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/", self.keep_alive)
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/metrics", self.metrics)
+        return app
+
+    async def _serve(self, app: web.Application, port: int):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, port).start()
+        self._runners.append(runner)
+
+    async def start_keep_alive(self):
+        """Démarre le keep-alive (et /metrics) sur la boucle courante, sans attendre le tableau de bord"""
+        await self._serve(self.keep_alive_app(), self.keep_alive_port)
+        print(f"Serveur keep_alive (aiohttp) démarré sur le port {self.keep_alive_port}")
+
+    async def start_dashboard(self, manager: Optional[FactionManager] = None):
+        """Démarre le tableau de bord sur les données de `manager` (ou de celui donné à la construction)"""
+        if manager is not None:
+            self.manager = manager
+            self.dashboard = Dashboard(manager)
+        await self._serve(self.dashboard_app(), self.port)
+        self.dashboard.feed.start()
+        print(f"Interface web (aiohttp) démarrée sur http://{self.host}:{self.port}")
+
+    async def start(self):
+        """Démarre les deux serveurs sur la boucle courante"""
+        await self.start_keep_alive()
+        await self.start_dashboard()
+
+    async def stop(self):
+        if self.dashboard is not None:
+            self.dashboard.feed.stop()
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners = []
@@ -0,0 +1,232 @@
+"""Banc d'essai de FactionManager et des commandes de main.py, sans réseau.
+
+Génère un serveur factice avec N factions et M membres, exécute une charge
+mixte (transferts, constructions, lectures de solde, adhésions...) et
+affiche le débit, les latences p50/p99 par opération et les octets écrits
+par le stockage. Les résultats peuvent être enregistrés comme référence ;
+une exécution suivante échoue (code 1) si elle régresse au-delà de la
+tolérance.
+
+Usage (depuis la racine du dépôt) :
+    python -m benchmarks.bench --factions 200 --members 2000 --operations 5000
+    python -m benchmarks.bench --save-baseline
+    python -m benchmarks.bench --member-cache lean
+    python -m benchmarks.bench --backend binary
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fakes import FakeContext, FakeGuild, FakeInteraction  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Opération -> poids dans la charge mixte
+WORKLOAD = {
+    "solde": 30,
+    "transferer": 25,
+    "ressources": 15,
+    "transfererressource": 10,
+    "construire": 10,
+    "rejoindre": 10,
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def run(args) -> Dict:
+    # Importé ici : main.py lit l'emplacement des données à l'import
+    import main
+    from metrics import STORAGE_BYTES
+
+    rng = random.Random(args.seed)
+    main.job_queue.start()
+    guild = FakeGuild(api_latency=args.api_latency)
+    # Serveur chargé comme par une commande, et gardé en mémoire pendant tout le banc
+    manager = await main.guilds.acquire(guild)
+    latencies: Dict[str, List[float]] = {}
+    rejected: Dict[str, int] = {}
+
+    async def timed(operation: str, call, replies: List = None):
+        start = time.perf_counter()
+        await call
+        latencies.setdefault(operation, []).append(time.perf_counter() - start)
+        # Réponse d'erreur attendue (solde insuffisant, niveau maximum...) : comptée à part
+        if replies and isinstance(replies[-1], str) and replies[-1].startswith("❌"):
+            rejected[operation] = rejected.get(operation, 0) + 1
+
+    # Création des factions par le même chemin que le bouton (appels à l'API Discord compris)
+    leaders = {}
+    for i in range(args.factions):
+        leader = guild.add_member(f"chef{i}")
+        name = f"Faction{i:05d}"
+        await timed("create_faction", manager.create_faction(FakeInteraction(leader), name))
+        leaders[name] = leader
+    names = list(leaders)
+    with manager.store.batch():
+        for name in names:
+            manager.store.set(name, "balance", 1_000_000)
+            for resource in manager.catalog.resources:
+                manager.store.set(name, f"resources.{resource}", 1_000_000)
+
+    # Membres déjà rattachés à une faction, indexés comme au démarrage du bot
+    members = list(leaders.values())
+    for j in range(args.members):
+        member = guild.add_member(f"membre{j}")
+        role = guild.get_role(manager.store.get(rng.choice(names))["role_id"])
+        member.roles.append(role)
+        role.members.append(member)
+        members.append(member)
+    manager.index.build_members([guild])
+    # Quartier général construit partout : les constructions suivantes passent par le chemin complet
+    for leader in leaders.values():
+        await main.construire.callback(FakeContext(leader), "quartier_general")
+
+    bytes_before = STORAGE_BYTES.value(operation="write") + STORAGE_BYTES.value(operation="compaction")
+    buildings = list(manager.catalog.buildings)
+    operations = rng.choices(list(WORKLOAD), weights=list(WORKLOAD.values()), k=args.operations)
+    started = time.perf_counter()
+    for operation in operations:
+        if operation == "rejoindre":
+            newcomer = guild.add_member(f"nouveau{len(guild.members)}")
+            await timed(operation, manager.join_faction(FakeInteraction(newcomer), rng.choice(names)))
+            continue
+        if operation == "construire":
+            ctx = FakeContext(leaders[rng.choice(names)])
+            await timed(operation, main.construire.callback(ctx, rng.choice(buildings)), ctx.messages)
+            continue
+        ctx = FakeContext(rng.choice(members))
+        target = rng.choice(names)
+        if operation == "solde":
+            await timed(operation, main.solde.callback(ctx), ctx.messages)
+        elif operation == "ressources":
+            await timed(operation, main.ressources.callback(ctx), ctx.messages)
+        elif operation == "transferer":
+            await timed(operation, main.transferer.callback(ctx, target, rng.randint(1, 100)), ctx.messages)
+        elif operation == "transfererressource":
+            await timed(operation, main.transfererressource.callback(ctx, target, "bois", rng.randint(1, 20)), ctx.messages)
+    elapsed = time.perf_counter() - started
+
+    main.job_queue.stop()
+    await manager.store.flush_async()
+    manager.close()
+    bytes_written = STORAGE_BYTES.value(operation="write") + STORAGE_BYTES.value(operation="compaction") - bytes_before
+
+    return {
+        "operations": args.operations,
+        "seconds": round(elapsed, 4),
+        "ops_per_sec": round(args.operations / elapsed, 1),
+        "bytes_written": int(bytes_written),
+        "discord_api_calls": guild.api_calls,
+        "ops": {
+            operation: {
+                "count": len(values),
+                "rejected": rejected.get(operation, 0),
+                "p50_ms": round(percentile(values, 0.5) * 1000, 3),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            }
+            for operation, values in sorted(latencies.items())
+        },
+    }
+
+
+def config_key(args) -> str:
+    key = f"{args.backend}-{args.factions}f-{args.members}m-{args.operations}ops-{args.api_latency}s"
+    return key + "-lean" if args.member_cache == "lean" else key
+
+
+def print_report(key: str, result: Dict):
+    print(f"\n=== {key} ===")
+    print(f"{result['operations']} opérations en {result['seconds']} s : {result['ops_per_sec']} op/s")
+    print(f"Octets écrits: {result['bytes_written']} — appels API Discord: {result['discord_api_calls']}")
+    print(f"{'opération':<22}{'nombre':>8}{'refus':>8}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+    for operation, stats in result["ops"].items():
+        print(f"{operation:<22}{stats['count']:>8}{stats['rejected']:>8}{stats['p50_ms']:>12}{stats['p99_ms']:>12}")
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Liste des régressions par rapport à la référence"""
+    regressions = []
+    if result["ops_per_sec"] < baseline["ops_per_sec"] * (1 - tolerance):
+        regressions.append(f"débit: {result['ops_per_sec']} op/s < {baseline['ops_per_sec']} op/s")
+    if result["bytes_written"] > baseline["bytes_written"] * (1 + tolerance):
+        regressions.append(f"octets écrits: {result['bytes_written']} > {baseline['bytes_written']}")
+    for operation, stats in result["ops"].items():
+        reference = baseline["ops"].get(operation)
+        # Marge absolue de 0,5 ms : en dessous, l'écart relève du bruit de mesure
+        if reference and stats["p99_ms"] > reference["p99_ms"] * (1 + tolerance) + 0.5:
+            regressions.append(f"{operation} p99: {stats['p99_ms']} ms > {reference['p99_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--factions", type=int, default=200)
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--operations", type=int, default=5000)
+    parser.add_argument("--backend", choices=("json", "binary", "sqlite"), default="json")
+    parser.add_argument("--flush-interval", type=float, default=0.5)
+    parser.add_argument("--member-cache", choices=("full", "lean"), default="full",
+                        help="mode du cache des membres (voir benchmarks.member_cache pour la mémoire)")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="latence simulée des appels Discord (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="enregistre ce résultat comme référence")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="régression tolérée (0.3 = 30 %%)")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="cosmosum-bench-")
+    os.environ["FACTION_DATA_DIR"] = data_dir
+    os.environ["FACTION_DATA_FILE"] = os.path.join(data_dir, "factions.json")
+    os.environ["FACTION_BACKEND"] = args.backend
+    os.environ["FACTION_FLUSH_INTERVAL"] = str(args.flush_interval)
+    os.environ["MEMBER_CACHE"] = args.member_cache
+    os.chdir(ROOT)
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    key = config_key(args)
+    print_report(key, result)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baselines = json.load(f)
+    if args.save_baseline:
+        baselines[key] = result
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=4, sort_keys=True)
+            f.write("\n")
+        print(f"\nRéférence enregistrée dans {args.baseline}")
+        return
+    if key not in baselines:
+        print("\nAucune référence pour cette configuration (--save-baseline pour en créer une)")
+        return
+    regressions = compare(result, baselines[key], args.tolerance)
+    if regressions:
+        print("\n❌ Régressions par rapport à la référence :")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("\n✅ Aucune régression par rapport à la référence")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Faux objets Discord en mémoire pour les bancs d'essai (aucun accès réseau).
+
+Ils n'implémentent que ce qu'utilisent FactionManager et les commandes de
+main.py. `api_latency` simule le temps d'aller-retour d'un appel à l'API
+Discord (création de rôle, de salon, attribution de rôle...).
+"""
+import asyncio
+import contextlib
+import itertools
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+_ids = itertools.count(10_000)
+
+ADMIN_PERMISSIONS = SimpleNamespace(
+    administrator=True, manage_roles=True, manage_channels=True, read_messages=True, send_messages=True
+)
+MEMBER_PERMISSIONS = SimpleNamespace(
+    administrator=False, manage_roles=False, manage_channels=False, read_messages=True, send_messages=True
+)
+
+
+async def _api_call(guild: "FakeGuild"):
+    guild.api_calls += 1
+    if guild.api_latency:
+        await asyncio.sleep(guild.api_latency)
+
+
+class FakeRole:
+    def __init__(self, guild: "FakeGuild", name: str):
+        self.id = next(_ids)
+        self.guild = guild
+        self.name = name
+        self.members: List["FakeMember"] = []
+
+    async def delete(self, reason: Optional[str] = None):
+        await _api_call(self.guild)
+        self.guild.roles.pop(self.id, None)
+
+
+class FakeChannel:
+    def __init__(self, guild: "FakeGuild", name: str):
+        self.id = next(_ids)
+        self.guild = guild
+        self.name = name
+
+    async def delete(self, reason: Optional[str] = None):
+        await _api_call(self.guild)
+
+
+class FakeCategory(FakeChannel):
+    async def create_text_channel(self, name: str, **kwargs) -> FakeChannel:
+        await _api_call(self.guild)
+        return FakeChannel(self.guild, name)
+
+    async def create_voice_channel(self, name: str, **kwargs) -> FakeChannel:
+        await _api_call(self.guild)
+        return FakeChannel(self.guild, name)
+
+
+class FakeMember:
+    def __init__(self, guild: "FakeGuild", name: str, admin: bool = False):
+        self.id = next(_ids)
+        self.guild = guild
+        self.name = name
+        self.display_name = name
+        self.mention = f"<@{self.id}>"
+        self.roles: List[FakeRole] = [guild.default_role] if guild.default_role else []
+        self.guild_permissions = ADMIN_PERMISSIONS if admin else MEMBER_PERMISSIONS
+
+    async def add_roles(self, *roles: FakeRole, reason: Optional[str] = None):
+        await _api_call(self.guild)
+        for role in roles:
+            if role not in self.roles:
+                self.roles.append(role)
+                role.members.append(self)
+
+    async def remove_roles(self, *roles: FakeRole, reason: Optional[str] = None):
+        await _api_call(self.guild)
+        for role in roles:
+            if role in self.roles:
+                self.roles.remove(role)
+                role.members.remove(self)
+
+
+class FakeGuild:
+    def __init__(self, api_latency: float = 0.0):
+        self.id = next(_ids)
+        self.api_latency = api_latency
+        self.api_calls = 0
+        self.roles: Dict[int, FakeRole] = {}
+        self.default_role = None
+        self.default_role = self._add_role("@everyone")
+        self._members: Dict[int, FakeMember] = {}
+        self.me = self.add_member("bot", admin=True)
+
+    @property
+    def members(self) -> List[FakeMember]:
+        return list(self._members.values())
+
+    def _add_role(self, name: str) -> FakeRole:
+        role = FakeRole(self, name)
+        self.roles[role.id] = role
+        return role
+
+    def add_member(self, name: str, admin: bool = False) -> FakeMember:
+        member = FakeMember(self, name, admin=admin)
+        self._members[member.id] = member
+        return member
+
+    def get_role(self, role_id: int) -> Optional[FakeRole]:
+        return self.roles.get(role_id)
+
+    def get_member(self, member_id: int) -> Optional[FakeMember]:
+        return self._members.get(member_id)
+
+    async def create_role(self, name: str, **kwargs) -> FakeRole:
+        await _api_call(self)
+        return self._add_role(name)
+
+    async def create_category(self, name: str, **kwargs) -> FakeCategory:
+        await _api_call(self)
+        return FakeCategory(self, name)
+
+
+class FakeResponse:
+    def __init__(self):
+        self.messages: List[str] = []
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        self._done = True
+        self.messages.append(content)
+
+    async def send_modal(self, modal):
+        self._done = True
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages: List[str] = []
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        self.messages.append(content)
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeMember):
+        self.user = user
+        self.guild = user.guild
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+
+class FakeContext:
+    """Contexte de commande préfixée : comme avec discord.py, `interaction` vaut None"""
+
+    def __init__(self, author: FakeMember):
+        self.author = author
+        self.guild = author.guild
+        self.interaction = None
+        self.messages: List[str] = []
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        self.messages.append(content if content is not None else kwargs.get("embed"))
+
+    @contextlib.asynccontextmanager
+    async def typing(self):
+        await _api_call(self.guild)
+        yield
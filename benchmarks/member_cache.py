@@ -0,0 +1,140 @@
+"""Compare le cache complet des membres de discord.py et le mode allégé (MEMBER_CACHE=lean).
+
+Un vrai discord.Guild est rempli hors réseau, comme par les paquets de
+membres reçus au démarrage (chunking), puis l'index des factions est
+construit depuis ses membres en cache. En mode allégé, rien n'est chargé au
+démarrage : seuls les membres actifs sont résolus à la demande depuis les
+rôles de leur commande, et seul l'index compact du bot reste en mémoire.
+Affiche le temps de démarrage et la mémoire résidente de chaque mode.
+
+Usage (depuis la racine du dépôt) :
+    python -m benchmarks.member_cache --members 100000 --factions 200 --active 5000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import discord  # noqa: E402
+from faction_index import FactionIndex  # noqa: E402
+
+GUILD_ID = 1
+FIRST_ROLE_ID = 1_000
+FIRST_MEMBER_ID = 1_000_000
+CHUNK_SIZE = 1_000
+
+
+def role_payloads(factions: int) -> List[Dict]:
+    roles = [{"id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0}]
+    roles += [{"id": str(FIRST_ROLE_ID + i), "name": f"Faction{i:05d}", "permissions": "0", "position": i + 1}
+              for i in range(factions)]
+    return roles
+
+
+def member_payload(i: int, args) -> Dict:
+    # Un membre sur `1 / faction_share` appartient à une faction
+    in_faction = i % round(1 / args.faction_share) == 0
+    return {
+        "user": {"id": str(FIRST_MEMBER_ID + i), "username": f"membre{i}", "discriminator": "0",
+                 "avatar": None, "global_name": None},
+        "roles": [str(FIRST_ROLE_ID + i % args.factions)] if in_faction else [],
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def make_guild(args, lean: bool) -> discord.Guild:
+    intents = discord.Intents.default()
+    intents.members = True
+    client = discord.Client(
+        intents=intents,
+        member_cache_flags=discord.MemberCacheFlags.none() if lean else discord.MemberCacheFlags.from_intents(intents),
+        chunk_guilds_at_startup=not lean
+    )
+    state = client._connection
+    guild = discord.Guild(data={"id": str(GUILD_ID), "name": "banc", "roles": role_payloads(args.factions),
+                                "member_count": args.members}, state=state)
+    state._add_guild(guild)
+    return guild
+
+
+def make_index(args, lean: bool) -> FactionIndex:
+    index = FactionIndex(verify_roles=lean)
+    index.load((f"Faction{i:05d}", {"role_id": FIRST_ROLE_ID + i}) for i in range(args.factions))
+    return index
+
+
+def run_full(args):
+    """Démarrage avec cache complet : tous les membres sont chargés puis indexés"""
+    guild = make_guild(args, lean=False)
+    index = make_index(args, lean=False)
+    started = time.perf_counter()
+    # Ce que fait discord.py pour chaque paquet GUILD_MEMBERS_CHUNK
+    for start in range(0, args.members, CHUNK_SIZE):
+        for i in range(start, min(start + CHUNK_SIZE, args.members)):
+            guild._add_member(discord.Member(data=member_payload(i, args), guild=guild, state=guild._state))
+    chunked = time.perf_counter()
+    index.build_members([guild])
+    indexed = time.perf_counter()
+    return (guild, index), chunked - started, indexed - chunked, len(guild.members), index.member_count()
+
+
+def run_lean(args):
+    """Démarrage allégé : aucun membre chargé, les membres actifs sont résolus à la demande"""
+    guild = make_guild(args, lean=True)
+    index = make_index(args, lean=True)
+    started = time.perf_counter()
+    index.build_members([guild])
+    indexed = time.perf_counter()
+    for k in range(min(args.active, args.members)):
+        # Membres actifs répartis de façon déterministe ; chacun est construit depuis
+        # la commande reçue, puis abandonné comme le fait discord.py sans cache
+        i = k * 7919 % args.members
+        index.faction_for_member(discord.Member(data=member_payload(i, args), guild=guild, state=guild._state))
+    return (guild, index), 0.0, indexed - started, len(guild.members), index.member_count()
+
+
+def measure(run, args):
+    _, chunking, indexing, cached, indexed = run(args)
+    gc.collect()
+    tracemalloc.start()
+    kept = run(args)
+    gc.collect()
+    resident = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return {"chunking_s": chunking, "index_s": indexing, "memory_mb": resident / (1024 * 1024),
+            "cached_members": cached, "indexed_members": indexed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--factions", type=int, default=200)
+    parser.add_argument("--faction-share", type=float, default=0.1, help="part des membres appartenant à une faction")
+    parser.add_argument("--active", type=int, default=5_000, help="membres actifs résolus à la demande (mode allégé)")
+    args = parser.parse_args()
+
+    results = {"full": measure(run_full, args), "lean": measure(run_lean, args)}
+    print(f"\n=== Cache des membres : {args.members} membres, {args.factions} factions, "
+          f"{args.active} membres actifs ===")
+    print(f"{'mode':<8}{'chunking (s)':>14}{'index (s)':>12}{'mémoire (Mo)':>15}{'en cache':>11}{'indexés':>10}")
+    for mode, result in results.items():
+        print(f"{mode:<8}{result['chunking_s']:>14.3f}{result['index_s']:>12.3f}{result['memory_mb']:>15.1f}"
+              f"{result['cached_members']:>11}{result['indexed_members']:>10}")
+    full, lean = results["full"], results["lean"]
+    print(f"\nDémarrage: {full['chunking_s'] + full['index_s']:.3f} s → {lean['chunking_s'] + lean['index_s']:.3f} s ; "
+          f"mémoire: {full['memory_mb']:.1f} Mo → {lean['memory_mb']:.1f} Mo "
+          f"(÷{full['memory_mb'] / max(lean['memory_mb'], 0.001):.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Compare l'instantané JSON et l'instantané binaire des factions, et leur empreinte mémoire.
+
+Génère N factions comparables à celles du bot (bâtiments construits,
+production en cours), puis mesure l'écriture et la relecture d'un
+instantané complet par chaque backend, la taille des fichiers, et la
+mémoire des factions en dictionnaires et en enregistrements Faction.
+
+Usage (depuis la racine du dépôt) :
+    python -m benchmarks.snapshot_format --factions 50000
+"""
+import argparse
+import copy
+import gc
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from building_catalog import RESOURCES, BuildingCatalog  # noqa: E402
+from faction_record import Faction, FactionLayout  # noqa: E402
+from faction_storage import BinaryBackend, JsonBackend  # noqa: E402
+from production import production_rates  # noqa: E402
+
+
+def make_factions(count: int, seed: int) -> Dict[str, Dict]:
+    rng = random.Random(seed)
+    catalog = BuildingCatalog(os.path.join(ROOT, "data", "buildings.json"))
+    factions = {}
+    for i in range(count):
+        buildings = {building_id: rng.randint(1, catalog.get(building_id).max_level)
+                     for building_id in rng.sample(list(catalog.buildings), rng.randint(0, len(catalog.buildings)))}
+        rates = production_rates(catalog, buildings)
+        factions[f"Faction{i:06d}"] = {
+            "leader": rng.getrandbits(60),
+            "balance": rng.randint(0, 10_000_000),
+            "currency_name": f"Faction{i:06d}Coin",
+            "exchange_rate": rng.choice([1, 0.5, 1.25, 2]),
+            "role_id": rng.getrandbits(60),
+            "category_id": rng.getrandbits(60),
+            "text_channel_id": rng.getrandbits(60),
+            "voice_channel_id": rng.getrandbits(60),
+            "resources": {resource: rng.randint(0, 1_000_000) for resource in RESOURCES},
+            "buildings": buildings,
+            "production": rates,
+            "production_carry": {resource: rng.random() for resource in rates},
+            "last_accrual": time.time(),
+        }
+    return factions
+
+
+def timed(call: Callable, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def measure_backend(backend, factions: Dict[str, Dict], repeat: int) -> Dict:
+    save = timed(lambda: backend._write_file(backend._dump(factions)), repeat)
+    load = timed(backend._read_file, repeat)
+    assert backend._read_file() == factions, "relecture différente des données écrites"
+    return {"save_s": save, "load_s": load, "size_mb": os.path.getsize(backend.filename) / (1024 * 1024)}
+
+
+def resident(build: Callable) -> float:
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--factions", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    factions = make_factions(args.factions, args.seed)
+    directory = tempfile.mkdtemp(prefix="cosmosum-snapshot-")
+    try:
+        results = {
+            "json": measure_backend(JsonBackend(os.path.join(directory, "factions.json"), journal=False),
+                                    factions, args.repeat),
+            "binary": measure_backend(BinaryBackend(os.path.join(directory, "factions.bin"), journal=False),
+                                      factions, args.repeat),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    # Mémoire d'une copie de toutes les factions, comme l'instantané publié par le stockage
+    dict_bytes = resident(lambda: copy.deepcopy(factions))
+    layout = FactionLayout()
+    record_bytes = resident(lambda: {name: Faction.from_dict(data, layout) for name, data in factions.items()})
+
+    print(f"\n=== Instantané de {args.factions} factions (meilleur de {args.repeat}) ===")
+    print(f"{'format':<8}{'écriture (s)':>14}{'lecture (s)':>13}{'taille (Mo)':>13}")
+    for fmt, result in results.items():
+        print(f"{fmt:<8}{result['save_s']:>14.3f}{result['load_s']:>13.3f}{result['size_mb']:>13.1f}")
+    json_result, binary_result = results["json"], results["binary"]
+    print(f"\nÉcriture ÷{json_result['save_s'] / binary_result['save_s']:.1f}, "
+          f"lecture ÷{json_result['load_s'] / binary_result['load_s']:.1f}, "
+          f"taille ÷{json_result['size_mb'] / binary_result['size_mb']:.1f}")
+    print(f"Mémoire par faction : {dict_bytes / args.factions:.0f} o en dictionnaires, "
+          f"{record_bytes / args.factions:.0f} o en enregistrements Faction "
+          f"(÷{dict_bytes / record_bytes:.1f})")
+
+
+if __name__ == "__main__":
+    main()
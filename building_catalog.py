@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional, Tuple
+
+# Ordre de référence des ressources pour les vecteurs de coût
+RESOURCES: Tuple[str, ...] = ("bois", "pierre", "fer", "or")
+
+
+class BuildingLevel(NamedTuple):
+    level: int
+    cost: Mapping[str, int]
+    cost_vector: Tuple[int, ...]
+    bonus: str
+    # Production journalière de ce niveau (ordre de RESOURCES) et bonus de production en %
+    production_vector: Tuple[int, ...] = ()
+    production_bonus: int = 0
+    # Bonus sur les taux d'échange en %
+    exchange_bonus: int = 0
+
+
+class Building(NamedTuple):
+    id: str
+    nom: str
+    description: str
+    levels: Tuple[BuildingLevel, ...]
+    # Couleur d'affichage (classe Bootstrap, ex: "primary")
+    color: str = ""
+
+    @property
+    def max_level(self) -> int:
+        return len(self.levels)
+
+    def level(self, level: int) -> Optional[BuildingLevel]:
+        """Renvoie les informations du niveau demandé (à partir de 1), ou None"""
+        if 1 <= level <= len(self.levels):
+            return self.levels[level - 1]
+        return None
+
+
+class BuildingCatalog:
+    """Catalogue des bâtiments chargé depuis un fichier de données.
+
+    Le fichier est lu une seule fois dans des structures immuables, avec les
+    coûts de chaque niveau précalculés en vecteurs dans l'ordre de RESOURCES.
+    Il est rechargé automatiquement lorsque sa date de modification change
+    (vérifiée au plus toutes les `check_interval` secondes) ; `version`
+    augmente alors pour invalider les rendus mis en cache.
+    """
+
+    def __init__(self, filename: str = "data/buildings.json", check_interval: float = 5.0):
+        self.filename = filename
+        self.check_interval = check_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self._resources: Tuple[str, ...] = RESOURCES
+        self._buildings: Mapping[str, Building] = MappingProxyType({})
+        self._legacy: Dict = {}
+        self._load()
+
+    def _load(self):
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        resources = tuple(data.get("ressources", RESOURCES))
+        buildings = {}
+        for building_id, info in data["batiments"].items():
+            levels = []
+            for level in sorted(info["niveaux"], key=int):
+                level_info = info["niveaux"][level]
+                cost = {resource: int(amount) for resource, amount in level_info["cout"].items()}
+                production = level_info.get("production", {})
+                levels.append(BuildingLevel(
+                    level=int(level),
+                    cost=MappingProxyType(cost),
+                    cost_vector=tuple(cost.get(resource, 0) for resource in resources),
+                    bonus=level_info["bonus"],
+                    production_vector=tuple(int(production.get(resource, 0)) for resource in resources),
+                    production_bonus=int(level_info.get("bonus_production", 0)),
+                    exchange_bonus=int(level_info.get("bonus_echange", 0))
+                ))
+            buildings[building_id] = Building(building_id, info["nom"], info["description"], tuple(levels),
+                                              info.get("couleur", ""))
+
+        # Remplacement atomique : les lecteurs voient l'ancien ou le nouveau catalogue, jamais un mélange
+        self._resources = resources
+        self._buildings = MappingProxyType(buildings)
+        self._legacy = {
+            building.id: {
+                "nom": building.nom,
+                "description": building.description,
+                "niveaux": {lvl.level: {"cout": dict(lvl.cost), "bonus": lvl.bonus} for lvl in building.levels}
+            }
+            for building in buildings.values()
+        }
+        self._mtime = os.path.getmtime(self.filename)
+        self.version += 1
+
+    def reload_if_changed(self) -> bool:
+        """Recharge le catalogue si le fichier a changé ; renvoie True en cas de rechargement"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        with self._lock:
+            self._next_check = now + self.check_interval
+            try:
+                if os.path.getmtime(self.filename) == self._mtime:
+                    return False
+                self._load()
+            except Exception as e:
+                # On garde le catalogue précédent si le fichier est invalide
+                print(f"Erreur lors du rechargement du catalogue des bâtiments: {e}")
+                return False
+        print(f"Catalogue des bâtiments rechargé (version {self.version})")
+        return True
+
+    @property
+    def resources(self) -> Tuple[str, ...]:
+        return self._resources
+
+    @property
+    def buildings(self) -> Mapping[str, Building]:
+        self.reload_if_changed()
+        return self._buildings
+
+    def get(self, building_id: str) -> Optional[Building]:
+        return self.buildings.get(building_id)
+
+    def as_dict(self) -> Dict:
+        """Catalogue sous forme de dictionnaires imbriqués (format historique de get_available_buildings)"""
+        self.reload_if_changed()
+        return self._legacy
+
+    def resource_vector(self, resources: Mapping[str, int]) -> Tuple[int, ...]:
+        return tuple(resources.get(resource, 0) for resource in self._resources)
+
+    def missing_resource(self, resources: Mapping[str, int], level: BuildingLevel) -> Optional[Tuple[str, int]]:
+        """Renvoie la première ressource manquante et la quantité manquante, ou None si le coût est couvert"""
+        have = self.resource_vector(resources)
+        for resource, needed, available in zip(self._resources, level.cost_vector, have):
+            if available < needed:
+                return resource, needed - available
+        return None
+
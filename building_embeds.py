@@ -0,0 +1,60 @@
+import discord
+from typing import Dict, Optional, Tuple
+from building_catalog import BuildingCatalog
+
+
+class BuildingEmbeds:
+    """Rendus Discord du catalogue des bâtiments, mis en cache.
+
+    L'embed de `!batimentsdispo` et le champ de chaque couple
+    (bâtiment, niveau) affiché par `!batiments` ne sont construits qu'une
+    fois par version du catalogue, puis reconstruits après un rechargement.
+    """
+
+    def __init__(self, catalog: BuildingCatalog):
+        self.catalog = catalog
+        self._version = None
+        self._available: Optional[discord.Embed] = None
+        self._fields: Dict[Tuple[str, int], Tuple[str, str]] = {}
+
+    def _refresh(self):
+        self.catalog.reload_if_changed()
+        if self._version == self.catalog.version:
+            return
+        buildings = self.catalog.buildings
+
+        embed = discord.Embed(
+            title="🏗️ Bâtiments disponibles",
+            description="Liste des bâtiments que vous pouvez construire pour votre faction",
+            color=discord.Color.gold()
+        )
+        fields = {}
+        for building in buildings.values():
+            # Créer une description avec les coûts pour chaque niveau
+            description = f"**{building.description}**\n\n"
+            for level in building.levels:
+                costs = ", ".join([f"{amount} {resource}" for resource, amount in level.cost.items()])
+                description += f"**Niveau {level.level}:** {costs}\n*Bonus:* {level.bonus}\n\n"
+                fields[(building.id, level.level)] = (
+                    f"{building.nom} (Niveau {level.level})",
+                    f"**Description:** {building.description}\n**Bonus actuel:** {level.bonus}"
+                )
+            embed.add_field(
+                name=f"{building.nom} (`{building.id}`)",
+                value=description,
+                inline=False
+            )
+
+        self._available = embed
+        self._fields = fields
+        self._version = self.catalog.version
+
+    def available(self) -> discord.Embed:
+        """Embed listant tous les bâtiments et leurs coûts"""
+        self._refresh()
+        return self._available
+
+    def level_field(self, building_id: str, level: int) -> Optional[Tuple[str, str]]:
+        """Nom et valeur du champ décrivant un bâtiment à un niveau donné"""
+        self._refresh()
+        return self._fields.get((building_id, level))
@@ -0,0 +1,193 @@
+import csv
+import io
+import itertools
+import json
+from typing import IO, Container, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+from building_catalog import RESOURCES
+
+# Colonnes des fichiers d'import et d'export
+COLUMNS = ("faction", "champ", "valeur", "mode")
+MODES = ("delta", "absolu")
+FORMATS = ("csv", "json")
+# Taille maximale d'un fichier d'import
+MAX_IMPORT_BYTES = 5 * 1024 * 1024
+# Nombre d'erreurs détaillées dans le message renvoyé à l'administrateur
+MAX_REPORTED_ERRORS = 10
+
+
+class BulkRow(NamedTuple):
+    line: int
+    faction: str
+    path: str
+    value: int
+    absolute: bool
+
+
+def field_path(field: str) -> str:
+    """Chemin dans les données de faction pour un champ d'import ("monnaie" ou une ressource)"""
+    field = field.strip().lower()
+    if field in ("monnaie", "solde"):
+        return "balance"
+    if field in RESOURCES:
+        return f"resources.{field}"
+    raise ValueError(f"champ '{field}' invalide (monnaie, {', '.join(RESOURCES)})")
+
+
+def field_name(path: str) -> str:
+    return "monnaie" if path == "balance" else path.split(".", 1)[1]
+
+
+def detect_format(filename: str) -> str:
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension == "csv":
+        return "csv"
+    if extension in ("json", "jsonl"):
+        return "json"
+    raise ValueError("Format de fichier non reconnu ! Utilisez un fichier .csv, .json ou .jsonl")
+
+
+def iter_raw_rows(stream: IO[bytes], fmt: str) -> Iterator[Tuple[int, Dict]]:
+    """Lignes brutes (numéro, dictionnaire) lues au fil du fichier.
+
+    CSV avec en-tête faction,champ,valeur[,mode] ; JSON sous forme d'un
+    objet par ligne (JSON Lines) ou, à défaut, d'un tableau d'objets.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        missing = [column for column in COLUMNS[:3] if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"Colonnes manquantes dans le CSV : {', '.join(missing)}")
+        for row in reader:
+            yield reader.line_num, row
+        return
+    first = text.readline()
+    if first.lstrip().startswith("["):
+        # Tableau JSON : la bibliothèque standard ne sait le lire qu'en entier
+        document = json.loads(first + text.read())
+        if not isinstance(document, list):
+            raise ValueError("Le fichier JSON doit contenir un tableau d'objets ou un objet par ligne")
+        for number, row in enumerate(document, start=1):
+            yield number, row
+        return
+    for number, line in enumerate(itertools.chain([first], text), start=1):
+        if line.strip():
+            yield number, _json_line(line)
+
+
+def _json_line(line: str):
+    try:
+        return json.loads(line)
+    except ValueError:
+        # Signalée par parse_row, pour que la validation continue aux lignes suivantes
+        return {"_erreur": "JSON invalide"}
+
+
+def parse_row(number: int, raw, factions: Container[str]) -> BulkRow:
+    """Valide une ligne ; lève ValueError avec un message sans numéro de ligne"""
+    if not isinstance(raw, dict):
+        raise ValueError("objet attendu")
+    if "_erreur" in raw:
+        raise ValueError(raw["_erreur"])
+    faction = str(raw.get("faction") or "").strip()
+    if faction not in factions:
+        raise ValueError(f"la faction '{faction}' n'existe pas")
+    path = field_path(str(raw.get("champ") or ""))
+    value = raw.get("valeur")
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("valeur entière attendue")
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"valeur '{value}' invalide, nombre entier attendu")
+    mode = str(raw.get("mode") or "delta").strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"mode '{mode}' invalide (delta ou absolu)")
+    if mode == "absolu" and value < 0:
+        raise ValueError("une valeur absolue ne peut pas être négative")
+    return BulkRow(number, faction, path, value, mode == "absolu")
+
+
+class BulkPlan:
+    """Modifications validées, regroupées par (faction, champ).
+
+    Chaque couple ne garde qu'une valeur absolue éventuelle et la somme des
+    variations qui la suivent : la mémoire dépend du nombre de champs
+    touchés, pas du nombre de lignes du fichier.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.error_count = 0
+        self.errors: List[str] = []
+        self.operations: Dict[Tuple[str, str], Tuple[Optional[int], int]] = {}
+
+    def add(self, row: BulkRow):
+        self.rows += 1
+        key = (row.faction, row.path)
+        base, delta = self.operations.get(key, (None, 0))
+        self.operations[key] = (row.value, 0) if row.absolute else (base, delta + row.value)
+
+    def add_error(self, number: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"ligne {number} : {message}")
+
+    @property
+    def factions(self) -> List[str]:
+        return sorted({faction for faction, _ in self.operations})
+
+    def resolve(self, faction: str, path: str, current: int) -> int:
+        base, delta = self.operations[(faction, path)]
+        return (current if base is None else base) + delta
+
+
+def validate(stream: IO[bytes], fmt: str, factions: Container[str]) -> BulkPlan:
+    """Valide tout le fichier en une passe, sans s'arrêter à la première erreur"""
+    plan = BulkPlan()
+    try:
+        for number, raw in iter_raw_rows(stream, fmt):
+            try:
+                plan.add(parse_row(number, raw, factions))
+            except ValueError as e:
+                plan.add_error(number, str(e))
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ValueError(f"Fichier illisible : {e}")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON invalide : {e}")
+    return plan
+
+
+def iter_export(factions: Mapping[str, Mapping], fmt: str) -> Iterator[str]:
+    """Économie complète, morceau par morceau, dans le format relu par l'import (valeurs absolues)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if fmt == "csv":
+        writer.writerow(COLUMNS)
+    for name, data in factions.items():
+        resources = data.get("resources", {})
+        fields = [("monnaie", data.get("balance", 0))]
+        fields.extend((resource, resources.get(resource, 0)) for resource in RESOURCES)
+        for field, value in fields:
+            if fmt == "csv":
+                writer.writerow((name, field, value, "absolu"))
+            else:
+                row = {"faction": name, "champ": field, "valeur": value, "mode": "absolu"}
+                buffer.write(json.dumps(row, ensure_ascii=False) + "\n")
+        # Un morceau par faction : la mémoire utilisée ne dépend pas du nombre de factions
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_export(factions: Mapping[str, Mapping], fmt: str, fp: IO[bytes]) -> int:
+    """Écrit l'export dans un fichier binaire ; renvoie le nombre d'octets écrits"""
+    written = 0
+    for chunk in iter_export(factions, fmt):
+        data = chunk.encode("utf-8")
+        fp.write(data)
+        written += len(data)
+    fp.seek(0)
+    return written
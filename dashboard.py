@@ -0,0 +1,148 @@
+from datetime import datetime, timezone
+from typing import Callable, Dict, Mapping, Optional, Tuple
+from faction_manager import FactionManager
+from faction_query import DEFAULT_LIMIT, FactionQuery, Page
+from leaderboard import DEFAULT_BOARD, PAGE_SIZE, Ranking
+from live_feed import LiveFeed
+from render_cache import CachedPage, RenderCache
+
+
+def int_arg(args: Mapping[str, str], name: str, default: int) -> int:
+    value = args.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Le paramètre '{name}' doit être un nombre entier !")
+
+
+class Dashboard:
+    """Logique du tableau de bord, indépendante du serveur web.
+
+    Partagée par le serveur Flask (threads) et le serveur aiohttp (boucle du
+    bot) : les deux ne font que traduire requêtes et réponses. Toutes les
+    lectures passent par l'instantané publié par le stockage.
+    """
+
+    def __init__(self, manager: FactionManager):
+        self.manager = manager
+        self.query = FactionQuery(manager.store, manager.catalog)
+        self.render_cache = RenderCache()
+        self.feed = LiveFeed(manager.store)
+
+    def cached(self, name: str, render: Callable[[], str]) -> CachedPage:
+        """Page rendue une seule fois par version des données"""
+        snapshot = self.manager.store.snapshot
+        version = (snapshot.version, self.manager.catalog.version)
+        return self.render_cache.get(name, version, snapshot.last_modified, render)
+
+    @staticmethod
+    def last_modified(page: CachedPage) -> datetime:
+        # Les en-têtes HTTP sont à la seconde près
+        return datetime.fromtimestamp(int(page.last_modified), tz=timezone.utc)
+
+    def is_not_modified(self, page: CachedPage, if_none_match: Optional[Callable[[str], bool]],
+                        if_modified_since: Optional[datetime]) -> bool:
+        """Indique si le client a déjà cette version (If-None-Match prioritaire sur If-Modified-Since)"""
+        if if_none_match is not None:
+            return if_none_match(page.etag)
+        return if_modified_since is not None and if_modified_since >= self.last_modified(page)
+
+    def query_page(self, args: Mapping[str, str]) -> Tuple[str, str, Page]:
+        """Page de factions correspondant aux paramètres sort, order, prefix, cursor et limit"""
+        sort = args.get('sort') or 'nom'
+        order = args.get('order') or ('asc' if sort == 'nom' else 'desc')
+        if order not in ('asc', 'desc'):
+            raise ValueError("Ordre invalide ! Utilisez asc ou desc")
+        page = self.query.page(
+            sort=sort,
+            descending=order == 'desc',
+            prefix=args.get('prefix', ''),
+            cursor=args.get('cursor') or None,
+            limit=int_arg(args, 'limit', DEFAULT_LIMIT)
+        )
+        return sort, order, page
+
+    def home_context(self) -> Dict:
+        return {"faction_count": len(self.manager.store.snapshot.factions)}
+
+    def factions_context(self, args: Mapping[str, str]) -> Dict:
+        """Variables du gabarit factions.html"""
+        try:
+            sort, order, page = self.query_page(args)
+        except ValueError as e:
+            return {"factions": {}, "error": str(e), "sort_keys": self.query.sort_keys(),
+                    "sort": 'nom', "order": 'asc', "prefix": '', "next_cursor": None, "buildings": {}}
+        return {
+            "factions": page.factions,
+            "buildings": self.manager.catalog.buildings,
+            "sort_keys": self.query.sort_keys(),
+            "sort": sort,
+            "order": order,
+            "prefix": args.get('prefix', ''),
+            "next_cursor": page.next_cursor
+        }
+
+    def factions_json(self, args: Mapping[str, str]) -> Dict:
+        """Réponse de /api/factions ; lève ValueError si les paramètres sont invalides"""
+        sort, order, page = self.query_page(args)
+        return {
+            "sort": sort,
+            "order": order,
+            "factions": [{"name": name, **data} for name, data in page.factions.items()],
+            "next_cursor": page.next_cursor
+        }
+
+    def ranking(self, args: Mapping[str, str]) -> Ranking:
+        """Page du classement correspondant aux paramètres critere, page et faction"""
+        page = int_arg(args, 'page', 1)
+        if page < 1:
+            raise ValueError("Le numéro de page doit être positif !")
+        return self.manager.leaderboards.ranking(
+            (args.get('critere') or DEFAULT_BOARD).lower(),
+            (page - 1) * PAGE_SIZE,
+            PAGE_SIZE,
+            args.get('faction') or None
+        )
+
+    def leaderboard_context(self, args: Mapping[str, str]) -> Dict:
+        """Variables du gabarit classement.html"""
+        context = {"boards": self.manager.leaderboards.boards(), "page_size": PAGE_SIZE,
+                   "page": 1, "faction": args.get('faction', '')}
+        try:
+            ranking = self.ranking(args)
+        except ValueError as e:
+            return {**context, "error": str(e), "ranking": None, "board": DEFAULT_BOARD}
+        return {**context, "ranking": ranking, "board": ranking.board, "page": int_arg(args, 'page', 1)}
+
+    def leaderboard_json(self, args: Mapping[str, str]) -> Dict:
+        """Réponse de /api/classement ; lève ValueError si les paramètres sont invalides"""
+        ranking = self.ranking(args)
+        return {
+            "board": ranking.board,
+            "total": ranking.total,
+            "entries": [entry._asdict() for entry in ranking.entries],
+            "own": ranking.own._asdict() if ranking.own else None
+        }
+
+    def quote_json(self, args: Mapping[str, str]) -> Dict:
+        """Réponse de /api/quote ; lève ValueError si la cotation est impossible"""
+        # Calculée sur l'instantané publié : le serveur web ne touche pas aux caches du moteur de change
+        result = self.manager.exchange.published_quote(
+            self.manager.store.snapshot.factions,
+            args.get('source', ''),
+            args.get('target', ''),
+            int_arg(args, 'amount', 0)
+        )
+        return {**result._asdict(), "rate": result.rate}
+
+    def health(self) -> Dict:
+        """État du service pour les sondes de disponibilité"""
+        snapshot = self.manager.store.snapshot
+        return {
+            "status": "ok",
+            "factions": len(snapshot.factions),
+            "version": snapshot.version,
+            "pending_writes": len(self.manager.store.dirty)
+        }
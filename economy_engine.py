@@ -0,0 +1,204 @@
+import threading
+from typing import Dict, List, Optional
+from building_catalog import RESOURCES, BuildingCatalog
+from faction_store import FactionStore
+
+try:
+    import numpy as np
+except ImportError:  # NumPy est optionnel : seules les opérations globales en dépendent
+    np = None
+
+# Mutations en attente au-delà desquelles les colonnes sont reconstruites plutôt que mises à jour
+MAX_PENDING_CHANGES = 10_000
+
+
+class EconomyEngine:
+    """Représentation en colonnes de toutes les factions pour les opérations globales.
+
+    Les soldes, taux de change, ressources (factions × ressources) et niveaux
+    de bâtiments (factions × bâtiments) sont tenus dans des tableaux NumPy,
+    construits une fois puis tenus à jour par les notifications du stockage :
+    chaque mutation validée ne réécrit que la case qu'elle touche, au
+    prochain usage. Seul un changement du catalogue impose une
+    reconstruction. Les opérations d'administration (taxe, événement) sont
+    vectorisées, puis seules les lignes réellement modifiées sont réécrites
+    dans le stockage.
+    """
+
+    def __init__(self, store: FactionStore, catalog: BuildingCatalog):
+        if np is None:
+            raise RuntimeError("NumPy est requis pour le moteur économique (pip install numpy)")
+        self.store = store
+        self.catalog = catalog
+        self._catalog_version = None
+        self.names: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.building_ids: List[str] = []
+        self.building_columns: Dict[str, int] = {}
+        self.balance = np.zeros(0, dtype=np.int64)
+        self.exchange_rate = np.zeros(0, dtype=np.float64)
+        self.resources = np.zeros((0, len(RESOURCES)), dtype=np.int64)
+        self.buildings = np.zeros((0, 0), dtype=np.int64)
+        # Mutations notifiées par le stockage, pas encore reportées dans les colonnes
+        # (mises de côté seulement une fois les colonnes construites)
+        self._built = False
+        self._changes: List[Dict] = []
+        self._changes_lock = threading.Lock()
+        store.add_listener(self._on_records)
+
+    def _on_records(self, records: List[Dict]):
+        """Appelé par le stockage, sous son verrou : les mutations sont seulement mises de côté"""
+        if not self._built:
+            return
+        with self._changes_lock:
+            self._changes.extend(records)
+            if len(self._changes) > max(MAX_PENDING_CHANGES, len(self.names)):
+                # Plus de mutations en attente que de lignes : une reconstruction au prochain usage coûte moins
+                self._changes = []
+                self._built = False
+
+    def _take_changes(self) -> List[Dict]:
+        with self._changes_lock:
+            changes, self._changes = self._changes, []
+        return changes
+
+    def _rebuild(self):
+        # Les mutations notifiées à partir d'ici sont mises de côté ; les précédentes sont dans les données relues
+        self._built = True
+        self._take_changes()
+        items = list(self.store.items())
+        self.names = [name for name, _ in items]
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        self.building_ids = list(self.catalog.buildings)
+        self.building_columns = {building: column for column, building in enumerate(self.building_ids)}
+        self.balance = np.fromiter((data["balance"] for _, data in items), dtype=np.int64, count=len(items))
+        self.exchange_rate = np.fromiter((data["exchange_rate"] for _, data in items), dtype=np.float64, count=len(items))
+        self.resources = np.array(
+            [[data["resources"].get(resource, 0) for resource in RESOURCES] for _, data in items],
+            dtype=np.int64
+        ).reshape(len(items), len(RESOURCES))
+        self.buildings = np.array(
+            [[data.get("buildings", {}).get(building, 0) for building in self.building_ids] for _, data in items],
+            dtype=np.int64
+        ).reshape(len(items), len(self.building_ids))
+        self._catalog_version = self.catalog.version
+
+    def _add_row(self, name: str):
+        self.rows[name] = len(self.names)
+        self.names.append(name)
+        self.balance = np.append(self.balance, 0)
+        self.exchange_rate = np.append(self.exchange_rate, 1.0)
+        self.resources = np.vstack([self.resources, np.zeros((1, len(RESOURCES)), dtype=np.int64)])
+        self.buildings = np.vstack([self.buildings, np.zeros((1, len(self.building_ids)), dtype=np.int64)])
+
+    def _set_row(self, row: int, data: Dict):
+        self.balance[row] = data.get("balance", 0)
+        self.exchange_rate[row] = data.get("exchange_rate", 1)
+        resources = data.get("resources", {})
+        self.resources[row] = [resources.get(resource, 0) for resource in RESOURCES]
+        buildings = data.get("buildings", {})
+        self.buildings[row] = [buildings.get(building, 0) for building in self.building_ids]
+
+    def _apply(self, record: Dict):
+        """Reporte une mutation dans les colonnes : les valeurs enregistrées sont absolues"""
+        name = record["f"]
+        if "c" in record:
+            if name not in self.rows:
+                self._add_row(name)
+            self._set_row(self.rows[name], record["c"])
+            return
+        row = self.rows.get(name)
+        if row is None:
+            return
+        head, _, key = record["p"].partition(".")
+        value = record["v"]
+        if head == "balance":
+            self.balance[row] = value
+        elif head == "exchange_rate":
+            self.exchange_rate[row] = value
+        elif head == "resources":
+            if not key:
+                self.resources[row] = [value.get(resource, 0) for resource in RESOURCES]
+            elif key in RESOURCES:
+                self.resources[row, RESOURCES.index(key)] = value
+        elif head == "buildings":
+            if not key:
+                self.buildings[row] = [value.get(building, 0) for building in self.building_ids]
+            elif key in self.building_columns:
+                self.buildings[row, self.building_columns[key]] = value
+
+    def refresh(self):
+        """Met les colonnes à jour : mutations notifiées depuis le dernier usage, ou reconstruction si le catalogue a changé"""
+        if not self._built or self._catalog_version != self.catalog.version:
+            self._rebuild()
+            return
+        for record in self._take_changes():
+            self._apply(record)
+
+    def _commit(self, balance: Optional["np.ndarray"] = None, resources: Optional["np.ndarray"] = None) -> int:
+        """Réécrit dans le stockage les seules lignes modifiées ; renvoie leur nombre"""
+        changed = set()
+        # Un seul lot : une seule écriture et un seul instantané publié pour toute l'opération
+        with self.store.batch():
+            if balance is not None:
+                for row in np.nonzero(balance != self.balance)[0]:
+                    self.store.set(self.names[row], "balance", int(balance[row]))
+                    changed.add(row)
+            if resources is not None:
+                rows, columns = np.nonzero(resources != self.resources)
+                for row, column in zip(rows, columns):
+                    self.store.set(self.names[row], f"resources.{RESOURCES[column]}", int(resources[row, column]))
+                    changed.add(row)
+        if balance is not None:
+            self.balance = balance
+        if resources is not None:
+            self.resources = resources
+        return len(changed)
+
+    # Opérations globales
+
+    def tax(self, percent: float) -> Dict:
+        """Prélève `percent` % du solde de chaque faction (arrondi à l'unité inférieure)"""
+        self.refresh()
+        taxes = np.floor(self.balance * (percent / 100)).astype(np.int64)
+        taxes = np.clip(taxes, 0, None)
+        changed = self._commit(balance=self.balance - taxes)
+        collected = float((taxes * self.exchange_rate).sum())
+        return {"factions": changed, "collected": collected}
+
+    def apply_resource_event(self, resource: str, percent: float) -> Dict:
+        """Fait varier une ressource de `percent` % pour toutes les factions (ex: -20 pour une famine)"""
+        column = RESOURCES.index(resource)
+        self.refresh()
+        resources = self.resources.copy()
+        resources[:, column] = np.maximum(
+            0, np.floor(resources[:, column] * (1 + percent / 100))
+        ).astype(np.int64)
+        delta = int((resources[:, column] - self.resources[:, column]).sum())
+        changed = self._commit(resources=resources)
+        return {"factions": changed, "delta": delta}
+
+    def grant_resources(self, amounts: Dict[str, int]) -> int:
+        """Ajoute les mêmes quantités de ressources à toutes les factions"""
+        self.refresh()
+        vector = np.array([amounts.get(resource, 0) for resource in RESOURCES], dtype=np.int64)
+        return self._commit(resources=np.maximum(0, self.resources + vector))
+
+    # Statistiques
+
+    def statistics(self) -> Dict:
+        """Totaux et répartition de l'économie (monnaie convertie en monnaie générale)"""
+        self.refresh()
+        count = len(self.names)
+        general = self.balance * self.exchange_rate
+        stats = {
+            "factions": count,
+            "general_total": float(general.sum()),
+            "general_mean": float(general.mean()) if count else 0.0,
+            "general_median": float(np.median(general)) if count else 0.0,
+            "richest": self.names[int(general.argmax())] if count else None,
+            "resources": {resource: int(total) for resource, total in zip(RESOURCES, self.resources.sum(axis=0))},
+            "buildings": {building: int((self.buildings[:, i] > 0).sum()) for i, building in enumerate(self.building_ids)},
+            "building_levels": int(self.buildings.sum()),
+        }
+        return stats
@@ -0,0 +1,117 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+from math import gcd
+from typing import Dict, Mapping, NamedTuple, Tuple
+from building_catalog import BuildingCatalog
+from faction_store import FactionStore
+
+# Les taux sont manipulés en millionièmes de monnaie générale
+RATE_SCALE = 1_000_000
+# Taux de change maximal : borne les produits en virgule fixe des conversions
+MAX_RATE = 1_000_000
+
+
+def to_fixed(rate) -> int:
+    """Convertit un taux (float ou chaîne) en entier à virgule fixe"""
+    return int((Decimal(str(rate)) * RATE_SCALE).quantize(Decimal(1), rounding=ROUND_HALF_EVEN))
+
+
+class Quote(NamedTuple):
+    source: str
+    target: str
+    amount: int
+    converted: int
+    numerator: int
+    denominator: int
+
+    @property
+    def rate(self) -> float:
+        """Taux croisé approximatif, pour l'affichage"""
+        return self.numerator / self.denominator
+
+
+class ExchangeEngine:
+    """Conversion exacte entre monnaies de factions.
+
+    Chaque faction a un taux effectif en virgule fixe : son taux de change
+    majoré du bonus de son Marché, qui s'applique quand elle envoie de la
+    monnaie. Ces taux sont mis en cache par faction et invalidés en O(1) par
+    un numéro de version quand la faction change de taux ou de Marché. Le
+    taux croisé source → cible est une fraction irréductible d'entiers,
+    réduite à chaque cotation par un seul pgcd : rien n'est conservé par
+    paire, la mémoire reste proportionnelle au nombre de factions. La
+    conversion elle-même est une multiplication et une division entières.
+    """
+
+    def __init__(self, store: FactionStore, catalog: BuildingCatalog):
+        self.store = store
+        self.catalog = catalog
+        # nom -> (version, taux de vente majoré en RATE_SCALE * 100, taux d'achat en RATE_SCALE)
+        self._rates: Dict[str, Tuple[int, int, int]] = {}
+        self._versions: Dict[str, int] = {}
+        self._catalog_version = catalog.version
+
+    def _market_bonus(self, data: Mapping) -> int:
+        level = data.get("buildings", {}).get("marche", 0)
+        building = self.catalog.get("marche")
+        level_info = building.level(level) if building and level else None
+        return level_info.exchange_bonus if level_info else 0
+
+    def update_faction(self, faction_name: str):
+        """Recalcule les taux d'une faction après un changement de taux ou de Marché"""
+        data = self.store.get(faction_name)
+        version = self._versions.get(faction_name, 0) + 1
+        self._versions[faction_name] = version
+        if data is None:
+            self._rates.pop(faction_name, None)
+            return
+        self._rates[faction_name] = (version, *self._fixed_rates(data))
+
+    def _fixed_rates(self, data: Mapping) -> Tuple[int, int]:
+        """Taux de vente majoré du bonus du Marché et taux d'achat, tous deux en RATE_SCALE * 100"""
+        base = to_fixed(data["exchange_rate"])
+        return base * (100 + self._market_bonus(data)), base * 100
+
+    def _rate(self, faction_name: str) -> Tuple[int, int, int]:
+        if self._catalog_version != self.catalog.version:
+            # Les bonus du Marché ont pu changer : tous les taux seront recalculés à la demande
+            self._rates.clear()
+            self._catalog_version = self.catalog.version
+        rates = self._rates.get(faction_name)
+        if rates is None:
+            self.update_faction(faction_name)
+            rates = self._rates[faction_name]
+        return rates
+
+    def cross_rate(self, source: str, target: str) -> Tuple[int, int]:
+        """Taux croisé source → cible sous forme de fraction (numérateur, dénominateur)"""
+        _, sell, _ = self._rate(source)
+        _, _, buy = self._rate(target)
+        return self._reduce(sell, buy)
+
+    @staticmethod
+    def _reduce(sell: int, buy: int) -> Tuple[int, int]:
+        divisor = gcd(sell, buy)
+        return sell // divisor, buy // divisor
+
+    def quote(self, source: str, target: str, amount: int) -> Quote:
+        """Montant reçu par `target` pour `amount` unités envoyées par `source` (arrondi à l'unité inférieure)"""
+        self._check_quote(self.store, source, target, amount)
+        numerator, denominator = self.cross_rate(source, target)
+        return Quote(source, target, amount, amount * numerator // denominator, numerator, denominator)
+
+    @staticmethod
+    def _check_quote(factions, source: str, target: str, amount: int):
+        if source not in factions:
+            raise ValueError(f"La faction '{source}' n'existe pas !")
+        if target not in factions:
+            raise ValueError(f"La faction cible '{target}' n'existe pas !")
+        if amount <= 0:
+            raise ValueError("Le montant doit être positif !")
+
+    def published_quote(self, factions: Mapping[str, Mapping], source: str, target: str, amount: int) -> Quote:
+        """Comme quote(), calculé sur un instantané publié sans toucher aux caches (lecture seule, tout thread)"""
+        self._check_quote(factions, source, target, amount)
+        sell, _ = self._fixed_rates(factions[source])
+        _, buy = self._fixed_rates(factions[target])
+        numerator, denominator = self._reduce(sell, buy)
+        return Quote(source, target, amount, amount * numerator // denominator, numerator, denominator)
@@ -0,0 +1,91 @@
+import discord
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+
+class FactionIndex:
+    """Index des rôles et des membres vers le nom de leur faction.
+
+    Remplace le parcours de toutes les factions (et de tous les rôles du
+    membre) à chaque commande par des recherches en O(1). L'index des rôles
+    est construit depuis le stockage ; celui des membres au démarrage du bot
+    puis tenu à jour par les événements de changement de rôles.
+
+    Un index ne couvre qu'un serveur : les membres sont indexés par leur seul
+    identifiant. Avec `verify_roles` (cache des membres allégé), les
+    événements de rôles n'arrivent pas pour les membres hors cache : la
+    faction est alors toujours déduite des rôles reçus avec la commande, et
+    l'index ne garde que les membres qui appartiennent à une faction.
+    """
+
+    def __init__(self, verify_roles: bool = False):
+        self.verify_roles = verify_roles
+        self._by_role: Dict[int, str] = {}
+        self._by_member: Dict[int, str] = {}
+
+    def load(self, factions: Iterable[Tuple[str, Dict]]):
+        """Construit l'index des rôles depuis les données des factions"""
+        self._by_role = {data["role_id"]: name for name, data in factions}
+
+    def build_members(self, guilds: Iterable[discord.Guild]):
+        """Construit l'index des membres depuis le cache des serveurs"""
+        self._by_member.clear()
+        for guild in guilds:
+            # Un seul parcours des membres (role.members reparcourt tout le serveur pour chaque rôle)
+            for member in guild.members:
+                faction_name = self._faction_from_roles(member)
+                if faction_name is not None:
+                    self._by_member[member.id] = faction_name
+
+    def add_faction(self, faction_name: str, role_id: int):
+        self._by_role[role_id] = faction_name
+
+    def faction_for_role(self, role_id: int) -> Optional[str]:
+        return self._by_role.get(role_id)
+
+    def faction_for_member(self, member: discord.Member) -> Optional[str]:
+        """Renvoie le nom de la faction du membre, ou None"""
+        if self.verify_roles:
+            self.update_member(member)
+            return self._by_member.get(member.id)
+        faction_name = self._by_member.get(member.id)
+        if faction_name is not None:
+            return faction_name
+        # Membre absent de l'index (cache incomplet) : on ne parcourt que ses propres rôles
+        faction_name = self._faction_from_roles(member)
+        if faction_name is not None:
+            self._by_member[member.id] = faction_name
+        return faction_name
+
+    def _faction_from_roles(self, member: discord.Member) -> Optional[str]:
+        for role in member.roles:
+            faction_name = self._by_role.get(role.id)
+            if faction_name is not None:
+                return faction_name
+        return None
+
+    def add_member(self, member: discord.Member, faction_name: str):
+        """Rattache un membre à une faction (le cache de ses rôles n'est pas encore à jour)"""
+        self._by_member[member.id] = faction_name
+
+    def update_member(self, member: discord.Member):
+        """Met à jour l'index après un changement de rôles du membre"""
+        faction_name = self._faction_from_roles(member)
+        if faction_name is None:
+            self._by_member.pop(member.id, None)
+        else:
+            self._by_member[member.id] = faction_name
+
+    def remove_member(self, member: Union[discord.Member, discord.User]):
+        self._by_member.pop(member.id, None)
+
+    def remove_role(self, role: discord.Role):
+        """Retire un rôle supprimé et les membres qui y étaient rattachés"""
+        faction_name = self._by_role.pop(role.id, None)
+        if faction_name is None:
+            return
+        stale = [member_id for member_id, name in self._by_member.items() if name == faction_name]
+        for key in stale:
+            del self._by_member[key]
+
+    def member_count(self) -> int:
+        return len(self._by_member)
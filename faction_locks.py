@@ -0,0 +1,37 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+
+class FactionLockManager:
+    """Verrous asynchrones par faction.
+
+    Une opération ne verrouille que les factions qu'elle modifie : les
+    transferts A→B et C→D avancent en parallèle, tandis que A→B et B→A sont
+    sérialisés. Les verrous sont toujours pris dans l'ordre des noms pour
+    éviter les interblocages entre opérations à deux parties.
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock_for(self, faction_name: str) -> asyncio.Lock:
+        lock = self._locks.get(faction_name)
+        if lock is None:
+            lock = self._locks[faction_name] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def acquire(self, *faction_names: Optional[str]):
+        """Verrouille les factions données (les doublons et None sont ignorés)"""
+        ordered = sorted({name for name in faction_names if name})
+        acquired = []
+        try:
+            for name in ordered:
+                lock = self._lock_for(name)
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
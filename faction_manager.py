@@ -1,38 +1,90 @@
-
+import asyncio
 import discord
-import json
-import os
-from typing import Dict, Optional
+import math
+import tempfile
+import time
+from typing import IO, Dict, List, Optional, Set, Tuple
+from building_catalog import RESOURCES, BuildingCatalog
+from bulk_economy import FORMATS, field_name, validate, write_export
+from economy_engine import EconomyEngine, np
+from exchange import MAX_RATE, ExchangeEngine, Quote, to_fixed
+from faction_index import FactionIndex
+from faction_locks import FactionLockManager
+from faction_storage import create_backend
+from faction_store import FactionStore
+from leaderboard import Leaderboards
+from metrics import DISCORD_API_DURATION, ERRORS
+from production import accrue, production_rates
 
 class FactionManager:
-    def __init__(self, filename: str = "data/factions.json"):
+    def __init__(self, filename: str = "data/factions.json", flush_interval: float = 2.0,
+                 journal: bool = True, backend: str = "json", catalog_filename: str = "data/buildings.json",
+                 api_concurrency: int = 4, catalog: Optional[BuildingCatalog] = None, lean_members: bool = False):
         self.filename = filename
-        self._ensure_data_file()
+        # Le catalogue peut être partagé entre les gestionnaires de plusieurs serveurs
+        self.catalog = catalog if catalog is not None else BuildingCatalog(catalog_filename)
+        self.store = FactionStore(create_backend(backend, filename, journal=journal), flush_interval=flush_interval)
+        # Sans cache des membres, l'appartenance est vérifiée sur les rôles reçus avec chaque commande
+        self.index = FactionIndex(verify_roles=lean_members)
+        self.index.load(self.store.items())
+        self.locks = FactionLockManager()
+        # Appels simultanés à l'API Discord par serveur (discord.py gère en plus les buckets de limite de débit)
+        self.api_concurrency = api_concurrency
+        self._api_limits: Dict[int, asyncio.Semaphore] = {}
+        # Noms réservés par les créations en cours
+        self._creating: Set[str] = set()
+        self.exchange = ExchangeEngine(self.store, self.catalog)
+        # Moteur en colonnes pour les opérations globales, disponible seulement avec NumPy
+        self.economy = EconomyEngine(self.store, self.catalog) if np is not None else None
+        # Classements tenus à jour par les notifications du stockage
+        self.leaderboards = Leaderboards(self.store, self.catalog)
 
-    def _ensure_data_file(self):
-        """Assure que le fichier de données des factions existe"""
-        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
-        if not os.path.exists(self.filename):
-            with open(self.filename, 'w') as f:
-                json.dump({}, f)
+    def start(self):
+        """Démarre l'écriture différée (à appeler depuis la boucle du bot si elle existe)"""
+        self.store.start()
 
-    def _load_factions(self) -> Dict:
-        """Charge les données des factions depuis le fichier JSON"""
-        try:
-            with open(self.filename, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Erreur lors du chargement des factions: {e}")
-            return {}
+    def close(self):
+        """Enregistre les modifications en attente et arrête l'écriture différée"""
+        self.store.close()
 
-    def _save_factions(self, data: Dict):
-        """Enregistre les données des factions dans le fichier JSON"""
-        try:
-            with open(self.filename, 'w') as f:
-                json.dump(data, f, indent=4)
-        except Exception as e:
-            print(f"Erreur lors de l'enregistrement des factions: {e}")
-            raise
+    async def close_async(self):
+        """Comme close(), sans bloquer la boucle d'événements"""
+        await self.store.close_async()
+
+    def get_user_faction(self, member: discord.Member) -> Optional[str]:
+        """Renvoie le nom de la faction du membre, ou None s'il n'en a pas"""
+        return self.index.faction_for_member(member)
+
+    def _accrue(self, faction_name: str, force: bool = False):
+        """Ajoute à la faction les ressources produites depuis le dernier calcul.
+
+        Calcul en O(1) à partir de l'horodatage du dernier calcul et du
+        vecteur de production ; à appeler sous le verrou de la faction. Sans
+        `force`, rien n'est écrit tant qu'aucune unité entière n'est produite.
+        """
+        now = time.time()
+        data = self.store.get(faction_name)
+        if "production" not in data:
+            # Faction antérieure au calcul de la production : elle produit à partir de maintenant
+            self._update_production(faction_name)
+            return
+        rates = data["production"]
+        if not rates:
+            return
+        elapsed = max(0.0, now - data.get("last_accrual", now))
+        gained, carry = accrue(rates, data.get("production_carry", {}), elapsed)
+        if not gained and not force:
+            return
+        for resource, amount in gained.items():
+            self.store.increment(faction_name, f"resources.{resource}", amount)
+        self.store.set(faction_name, "production_carry", carry)
+        self.store.set(faction_name, "last_accrual", now)
+
+    def _update_production(self, faction_name: str):
+        """Recalcule le vecteur de production après un changement de bâtiments"""
+        data = self.store.get(faction_name)
+        self.store.set(faction_name, "production", production_rates(self.catalog, data.get("buildings", {})))
+        self.store.set(faction_name, "last_accrual", time.time())
 
     async def _check_bot_permissions(self, interaction: discord.Interaction):
         """Vérifie si le bot a les permissions nécessaires"""
@@ -52,47 +104,81 @@ class FactionManager:
         if missing_permissions:
             raise ValueError(f"Le bot manque des permissions requises: {', '.join(missing_permissions)}")
 
+    async def _discord_call(self, guild: discord.Guild, call: str, coroutine):
+        """Appel à l'API Discord, limité en parallèle par serveur et mesuré"""
+        limit = self._api_limits.get(guild.id)
+        if limit is None:
+            limit = self._api_limits[guild.id] = asyncio.Semaphore(self.api_concurrency)
+        async with limit:
+            with DISCORD_API_DURATION.time(call=call):
+                return await coroutine
+
+    async def _run_steps(self, created: List, *steps):
+        """Exécute des étapes indépendantes en parallèle ; les objets créés sont notés pour l'annulation"""
+        results = await asyncio.gather(*steps, return_exceptions=True)
+        for result in results:
+            if hasattr(result, "delete"):
+                created.append(result)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    async def _rollback_creation(self, guild: discord.Guild, created: List):
+        """Supprime, dans l'ordre inverse de création, ce qui a été créé sur Discord"""
+        for obj in reversed(created):
+            try:
+                await self._discord_call(guild, "delete", obj.delete(reason="Annulation de la création de faction"))
+            except Exception as e:
+                print(f"Erreur lors de l'annulation de la création de faction: {e}")
+
     async def create_faction(self, interaction: discord.Interaction, faction_name: str):
-        """Crée une nouvelle faction avec rôle et canaux associés"""
+        """Crée une nouvelle faction avec rôle et canaux associés.
+
+        Les appels indépendants sont lancés en parallèle : la catégorie et
+        l'attribution du rôle dès que le rôle existe, puis les deux salons.
+        En cas d'échec, tout ce qui a été créé est supprimé.
+        """
         # Vérifie d'abord les permissions du bot
         await self._check_bot_permissions(interaction)
 
-        # Charge les factions actuelles
-        factions = self._load_factions()
-
-        # Vérifie si la faction existe déjà
-        if faction_name in factions:
+        # Vérifie si la faction existe déjà (ou est en cours de création)
+        if faction_name in self.store or faction_name in self._creating:
             raise ValueError("Une faction avec ce nom existe déjà !")
 
-        # Crée le rôle
+        guild = interaction.guild
+        created = []
+        self._creating.add(faction_name)
         try:
-            role = await interaction.guild.create_role(
+            # Crée le rôle
+            role = await self._discord_call(guild, "create_role", guild.create_role(
                 name=faction_name,
                 reason="Création de Faction",
                 color=discord.Color.random()  # Couleur aléatoire pour distinction visuelle
-            )
+            ))
+            created.append(role)
 
-            # Crée la catégorie avec les permissions appropriées
+            # Crée la catégorie avec les permissions appropriées et ajoute le rôle au membre
             overwrites = {
-                interaction.guild.default_role: discord.PermissionOverwrite(read_messages=False),
+                guild.default_role: discord.PermissionOverwrite(read_messages=False),
                 role: discord.PermissionOverwrite(read_messages=True, send_messages=True),
-                interaction.guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True)
+                guild.me: discord.PermissionOverwrite(read_messages=True, send_messages=True)
             }
-
-            category = await interaction.guild.create_category(
-                name=faction_name,
-                overwrites=overwrites
+            category, _ = await self._run_steps(
+                created,
+                self._discord_call(guild, "create_category", guild.create_category(name=faction_name, overwrites=overwrites)),
+                self._discord_call(guild, "add_roles", interaction.user.add_roles(role))
             )
 
             # Crée les canaux textuels et vocaux
-            text_channel = await category.create_text_channel(f"{faction_name.lower()}-discussion")
-            voice_channel = await category.create_voice_channel(f"{faction_name.lower()}-vocal")
-
-            # Ajoute le rôle au membre
-            await interaction.user.add_roles(role)
+            text_channel, voice_channel = await self._run_steps(
+                created,
+                self._discord_call(guild, "create_text_channel", category.create_text_channel(f"{faction_name.lower()}-discussion")),
+                self._discord_call(guild, "create_voice_channel", category.create_voice_channel(f"{faction_name.lower()}-vocal"))
+            )
 
             # Enregistre les données de la faction
-            factions[faction_name] = {
+            self.store.create(faction_name, {
                 "leader": interaction.user.id,
                 "balance": 0,
                 "currency_name": f"{faction_name}Coin",
@@ -107,376 +193,412 @@ class FactionManager:
                     "fer": 20,
                     "or": 5
                 },
-                "buildings": {}
-            }
-            self._save_factions(factions)
+                "buildings": {},
+                "production": {},
+                "last_accrual": time.time()
+            })
+            self.index.add_faction(faction_name, role.id)
+            self.index.add_member(interaction.user, faction_name)
 
             return f"Faction '{faction_name}' créée avec succès avec des canaux et un rôle dédiés !"
 
         except discord.Forbidden:
+            ERRORS.inc(source="create_faction", type="Forbidden")
             # Nettoyage en cas d'échec
-            if 'role' in locals():
-                await role.delete()
-            if 'category' in locals():
-                await category.delete()
+            await self._rollback_creation(guild, created)
             raise ValueError("Le bot n'a pas les permissions requises pour créer des factions !")
         except Exception as e:
+            ERRORS.inc(source="create_faction", type=type(e).__name__)
             # Nettoyage en cas d'échec
-            if 'role' in locals():
-                await role.delete()
-            if 'category' in locals():
-                await category.delete()
+            await self._rollback_creation(guild, created)
             raise Exception(f"Échec de la création de faction: {str(e)}")
+        finally:
+            self._creating.discard(faction_name)
 
     async def join_faction(self, interaction: discord.Interaction, faction_name: str):
         """Permet à un utilisateur de rejoindre une faction existante"""
         # Vérifie d'abord les permissions du bot
         await self._check_bot_permissions(interaction)
 
-        factions = self._load_factions()
-
-        if faction_name not in factions:
+        if faction_name not in self.store:
             raise ValueError("Cette faction n'existe pas !")
 
         # Vérifie si l'utilisateur est déjà dans une faction
-        member_roles = [role.name for role in interaction.user.roles]
-        for faction in factions.keys():
-            if faction in member_roles:
-                raise ValueError("Vous êtes déjà dans une faction !")
+        if self.get_user_faction(interaction.user):
+            raise ValueError("Vous êtes déjà dans une faction !")
 
         # Ajoute l'utilisateur à la faction
-        role = interaction.guild.get_role(factions[faction_name]["role_id"])
+        role = interaction.guild.get_role(self.store.get(faction_name)["role_id"])
         if not role:
             raise ValueError("Rôle de faction non trouvé !")
 
         try:
             await interaction.user.add_roles(role)
+            self.index.add_member(interaction.user, faction_name)
             return f"Faction '{faction_name}' rejointe avec succès !"
         except discord.Forbidden:
             raise ValueError("Le bot n'a pas la permission d'attribuer des rôles !")
             
-    async def set_exchange_rate(self, interaction: discord.Interaction, rate: float):
+    async def set_exchange_rate(self, member: discord.Member, rate: float):
         """Définit le taux de change de la faction de l'utilisateur"""
         # Vérifie que l'utilisateur est dans une faction et qu'il en est le chef
-        factions = self._load_factions()
-        user_faction = None
-        
-        for faction_name, faction_data in factions.items():
-            role = interaction.guild.get_role(faction_data["role_id"])
-            if role and role in interaction.user.roles:
-                user_faction = faction_name
-                break
+        user_faction = self.get_user_faction(member)
                 
         if not user_faction:
             raise ValueError("Vous n'êtes pas membre d'une faction !")
             
         # Vérifie que l'utilisateur est le chef de la faction
-        if factions[user_faction]["leader"] != interaction.user.id:
+        if self.store.get(user_faction)["leader"] != member.id:
             raise ValueError("Seul le chef de faction peut modifier le taux de change !")
             
-        # Vérifie que le taux est positif
-        if rate <= 0:
-            raise ValueError("Le taux de change doit être un nombre positif !")
+        # Vérifie que le taux est un nombre fini, positif une fois arrondi au millionième, et borné
+        if not math.isfinite(rate) or to_fixed(rate) <= 0:
+            raise ValueError("Le taux de change doit être un nombre positif (au moins 0.000001) !")
+        if rate > MAX_RATE:
+            raise ValueError(f"Le taux de change ne peut pas dépasser {MAX_RATE} !")
             
-        # Met à jour le taux de change
-        factions[user_faction]["exchange_rate"] = rate
-        self._save_factions(factions)
+        async with self.locks.acquire(user_faction):
+            # Met à jour le taux de change
+            self.store.set(user_faction, "exchange_rate", rate)
+            self.exchange.update_faction(user_faction)
         
-        return f"Taux de change de '{user_faction}' modifié avec succès ! 1 {factions[user_faction]['currency_name']} = {rate} monnaie générale"
+        return f"Taux de change de '{user_faction}' modifié avec succès ! 1 {self.store.get(user_faction)['currency_name']} = {rate} monnaie générale"
         
-    async def add_currency(self, interaction: discord.Interaction, faction_name: str, amount: int):
+    async def add_currency(self, member: discord.Member, faction_name: str, amount: int):
         """Ajoute de la monnaie à une faction (commande admin)"""
-        if not interaction.user.guild_permissions.administrator:
+        if not member.guild_permissions.administrator:
             raise ValueError("Cette commande est réservée aux administrateurs !")
             
-        factions = self._load_factions()
-        
-        if faction_name not in factions:
+        if faction_name not in self.store:
             raise ValueError(f"La faction '{faction_name}' n'existe pas !")
             
-        factions[faction_name]["balance"] += amount
-        self._save_factions(factions)
+        async with self.locks.acquire(faction_name):
+            self.store.increment(faction_name, "balance", amount)
         
-        return f"{amount} {factions[faction_name]['currency_name']} ajoutés à la faction '{faction_name}' !"
+        return f"{amount} {self.store.get(faction_name)['currency_name']} ajoutés à la faction '{faction_name}' !"
         
-    async def transfer_currency(self, interaction: discord.Interaction, target_faction: str, amount: int):
+    async def transfer_currency(self, member: discord.Member, target_faction: str, amount: int):
         """Transfère de la monnaie entre factions selon les taux de change"""
-        factions = self._load_factions()
-        
         # Trouve la faction de l'utilisateur
-        source_faction = None
-        for faction_name, faction_data in factions.items():
-            role = interaction.guild.get_role(faction_data["role_id"])
-            if role and role in interaction.user.roles:
-                source_faction = faction_name
-                break
+        source_faction = self.get_user_faction(member)
                 
         if not source_faction:
             raise ValueError("Vous n'êtes pas membre d'une faction !")
             
-        if target_faction not in factions:
+        if target_faction not in self.store:
             raise ValueError(f"La faction cible '{target_faction}' n'existe pas !")
             
         if source_faction == target_faction:
             raise ValueError("Vous ne pouvez pas transférer vers votre propre faction !")
             
-        # Vérifie que l'utilisateur a assez de monnaie
-        if factions[source_faction]["balance"] < amount:
-            raise ValueError(f"Solde insuffisant ! Vous avez {factions[source_faction]['balance']} {factions[source_faction]['currency_name']}")
+        async with self.locks.acquire(source_faction, target_faction):
+            source_data = self.store.get(source_faction)
+            target_data = self.store.get(target_faction)
             
-        # Calcul du montant converti selon les taux de change
-        source_rate = factions[source_faction]["exchange_rate"]  # Taux source -> monnaie générale
-        target_rate = factions[target_faction]["exchange_rate"]  # Taux cible -> monnaie générale
-        
-        # Conversion: montant en monnaie source -> monnaie générale -> monnaie cible
-        general_currency = amount * source_rate
-        converted_amount = int(general_currency / target_rate)
+            # Conversion exacte: monnaie source -> monnaie générale -> monnaie cible (bonus du Marché inclus)
+            converted_amount = self.exchange.quote(source_faction, target_faction, amount).converted
+            
+            # Vérifie que l'utilisateur a assez de monnaie
+            if source_data["balance"] < amount:
+                raise ValueError(f"Solde insuffisant ! Vous avez {source_data['balance']} {source_data['currency_name']}")
         
-        # Effectue le transfert
-        factions[source_faction]["balance"] -= amount
-        factions[target_faction]["balance"] += converted_amount
-        self._save_factions(factions)
+            # Effectue le transfert
+            self.store.increment(source_faction, "balance", -amount)
+            self.store.increment(target_faction, "balance", converted_amount)
         
-        return f"Transfert réussi ! Vous avez envoyé {amount} {factions[source_faction]['currency_name']} à '{target_faction}', qui a reçu {converted_amount} {factions[target_faction]['currency_name']}"
+            return f"Transfert réussi ! Vous avez envoyé {amount} {source_data['currency_name']} à '{target_faction}', qui a reçu {converted_amount} {target_data['currency_name']}"
         
-    async def get_resources(self, interaction: discord.Interaction):
+    async def get_resources(self, member: discord.Member):
         """Affiche les ressources de la faction de l'utilisateur"""
-        factions = self._load_factions()
-        
         # Trouve la faction de l'utilisateur
-        user_faction = None
-        for faction_name, faction_data in factions.items():
-            role = interaction.guild.get_role(faction_data["role_id"])
-            if role and role in interaction.user.roles:
-                user_faction = faction_name
-                break
+        user_faction = self.get_user_faction(member)
                 
         if not user_faction:
             raise ValueError("Vous n'êtes pas membre d'une faction !")
             
-        return factions[user_faction]["resources"]
+        async with self.locks.acquire(user_faction):
+            self._accrue(user_faction)
+            return dict(self.store.get(user_faction)["resources"])
     
-    async def add_resource(self, interaction: discord.Interaction, resource_name: str, amount: int):
+    async def add_resource(self, member: discord.Member, resource_name: str, amount: int):
         """Ajoute une ressource à la faction (commande admin)"""
-        if not interaction.user.guild_permissions.administrator:
+        if not member.guild_permissions.administrator:
             raise ValueError("Cette commande est réservée aux administrateurs !")
             
         # Vérifie que la ressource existe
-        valid_resources = ["bois", "pierre", "fer", "or"]
-        if resource_name not in valid_resources:
-            raise ValueError(f"Ressource invalide ! Les ressources disponibles sont: {', '.join(valid_resources)}")
-        
-        factions = self._load_factions()
+        if resource_name not in RESOURCES:
+            raise ValueError(f"Ressource invalide ! Les ressources disponibles sont: {', '.join(RESOURCES)}")
         
         # Trouve la faction de l'utilisateur
-        user_faction = None
-        for faction_name, faction_data in factions.items():
-            role = interaction.guild.get_role(faction_data["role_id"])
-            if role and role in interaction.user.roles:
-                user_faction = faction_name
-                break
+        user_faction = self.get_user_faction(member)
                 
         if not user_faction:
             raise ValueError("Vous n'êtes pas membre d'une faction !")
         
-        # Ajoute la ressource
-        factions[user_faction]["resources"][resource_name] += amount
-        self._save_factions(factions)
+        async with self.locks.acquire(user_faction):
+            self._accrue(user_faction)
+            # Ajoute la ressource
+            self.store.increment(user_faction, f"resources.{resource_name}", amount)
         
         return f"{amount} {resource_name} ajoutés à votre faction !"
     
+    async def add_resource_to_faction(self, faction_name: str, resource_name: str, amount: int):
+        """Ajoute une ressource à une faction donnée (commande admin)"""
+        if faction_name not in self.store:
+            raise ValueError(f"La faction '{faction_name}' n'existe pas !")
+            
+        if resource_name not in RESOURCES:
+            raise ValueError(f"Ressource invalide ! Les ressources disponibles sont: {', '.join(RESOURCES)}")
+            
+        async with self.locks.acquire(faction_name):
+            self._accrue(faction_name)
+            self.store.increment(faction_name, f"resources.{resource_name}", amount)
+            
+        return f"{amount} {resource_name} ajoutés à la faction '{faction_name}' !"
+    
     def get_available_buildings(self):
         """Renvoie la liste des bâtiments disponibles à la construction"""
-        return {
-            "quartier_general": {
-                "nom": "Quartier Général",
-                "description": "Centre de commandement de la faction",
-                "niveaux": {
-                    1: {"cout": {"bois": 100, "pierre": 50}, "bonus": "Débloque la construction d'autres bâtiments"},
-                    2: {"cout": {"bois": 200, "pierre": 100, "fer": 20}, "bonus": "+10% de production de ressources"},
-                    3: {"cout": {"bois": 400, "pierre": 200, "fer": 50, "or": 10}, "bonus": "+25% de production de ressources"}
-                }
-            },
-            "mine": {
-                "nom": "Mine",
-                "description": "Produit de la pierre et du fer",
-                "niveaux": {
-                    1: {"cout": {"bois": 50, "pierre": 30}, "bonus": "Production: +5 pierre par jour"},
-                    2: {"cout": {"bois": 100, "pierre": 60, "fer": 10}, "bonus": "Production: +10 pierre, +3 fer par jour"},
-                    3: {"cout": {"bois": 200, "pierre": 120, "fer": 30, "or": 5}, "bonus": "Production: +20 pierre, +8 fer, +1 or par jour"}
-                }
-            },
-            "scierie": {
-                "nom": "Scierie",
-                "description": "Produit du bois",
-                "niveaux": {
-                    1: {"cout": {"bois": 30, "pierre": 50}, "bonus": "Production: +10 bois par jour"},
-                    2: {"cout": {"bois": 60, "pierre": 100, "fer": 10}, "bonus": "Production: +25 bois par jour"},
-                    3: {"cout": {"bois": 120, "pierre": 200, "fer": 30, "or": 5}, "bonus": "Production: +60 bois par jour"}
-                }
-            },
-            "forge": {
-                "nom": "Forge",
-                "description": "Améliore l'efficacité des ressources",
-                "niveaux": {
-                    1: {"cout": {"bois": 80, "pierre": 100, "fer": 30}, "bonus": "+5% d'efficacité des ressources"},
-                    2: {"cout": {"bois": 160, "pierre": 200, "fer": 60, "or": 5}, "bonus": "+15% d'efficacité des ressources"},
-                    3: {"cout": {"bois": 320, "pierre": 400, "fer": 120, "or": 15}, "bonus": "+30% d'efficacité des ressources"}
-                }
-            },
-            "marche": {
-                "nom": "Marché",
-                "description": "Améliore les échanges entre factions",
-                "niveaux": {
-                    1: {"cout": {"bois": 150, "pierre": 100, "fer": 20}, "bonus": "+5% sur les taux d'échange"},
-                    2: {"cout": {"bois": 300, "pierre": 200, "fer": 40, "or": 10}, "bonus": "+15% sur les taux d'échange"},
-                    3: {"cout": {"bois": 600, "pierre": 400, "fer": 80, "or": 25}, "bonus": "+30% sur les taux d'échange"}
-                }
-            },
-            # Nouveaux bâtiments administratifs
-            "palais": {
-                "nom": "Palais",
-                "description": "Centre administratif et politique de la faction",
-                "niveaux": {
-                    1: {"cout": {"bois": 200, "pierre": 150, "fer": 40}, "bonus": "+5% de diplomatie avec autres factions"},
-                    2: {"cout": {"bois": 400, "pierre": 300, "fer": 80, "or": 15}, "bonus": "+15% de diplomatie, débloque les alliances"},
-                    3: {"cout": {"bois": 800, "pierre": 600, "fer": 160, "or": 40}, "bonus": "+30% de diplomatie, permet de créer des pactes commerciaux"}
-                }
-            },
-            "academie": {
-                "nom": "Académie",
-                "description": "Centre de recherche et de développement",
-                "niveaux": {
-                    1: {"cout": {"bois": 180, "pierre": 180, "fer": 30}, "bonus": "Débloque 2 technologies de base"},
-                    2: {"cout": {"bois": 360, "pierre": 360, "fer": 60, "or": 10}, "bonus": "Débloque 3 technologies avancées"},
-                    3: {"cout": {"bois": 720, "pierre": 720, "fer": 120, "or": 30}, "bonus": "Débloque les technologies de prestige"}
-                }
-            },
-            "tresorerie": {
-                "nom": "Trésorerie",
-                "description": "Sécurise et augmente les finances de la faction",
-                "niveaux": {
-                    1: {"cout": {"bois": 100, "pierre": 200, "fer": 50}, "bonus": "+10% de revenus quotidiens"},
-                    2: {"cout": {"bois": 200, "pierre": 400, "fer": 100, "or": 20}, "bonus": "+25% de revenus quotidiens, +5% d'intérêts"},
-                    3: {"cout": {"bois": 400, "pierre": 800, "fer": 200, "or": 50}, "bonus": "+50% de revenus quotidiens, +15% d'intérêts"}
-                }
-            },
-            "tribunal": {
-                "nom": "Tribunal",
-                "description": "Gère les lois et la justice de la faction",
-                "niveaux": {
-                    1: {"cout": {"bois": 150, "pierre": 150, "fer": 20}, "bonus": "Permet de créer 3 lois internes"},
-                    2: {"cout": {"bois": 300, "pierre": 300, "fer": 40, "or": 10}, "bonus": "Permet de créer 6 lois internes, améliore la stabilité"},
-                    3: {"cout": {"bois": 600, "pierre": 600, "fer": 80, "or": 25}, "bonus": "Permet de créer 10 lois, influence les autres factions"}
-                }
-            },
-            "ambassade": {
-                "nom": "Ambassade",
-                "description": "Améliore les relations diplomatiques",
-                "niveaux": {
-                    1: {"cout": {"bois": 120, "pierre": 180, "fer": 30}, "bonus": "Permet d'envoyer 1 ambassadeur"},
-                    2: {"cout": {"bois": 240, "pierre": 360, "fer": 60, "or": 15}, "bonus": "Permet d'envoyer 3 ambassadeurs, +10% de relations"},
-                    3: {"cout": {"bois": 480, "pierre": 720, "fer": 120, "or": 35}, "bonus": "Permet d'envoyer 5 ambassadeurs, +25% de relations"}
-                }
-            }
-        }
+        return self.catalog.as_dict()
     
-    async def build(self, interaction: discord.Interaction, building_name: str):
+    async def build(self, member: discord.Member, building_name: str):
         """Construit ou améliore un bâtiment pour la faction"""
-        buildings = self.get_available_buildings()
+        buildings = self.catalog.buildings
         
         # Vérifie que le bâtiment existe
-        if building_name not in buildings:
+        building = buildings.get(building_name)
+        if building is None:
             raise ValueError(f"Bâtiment invalide ! Les bâtiments disponibles sont: {', '.join(buildings.keys())}")
         
-        factions = self._load_factions()
-        
         # Trouve la faction de l'utilisateur
-        user_faction = None
-        for faction_name, faction_data in factions.items():
-            role = interaction.guild.get_role(faction_data["role_id"])
-            if role and role in interaction.user.roles:
-                user_faction = faction_name
-                break
+        user_faction = self.get_user_faction(member)
                 
         if not user_faction:
             raise ValueError("Vous n'êtes pas membre d'une faction !")
             
-        # Vérifie que l'utilisateur est le chef de la faction
-        if factions[user_faction]["leader"] != interaction.user.id:
-            raise ValueError("Seul le chef de faction peut construire des bâtiments !")
+        async with self.locks.acquire(user_faction):
+            # Vérifie que l'utilisateur est le chef de la faction
+            faction_data = self.store.get(user_faction)
+            if faction_data["leader"] != member.id:
+                raise ValueError("Seul le chef de faction peut construire des bâtiments !")
             
-        # Vérifie si le bâtiment existe déjà et obtient le niveau actuel
-        faction_buildings = factions[user_faction].get("buildings", {})
-        current_level = faction_buildings.get(building_name, 0)
+            # Vérifie si le bâtiment existe déjà et obtient le niveau actuel
+            faction_buildings = faction_data.get("buildings", {})
+            current_level = faction_buildings.get(building_name, 0)
         
-        # Vérifie si le niveau suivant existe
-        if current_level + 1 not in buildings[building_name]["niveaux"]:
-            raise ValueError(f"Niveau maximum atteint pour ce bâtiment !")
+            # Vérifie si le niveau suivant existe
+            next_level = building.level(current_level + 1)
+            if next_level is None:
+                raise ValueError(f"Niveau maximum atteint pour ce bâtiment !")
             
-        # Vérifie si le quartier général de niveau 1 existe avant de construire d'autres bâtiments
-        if building_name != "quartier_general" and current_level == 0 and faction_buildings.get("quartier_general", 0) == 0:
-            raise ValueError("Vous devez d'abord construire un Quartier Général de niveau 1 !")
+            # Vérifie si le quartier général de niveau 1 existe avant de construire d'autres bâtiments
+            if building_name != "quartier_general" and current_level == 0 and faction_buildings.get("quartier_general", 0) == 0:
+                raise ValueError("Vous devez d'abord construire un Quartier Général de niveau 1 !")
             
-        # Obtient le coût du bâtiment
-        costs = buildings[building_name]["niveaux"][current_level + 1]["cout"]
-        
-        # Vérifie si la faction a assez de ressources
-        faction_resources = factions[user_faction]["resources"]
-        for resource, amount in costs.items():
-            if faction_resources.get(resource, 0) < amount:
-                raise ValueError(f"Ressources insuffisantes ! Il vous manque {amount - faction_resources.get(resource, 0)} {resource}.")
+            # Vérifie si la faction a assez de ressources (vecteurs de coût précalculés)
+            self._accrue(user_faction, force=True)
+            missing = self.catalog.missing_resource(faction_data["resources"], next_level)
+            if missing:
+                resource, amount = missing
+                raise ValueError(f"Ressources insuffisantes ! Il vous manque {amount} {resource}.")
         
-        # Déduit les ressources
-        for resource, amount in costs.items():
-            faction_resources[resource] -= amount
+            # Déduit les ressources
+            for resource, amount in next_level.cost.items():
+                self.store.increment(user_faction, f"resources.{resource}", -amount)
         
-        # Construit ou améliore le bâtiment
-        faction_buildings[building_name] = current_level + 1
-        factions[user_faction]["buildings"] = faction_buildings
+            # Construit ou améliore le bâtiment
+            self.store.set(user_faction, f"buildings.{building_name}", current_level + 1)
+            # Seul un changement de bâtiment modifie la production
+            self._update_production(user_faction)
+            if building_name == "marche":
+                self.exchange.update_faction(user_faction)
         
-        self._save_factions(factions)
-        
-        building_info = buildings[building_name]
-        level_info = building_info["niveaux"][current_level + 1]
-        
-        return f"Bâtiment '{building_info['nom']}' construit au niveau {current_level + 1} ! Bonus: {level_info['bonus']}"
+            return f"Bâtiment '{building.nom}' construit au niveau {next_level.level} ! Bonus: {next_level.bonus}"
     
-    async def transfer_resource(self, interaction: discord.Interaction, target_faction: str, resource: str, amount: int):
+    async def transfer_resource(self, member: discord.Member, target_faction: str, resource: str, amount: int):
         """Transfère des ressources à une autre faction"""
         # Vérifie que la ressource existe
-        valid_resources = ["bois", "pierre", "fer", "or"]
-        if resource not in valid_resources:
-            raise ValueError(f"Ressource invalide ! Les ressources disponibles sont: {', '.join(valid_resources)}")
+        if resource not in RESOURCES:
+            raise ValueError(f"Ressource invalide ! Les ressources disponibles sont: {', '.join(RESOURCES)}")
             
-        factions = self._load_factions()
-        
         # Trouve la faction de l'utilisateur
-        source_faction = None
-        for faction_name, faction_data in factions.items():
-            role = interaction.guild.get_role(faction_data["role_id"])
-            if role and role in interaction.user.roles:
-                source_faction = faction_name
-                break
+        source_faction = self.get_user_faction(member)
                 
         if not source_faction:
             raise ValueError("Vous n'êtes pas membre d'une faction !")
             
-        if target_faction not in factions:
+        if target_faction not in self.store:
             raise ValueError(f"La faction cible '{target_faction}' n'existe pas !")
             
         if source_faction == target_faction:
             raise ValueError("Vous ne pouvez pas transférer vers votre propre faction !")
             
-        # Vérifie que l'utilisateur a assez de ressources
-        source_resources = factions[source_faction]["resources"]
-        if source_resources.get(resource, 0) < amount:
-            raise ValueError(f"Ressources insuffisantes ! Vous avez {source_resources.get(resource, 0)} {resource}")
+        async with self.locks.acquire(source_faction, target_faction):
+            self._accrue(source_faction)
+            self._accrue(target_faction)
+            
+            # Vérifie que l'utilisateur a assez de ressources
+            source_resources = self.store.get(source_faction)["resources"]
+            if source_resources.get(resource, 0) < amount:
+                raise ValueError(f"Ressources insuffisantes ! Vous avez {source_resources.get(resource, 0)} {resource}")
+            
+            # Effectue le transfert
+            self.store.increment(source_faction, f"resources.{resource}", -amount)
+            self.store.increment(target_faction, f"resources.{resource}", amount)
+        
+            return f"Transfert réussi ! Vous avez envoyé {amount} {resource} à '{target_faction}'."
+
+    async def batch_transfer(self, member: discord.Member, legs: List[Tuple[str, str, int]]):
+        """Effectue plusieurs transferts (cible, "monnaie" ou ressource, montant) en une seule opération.
+
+        Tous les transferts sont validés ensemble avant d'être appliqués : soit
+        ils réussissent tous, soit aucun n'est effectué. Ils sont enregistrés
+        en une seule écriture.
+        """
+        source_faction = self.get_user_faction(member)
+        
+        if not source_faction:
+            raise ValueError("Vous n'êtes pas membre d'une faction !")
+            
+        if not legs:
+            raise ValueError("Aucun transfert indiqué !")
             
-        # Effectue le transfert
-        source_resources[resource] -= amount
-        factions[target_faction]["resources"][resource] += amount
+        for target_faction, kind, amount in legs:
+            if target_faction not in self.store:
+                raise ValueError(f"La faction cible '{target_faction}' n'existe pas !")
+            if target_faction == source_faction:
+                raise ValueError("Vous ne pouvez pas transférer vers votre propre faction !")
+            if kind != "monnaie" and kind not in RESOURCES:
+                raise ValueError(f"Ressource invalide ! Les ressources disponibles sont: monnaie, {', '.join(RESOURCES)}")
+            if amount <= 0:
+                raise ValueError("Le montant doit être positif !")
         
-        self._save_factions(factions)
+        targets = {target_faction for target_faction, _, _ in legs}
+        async with self.locks.acquire(source_faction, *targets):
+            for faction_name in (source_faction, *targets):
+                self._accrue(faction_name)
+            source_data = self.store.get(source_faction)
+            
+            # Vérifie les totaux demandés sur un seul état des données
+            totals: Dict[str, int] = {}
+            for _, kind, amount in legs:
+                totals[kind] = totals.get(kind, 0) + amount
+            for kind, total in totals.items():
+                if kind == "monnaie":
+                    if source_data["balance"] < total:
+                        raise ValueError(f"Solde insuffisant ! Il faut {total} {source_data['currency_name']}, vous avez {source_data['balance']}")
+                elif source_data["resources"].get(kind, 0) < total:
+                    raise ValueError(f"Ressources insuffisantes ! Il faut {total} {kind}, vous avez {source_data['resources'].get(kind, 0)}")
+            
+            converted = [
+                self.exchange.quote(source_faction, target_faction, amount).converted if kind == "monnaie" else amount
+                for target_faction, kind, amount in legs
+            ]
+            
+            # Applique tous les transferts en un seul lot
+            with self.store.batch():
+                for (target_faction, kind, amount), received in zip(legs, converted):
+                    path = "balance" if kind == "monnaie" else f"resources.{kind}"
+                    self.store.increment(source_faction, path, -amount)
+                    self.store.increment(target_faction, path, received)
         
-        return f"Transfert réussi ! Vous avez envoyé {amount} {resource} à '{target_faction}'."
+        lines = []
+        for (target_faction, kind, amount), received in zip(legs, converted):
+            if kind == "monnaie":
+                target_currency = self.store.get(target_faction)["currency_name"]
+                lines.append(f"{amount} {source_data['currency_name']} → '{target_faction}' ({received} {target_currency})")
+            else:
+                lines.append(f"{amount} {kind} → '{target_faction}'")
+        return f"{len(legs)} transferts effectués :\n" + "\n".join(lines)
+
+    def get_quote(self, source_faction: str, target_faction: str, amount: int) -> Quote:
+        """Cotation d'un transfert de monnaie, sans l'effectuer"""
+        return self.exchange.quote(source_faction, target_faction, amount)
+
+    def _require_economy(self) -> EconomyEngine:
+        if self.economy is None:
+            raise ValueError("Le moteur économique nécessite NumPy, qui n'est pas installé sur le serveur !")
+        return self.economy
+
+    async def tax_factions(self, percent: float):
+        """Prélève un pourcentage du solde de toutes les factions (commande admin)"""
+        if not 0 < percent <= 100:
+            raise ValueError("Le pourcentage doit être compris entre 0 et 100 !")
+        economy = self._require_economy()
+        # Même chemin que les autres écritures : verrou de chaque faction (la production ne touche pas au solde)
+        async with self.locks.acquire(*self.store.names()):
+            result = economy.tax(percent)
+        return f"Taxe de {percent}% appliquée à {result['factions']} factions ({result['collected']:.2f} monnaie générale prélevée)"
+
+    async def apply_resource_event(self, resource_name: str, percent: float):
+        """Fait varier une ressource en pourcentage pour toutes les factions (commande admin)"""
+        if resource_name not in RESOURCES:
+            raise ValueError(f"Ressource invalide ! Les ressources disponibles sont: {', '.join(RESOURCES)}")
+        if percent < -100:
+            raise ValueError("Une faction ne peut pas perdre plus de 100% d'une ressource !")
+        economy = self._require_economy()
+        async with self.locks.acquire(*self.store.names()):
+            # L'événement s'applique aux ressources produites jusqu'à maintenant, en une seule écriture
+            with self.store.batch():
+                for faction_name in self.store.names():
+                    self._accrue(faction_name, force=True)
+            result = economy.apply_resource_event(resource_name, percent)
+        return f"Événement appliqué: {result['delta']:+d} {resource_name} au total sur {result['factions']} factions"
+
+    def get_economy_statistics(self) -> Dict:
+        """Statistiques globales de l'économie"""
+        return self._require_economy().statistics()
+
+    async def bulk_update(self, stream: IO[bytes], fmt: str):
+        """Applique un fichier de modifications (faction, champ, valeur, mode) en une seule écriture (commande admin).
+
+        Le fichier est entièrement validé avant toute modification : s'il
+        contient une erreur, ou si un solde ou une ressource deviendrait
+        négatif, rien n'est appliqué.
+        """
+        # La validation lit l'instantané immuable : elle peut tourner hors de la boucle
+        plan = await self.store.run_io(validate, stream, fmt, self.store.snapshot.factions)
+        if plan.error_count:
+            details = "\n".join(plan.errors)
+            if plan.error_count > len(plan.errors):
+                details += f"\n... et {plan.error_count - len(plan.errors)} autres erreurs"
+            raise ValueError(f"{plan.error_count} lignes invalides, aucune modification appliquée :\n{details}")
+        if not plan.rows:
+            raise ValueError("Le fichier ne contient aucune modification !")
+        
+        async with self.locks.acquire(*plan.factions):
+            for faction_name in plan.factions:
+                # Les valeurs absolues s'appliquent à des ressources à jour
+                self._accrue(faction_name, force=True)
+            values = {}
+            for faction_name, path in plan.operations:
+                data = self.store.get(faction_name)
+                field = field_name(path)
+                current = data["balance"] if field == "monnaie" else data["resources"].get(field, 0)
+                value = plan.resolve(faction_name, path, current)
+                if value < 0:
+                    raise ValueError(f"'{faction_name}' : {field} deviendrait négatif ({value}), aucune modification appliquée")
+                if value != current:
+                    values[(faction_name, path)] = value
+            
+            # Une seule écriture, limitée aux valeurs qui changent réellement
+            with self.store.batch():
+                for (faction_name, path), value in values.items():
+                    self.store.set(faction_name, path, value)
+        
+        return f"Import appliqué : {plan.rows} lignes, {len(values)} valeurs modifiées sur {len(plan.factions)} factions"
+
+    async def export_economy(self, fmt: str) -> IO[bytes]:
+        """Exporte soldes et ressources de toutes les factions dans un fichier temporaire.
+
+        L'export est écrit faction par faction sur le disque à partir de
+        l'instantané courant, sans construire le document en mémoire.
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Format invalide ! Les formats disponibles sont: {', '.join(FORMATS)}")
+        fp = tempfile.TemporaryFile()
+        try:
+            await self.store.run_io(write_export, self.store.snapshot.factions, fmt, fp)
+        except Exception:
+            fp.close()
+            raise
+        return fp
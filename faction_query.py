@@ -0,0 +1,172 @@
+import base64
+import json
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+from building_catalog import BuildingCatalog
+from faction_store import FactionStore
+from leaderboard import RankedIndex
+
+DEFAULT_LIMIT = 25
+MAX_LIMIT = 100
+
+
+class Page(NamedTuple):
+    # Factions de la page, dans l'ordre, lues dans un même instantané
+    factions: Dict[str, Dict]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(sort: str, value: Any, name: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort, value, name]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, str]:
+    """Dernière entrée servie ; lève ValueError si le curseur ne correspond pas au tri demandé"""
+    try:
+        cursor_sort, value, name = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Curseur de pagination invalide !")
+    # La valeur doit pouvoir se comparer à celles de l'index : texte pour le nom, nombre sinon
+    expected = str if sort == "nom" else (int, float)
+    if cursor_sort != sort or not isinstance(name, str) or isinstance(value, bool) or not isinstance(value, expected):
+        raise ValueError("Curseur de pagination invalide pour ce tri !")
+    return value, name
+
+
+class FactionQuery:
+    """Tri, filtrage par préfixe et pagination par curseur des factions.
+
+    Pour chaque critère de tri, un index trié de couples (valeur, nom)
+    (RankedIndex) est construit à la première demande à partir de
+    l'instantané publié par le stockage. Il est ensuite tenu à jour par les
+    notifications du stockage : une mutation ne déplace que l'entrée de la
+    faction concernée, en O(log n), sans retrier. Seul un changement du
+    catalogue impose une reconstruction. Le curseur contient la dernière
+    entrée servie : la page suivante reprend par bisection, sans décalage si
+    des factions sont ajoutées entre-temps.
+    """
+
+    def __init__(self, store: FactionStore, catalog: BuildingCatalog):
+        self.store = store
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._catalog_version = catalog.version
+        self._indexes: Dict[str, RankedIndex] = {}
+        # critère -> nom -> entrée actuelle, pour la retirer à la prochaine mise à jour
+        self._entries: Dict[str, Dict[str, Tuple[Any, str]]] = {}
+        store.add_listener(self._on_records)
+
+    def sort_keys(self) -> List[str]:
+        """Critères de tri disponibles"""
+        return ["nom", "solde", *self.catalog.resources, "batiments", *self.catalog.buildings]
+
+    def _key_function(self, sort: str) -> Callable[[str, Mapping], Any]:
+        if sort == "nom":
+            return lambda name, data: name.casefold()
+        if sort == "solde":
+            return lambda name, data: data["balance"]
+        if sort in self.catalog.resources:
+            return lambda name, data: data.get("resources", {}).get(sort, 0)
+        if sort == "batiments":
+            return lambda name, data: sum(data.get("buildings", {}).values())
+        if sort in self.catalog.buildings:
+            return lambda name, data: data.get("buildings", {}).get(sort, 0)
+        raise ValueError(f"Tri invalide ! Les tris disponibles sont: {', '.join(self.sort_keys())}")
+
+    def _index(self, sort: str) -> RankedIndex:
+        """Index trié d'un critère, construit depuis l'instantané à la première demande (sous verrou)"""
+        if self._catalog_version != self.catalog.version:
+            # Ressources ou bâtiments du catalogue modifiés : les index sont reconstruits
+            self._indexes.clear()
+            self._entries.clear()
+            self._catalog_version = self.catalog.version
+        index = self._indexes.get(sort)
+        if index is None:
+            key = self._key_function(sort)
+            entries = {name: (key(name, data), name) for name, data in self.store.snapshot.factions.items()}
+            index = self._indexes[sort] = RankedIndex(entries.values())
+            self._entries[sort] = entries
+        return index
+
+    def _update(self, sort: str, name: str):
+        data = self.store.get(name)
+        entry = (self._key_function(sort)(name, data), name) if data is not None else None
+        entries = self._entries[sort]
+        previous = entries.get(name)
+        if entry == previous:
+            return
+        if previous is not None:
+            self._indexes[sort].remove(previous)
+            del entries[name]
+        if entry is not None:
+            entries[name] = entry
+            self._indexes[sort].add(entry)
+
+    def _on_records(self, records: List[Dict]):
+        """Appelé par le stockage, sous son verrou : seules les factions touchées sont reclassées"""
+        with self._lock:
+            if not self._indexes:
+                return
+            if self._catalog_version != self.catalog.version:
+                # Reconstruits à la prochaine demande
+                self._indexes.clear()
+                self._entries.clear()
+                return
+            changed = set()
+            for record in records:
+                if "c" in record or record["p"].partition(".")[0] in ("balance", "resources", "buildings"):
+                    changed.add(record["f"])
+            for name in changed:
+                for sort in list(self._indexes):
+                    self._update(sort, name)
+
+    @staticmethod
+    def _range(index: RankedIndex, low: int, high: int, descending: bool) -> Iterator[Tuple[Any, str]]:
+        """Entrées de rang `low` à `high` (exclu), lues par blocs"""
+        step = 64
+        if descending:
+            while high > low:
+                start = max(low, high - step)
+                yield from reversed(index.slice(start, high - start))
+                high = start
+        else:
+            while low < high:
+                count = min(step, high - low)
+                yield from index.slice(low, count)
+                low += count
+
+    def page(self, sort: str = "nom", descending: bool = False, prefix: str = "",
+             cursor: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> Page:
+        """Renvoie une page de factions et le curseur de la page suivante"""
+        limit = max(1, min(limit, MAX_LIMIT))
+        prefix = prefix.casefold()
+        last = decode_cursor(cursor, sort) if cursor else None
+
+        with self._lock:
+            index = self._index(sort)
+            # Pris après l'index : toute faction classée y figure
+            snapshot = self.store.snapshot
+            low, high = 0, len(index)
+            if sort == "nom" and prefix:
+                # L'index par nom est trié sur le nom normalisé : le préfixe est une plage contiguë
+                low = index.rank((prefix,))
+                high = index.rank((prefix + "\U0010ffff",))
+            if last is not None:
+                if descending:
+                    high = min(high, index.rank(last))
+                else:
+                    # Juste après la dernière entrée servie, qu'elle soit encore classée ou non
+                    low = max(low, index.rank((last[0], last[1] + "\0")))
+
+            selected = []
+            for value, name in self._range(index, low, high, descending):
+                if prefix and not name.casefold().startswith(prefix):
+                    continue
+                if name not in snapshot.factions:
+                    continue
+                selected.append((value, name))
+                if len(selected) > limit:
+                    break
+
+        next_cursor = encode_cursor(sort, *selected[limit - 1]) if len(selected) > limit else None
+        return Page({name: snapshot.factions[name] for _, name in selected[:limit]}, next_cursor)
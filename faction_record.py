@@ -0,0 +1,187 @@
+import copy
+import math
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+from building_catalog import RESOURCES
+
+# Champs scalaires d'une faction, stockés chacun dans un slot du même nom
+FIELDS: Tuple[str, ...] = ("leader", "balance", "currency_name", "exchange_rate", "role_id",
+                           "category_id", "text_channel_id", "voice_channel_id", "last_accrual")
+_FIELD_SET = frozenset(FIELDS)
+# Sous-dictionnaires stockés en tableaux : clé -> (slot, type du tableau)
+VECTORS: Dict[str, Tuple[str, str]] = {
+    "resources": ("_resources", "q"),
+    "buildings": ("_buildings", "i"),
+    "production": ("_production", "d"),
+    "production_carry": ("_carry", "d"),
+}
+# Valeur d'un tableau pour une clé absente du sous-dictionnaire
+MISSING: Dict[str, Any] = {"q": -2 ** 63, "i": -2 ** 31, "d": math.nan}
+
+
+def is_missing(typecode: str, value) -> bool:
+    return value != value if typecode == "d" else value == MISSING[typecode]
+
+
+class FactionLayout:
+    """Ordre des ressources et des bâtiments dans les tableaux des factions.
+
+    Partagé par toutes les factions d'un stockage, il ne fait que s'allonger :
+    un indice attribué ne change jamais, et un tableau plus court que la
+    disposition vaut zéro (ou absent) au-delà de sa fin. Les tuples sont
+    remplacés d'un bloc, les lecteurs d'autres threads voient donc toujours
+    une disposition cohérente.
+    """
+
+    def __init__(self, resources: Tuple[str, ...] = RESOURCES, buildings: Tuple[str, ...] = ()):
+        self.resources = tuple(resources)
+        self.buildings = tuple(buildings)
+        self._indexes = {
+            "resources": {name: i for i, name in enumerate(self.resources)},
+            "buildings": {name: i for i, name in enumerate(self.buildings)},
+        }
+
+    @staticmethod
+    def _table(key: str) -> str:
+        # Production et reste de production suivent l'ordre des ressources
+        return "buildings" if key == "buildings" else "resources"
+
+    def names(self, key: str) -> Tuple[str, ...]:
+        return getattr(self, self._table(key))
+
+    def indexes(self, key: str) -> Dict[str, int]:
+        """Nom -> indice dans les tableaux `key`"""
+        return self._indexes[self._table(key)]
+
+    def extend(self, key: str, names: Iterable[str]) -> Tuple[str, ...]:
+        """Ajoute les noms inconnus à la fin de la table des tableaux `key` ; renvoie la table"""
+        table = self._table(key)
+        indexes = self._indexes[table]
+        new = [name for name in dict.fromkeys(names) if name not in indexes]
+        if new:
+            for name in new:
+                indexes[name] = len(indexes)
+            setattr(self, table, getattr(self, table) + tuple(new))
+        return getattr(self, table)
+
+
+class Faction(Mapping):
+    """Enregistrement compact et typé d'une faction, en lecture seule.
+
+    Les champs scalaires occupent des slots ; ressources, niveaux de
+    bâtiments et production sont des `array` dans l'ordre d'une
+    FactionLayout, sans clés répétées d'une faction à l'autre. Les champs
+    inconnus restent dans `extra`. L'enregistrement se lit comme le
+    dictionnaire dont il provient (`faction["balance"]`, `faction.get(...)`)
+    ou par attribut (`faction.balance`, `faction.resources`).
+    """
+
+    __slots__ = FIELDS + tuple(slot for slot, _ in VECTORS.values()) + ("_layout", "extra")
+
+    @classmethod
+    def from_dict(cls, data: Mapping, layout: FactionLayout) -> "Faction":
+        """Construit l'enregistrement ; lève TypeError/OverflowError si une valeur ne tient pas dans son tableau"""
+        record = cls.__new__(cls)
+        object.__setattr__(record, "_layout", layout)
+        extra = None
+        for key, value in data.items():
+            if key in VECTORS and isinstance(value, Mapping):
+                slot, typecode = VECTORS[key]
+                names = layout.names(key)
+                if not value.keys() <= layout.indexes(key).keys():
+                    names = layout.extend(key, value)
+                missing = MISSING[typecode]
+                object.__setattr__(record, slot, array(typecode, [value.get(name, missing) for name in names]))
+            elif key in _FIELD_SET:
+                object.__setattr__(record, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = copy.deepcopy(value)
+        record.extra = extra
+        return record
+
+    def __setattr__(self, key, value):
+        if key != "extra" or hasattr(self, "extra"):
+            raise AttributeError("Un enregistrement de faction est en lecture seule")
+        object.__setattr__(self, key, value)
+
+    def vector(self, key: str) -> Optional[array]:
+        """Tableau brut d'un sous-dictionnaire, dans l'ordre de la disposition (None s'il est absent)"""
+        return getattr(self, VECTORS[key][0], None)
+
+    def _view(self, key: str) -> Dict[str, Any]:
+        slot, typecode = VECTORS[key]
+        return {name: value for name, value in zip(self._layout.names(key), getattr(self, slot))
+                if not is_missing(typecode, value)}
+
+    @property
+    def resources(self) -> Dict[str, int]:
+        return self._view("resources")
+
+    @property
+    def buildings(self) -> Dict[str, int]:
+        return self._view("buildings")
+
+    @property
+    def production(self) -> Dict[str, float]:
+        return self._view("production")
+
+    @property
+    def production_carry(self) -> Dict[str, float]:
+        return self._view("production_carry")
+
+    def _value(self, key: str, name: str):
+        slot, typecode = VECTORS[key]
+        values = getattr(self, slot, ())
+        i = self._layout.indexes(key).get(name)
+        if i is None or i >= len(values) or is_missing(typecode, values[i]):
+            return 0
+        return values[i]
+
+    def resource(self, name: str) -> int:
+        """Quantité d'une ressource, sans construire le dictionnaire des ressources"""
+        return self._value("resources", name)
+
+    def building_level(self, name: str) -> int:
+        return self._value("buildings", name)
+
+    # Interface Mapping : l'enregistrement remplace le dictionnaire pour les lecteurs
+
+    def __getitem__(self, key: str):
+        if key in FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if key in VECTORS:
+            if not hasattr(self, VECTORS[key][0]):
+                raise KeyError(key)
+            return self._view(key)
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+
+    def __iter__(self) -> Iterator[str]:
+        for key in FIELDS:
+            if hasattr(self, key):
+                yield key
+        for key, (slot, _) in VECTORS.items():
+            if hasattr(self, slot):
+                yield key
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dictionnaire indépendant, tel que stocké en JSON"""
+        data = {key: self[key] for key in self}
+        if self.extra:
+            data.update(copy.deepcopy(self.extra))
+        return data
+
+    def __repr__(self) -> str:
+        return f"Faction({self.to_dict()!r})"
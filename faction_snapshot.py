@@ -0,0 +1,262 @@
+import itertools
+import json
+import mmap
+import struct
+import sys
+from array import array
+from typing import Any, Dict, List, Mapping, Set, Tuple
+from faction_record import FIELDS, MISSING, VECTORS, FactionLayout
+
+# Format binaire des instantanés de factions, par colonnes (petit-boutiste) :
+#   en-tête     MAGIC, version, drapeaux, nombre de factions
+#   sections    chacune précédée de sa taille en octets (SECTION) :
+#               noms des ressources, noms des bâtiments, indicateurs par
+#               faction, une colonne par champ numérique, pour chaque
+#               sous-dictionnaire le nombre d'entrées de chaque faction puis
+#               toutes les clés (indices dans les noms) et toutes les valeurs,
+#               enfin les textes : longueurs et contenu concaténé
+# Un champ numérique absent vaut MISSING (NaN pour les flottants), un texte
+# absent a la longueur ABSENT. Chaque colonne s'écrit et se relit d'un bloc.
+MAGIC = b"CSMF"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+SECTION = struct.Struct("<I")
+ABSENT = 0xFFFFFFFF
+
+# Colonnes numériques et leur type
+NUMBERS: Tuple[Tuple[str, str], ...] = (
+    ("leader", "q"), ("balance", "q"), ("exchange_rate", "d"), ("role_id", "q"), ("category_id", "q"),
+    ("text_channel_id", "q"), ("voice_channel_id", "q"), ("last_accrual", "d"),
+)
+TEXTS = ("name", "currency_name", "extra")
+_SCALARS = tuple(key for key, _ in NUMBERS) + ("currency_name",)
+_SCALAR_SET = frozenset(_SCALARS)
+# Indicateurs par faction : champ flottant qui valait un entier (taux d'échange 1
+# plutôt que 1.0), tous les champs scalaires présents, sous-dictionnaire présent,
+# ou faction stockée entière en JSON
+_INT_BITS = {"exchange_rate": 1, "last_accrual": 2}
+COMPLETE = 4
+_VECTOR_BITS = {key: 8 << i for i, key in enumerate(VECTORS)}
+_ALL_VECTORS = sum(_VECTOR_BITS.values())
+RAW = 8 << len(VECTORS)
+_KNOWN = frozenset(FIELDS) | frozenset(VECTORS)
+_SWAP = sys.byteorder == "big"
+
+
+def _to_bytes(values: array) -> bytes:
+    if _SWAP:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _texts(values: List[Any]) -> List[bytes]:
+    """Longueurs (en caractères, ABSENT pour None) et contenu concaténé d'une colonne de textes"""
+    lengths = array("I", [ABSENT if value is None else len(value) for value in values])
+    return [_to_bytes(lengths), "".join(value for value in values if value is not None).encode("utf-8")]
+
+
+def _invalid_rows(typecode: str, column: List[Any]) -> Set[int]:
+    invalid = set()
+    for i, value in enumerate(column):
+        try:
+            array(typecode, [value])
+        except (TypeError, OverflowError):
+            invalid.add(i)
+    return invalid
+
+
+def _columns(rows: List[Mapping], layout: FactionLayout) -> Tuple[List[array], Set[int]]:
+    """Colonnes des factions, et indices des factions dont une valeur n'y tient pas"""
+    columns = []
+    invalid: Set[int] = set()
+    for key, typecode in NUMBERS:
+        column = [row.get(key, MISSING[typecode]) for row in rows]
+        try:
+            columns.append(array(typecode, column))
+        except (TypeError, OverflowError):
+            invalid |= _invalid_rows(typecode, column)
+    for key, (_, typecode) in VECTORS.items():
+        subs = [row.get(key) or {} for row in rows]
+        invalid.update(i for i, sub in enumerate(subs) if not isinstance(sub, dict))
+        subs = [sub if isinstance(sub, dict) else {} for sub in subs]
+        layout.extend(key, sorted(set().union(*subs)))
+        indexes = layout.indexes(key)
+        values = [value for sub in subs for value in sub.values()]
+        try:
+            columns += [array("I", [len(sub) for sub in subs]),
+                        array("H", [indexes[name] for sub in subs for name in sub]),
+                        array(typecode, values)]
+        except (TypeError, OverflowError):
+            owners = [i for i, sub in enumerate(subs) for _ in sub]
+            invalid.update(owners[i] for i in _invalid_rows(typecode, values))
+    invalid.update(i for i, row in enumerate(rows) if not isinstance(row.get("currency_name", ""), str))
+    return columns, invalid
+
+
+def encode(factions: Mapping[str, Mapping]) -> bytes:
+    """Sérialise les factions (dictionnaires ou enregistrements Faction) en instantané binaire"""
+    names = list(factions)
+    rows = [factions[name] for name in names]
+    layout = FactionLayout()
+    columns, invalid = _columns(rows, layout)
+    raw: Dict[int, Mapping] = {}
+    if invalid:
+        # None dans une colonne, nombre hors limites... : ces factions sont stockées entières en JSON
+        raw = {i: rows[i] for i in invalid}
+        rows = [{} if i in raw else row for i, row in enumerate(rows)]
+        columns, _ = _columns(rows, layout)
+
+    flags = [(type(row.get("exchange_rate")) is int) | (type(row.get("last_accrual")) is int) << 1
+             | (row.keys() >= _SCALAR_SET) << 2 for row in rows]
+    for key, bit in _VECTOR_BITS.items():
+        flags = [value | bit if key in row else value for value, row in zip(flags, rows)]
+    extras: List[Any] = [None] * len(rows)
+    for i, row in enumerate(rows):
+        unknown = row.keys() - _KNOWN
+        if unknown:
+            extras[i] = json.dumps({key: row[key] for key in unknown}, separators=(",", ":"))
+    for i, row in raw.items():
+        flags[i] = RAW
+        extras[i] = json.dumps(row, separators=(",", ":"))
+
+    sections = [
+        "\n".join(layout.resources).encode("utf-8"),
+        "\n".join(layout.buildings).encode("utf-8"),
+        _to_bytes(array("I", flags)),
+        *(_to_bytes(column) for column in columns),
+        *_texts(names),
+        *_texts([row.get("currency_name") for row in rows]),
+        *_texts(extras),
+    ]
+    parts = [HEADER.pack(MAGIC, VERSION, 0, len(names))]
+    for section in sections:
+        parts += [SECTION.pack(len(section)), section]
+    return b"".join(parts)
+
+
+class _Reader:
+    """Lecture séquentielle des sections, sans copie jusqu'à la conversion en tableaux"""
+
+    def __init__(self, view: memoryview):
+        self.view = view
+        self.offset = HEADER.size
+
+    def section(self) -> memoryview:
+        (size,) = SECTION.unpack_from(self.view, self.offset)
+        start = self.offset + SECTION.size
+        self.offset = start + size
+        if self.offset > len(self.view):
+            raise ValueError("Instantané binaire tronqué")
+        return self.view[start:self.offset]
+
+    def array(self, typecode: str) -> array:
+        values = array(typecode)
+        values.frombytes(self.section())
+        if _SWAP:
+            values.byteswap()
+        return values
+
+    def texts(self) -> List[Any]:
+        lengths = self.array("I")
+        content = str(self.section(), "utf-8")
+        texts = []
+        position = 0
+        for length in lengths:
+            if length == ABSENT:
+                texts.append(None)
+            else:
+                texts.append(content[position:position + length])
+                position += length
+        return texts
+
+
+def _sparse(counts: array, keys: List[str], values: array) -> List[Dict[str, Any]]:
+    """Sous-dictionnaires des factions successives, reconstitués depuis leurs colonnes"""
+    entries = zip(keys, values.tolist())
+    return [dict(itertools.islice(entries, count)) for count in counts]
+
+
+def decode(buffer) -> Dict[str, Dict]:
+    """Relit un instantané binaire (bytes, mmap...) en dictionnaires, comme le backend json"""
+    with memoryview(buffer) as view:
+        magic, version, _, count = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("Ce fichier n'est pas un instantané binaire de factions")
+        if version > VERSION:
+            raise ValueError(f"Version d'instantané binaire non prise en charge: {version}")
+        reader = _Reader(view)
+        resources = str(reader.section(), "utf-8")
+        buildings = str(reader.section(), "utf-8")
+        layout = FactionLayout(tuple(resources.split("\n")) if resources else (),
+                               tuple(buildings.split("\n")) if buildings else ())
+        flags = reader.array("I")
+        columns = {key: reader.array(typecode) for key, typecode in NUMBERS}
+        vectors = {}
+        for key, (_, typecode) in VECTORS.items():
+            counts, indexes, values = reader.array("I"), reader.array("H"), reader.array(typecode)
+            if len(counts) != count or sum(counts) != len(indexes) or len(indexes) != len(values):
+                raise ValueError("Instantané binaire incohérent")
+            vectors[key] = _sparse(counts, list(map(layout.names(key).__getitem__, indexes)), values)
+        names, currencies, extras = reader.texts(), reader.texts(), reader.texts()
+    if any(len(column) != count for column in (flags, names, currencies, extras, *columns.values())):
+        raise ValueError("Instantané binaire incohérent")
+
+    for key, bit in _INT_BITS.items():
+        columns[key] = [int(value) if flag & bit else value for value, flag in zip(columns[key], flags)]
+    scalars = zip(*columns.values(), currencies)
+    factions = {}
+    for name, flag, row, extra, *subs in zip(names, flags, scalars, extras, *vectors.values()):
+        if flag & RAW:
+            factions[name] = json.loads(extra)
+            continue
+        if flag & COMPLETE:
+            data = dict(zip(_SCALARS, row))
+        else:
+            # Un flottant absent vaut NaN (différent de lui-même), un entier absent MISSING, un texte None
+            data = {key: value for key, value in zip(_SCALARS, row)
+                    if value == value and value != MISSING["q"] and value is not None}
+        if flag & _ALL_VECTORS == _ALL_VECTORS:
+            data.update(zip(VECTORS, subs))
+        else:
+            data.update((key, sub) for (key, bit), sub in zip(_VECTOR_BITS.items(), subs) if flag & bit)
+        if extra is not None:
+            data.update(json.loads(extra))
+        factions[name] = data
+    return factions
+
+
+def read_snapshot(filename: str) -> Dict[str, Dict]:
+    """Lit un instantané binaire à travers mmap : chaque colonne est copiée d'un bloc depuis le fichier"""
+    with open(filename, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return decode(mapped)
+
+
+def export_json(binary_filename: str, json_filename: str) -> int:
+    """Convertit un instantané binaire en JSON (même contenu que le backend json)"""
+    factions = read_snapshot(binary_filename)
+    with open(json_filename, "w") as f:
+        json.dump(factions, f, indent=4)
+    return len(factions)
+
+
+def import_json(json_filename: str, binary_filename: str) -> int:
+    """Convertit des factions JSON (journal compris) en instantané binaire"""
+    from faction_storage import BinaryBackend, JsonBackend
+    factions = JsonBackend(json_filename).load()
+    # Sans journal : l'instantané est écrit en entier, le journal de la source n'est pas touché
+    target = BinaryBackend(binary_filename, journal=False)
+    target.write(target.serialize(target.prepare([], factions)))
+    return len(factions)
+
+
+if __name__ == "__main__":
+    # Usage: python faction_snapshot.py import data/factions.json data/factions.bin
+    #        python faction_snapshot.py export data/factions.bin data/factions.json
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python faction_snapshot.py import|export <source> <destination>")
+        sys.exit(1)
+    command, source, destination = sys.argv[1:]
+    count = (import_json if command == "import" else export_json)(source, destination)
+    print(f"{count} factions converties de {source} vers {destination}")
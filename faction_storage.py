@@ -0,0 +1,427 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from typing import Any, Dict, Iterator, List, Mapping, Tuple, Union
+from faction_snapshot import encode, read_snapshot
+
+
+class StorageBackend:
+    """Interface de persistance utilisée par FactionStore.
+
+    Le stockage en mémoire reste la source de vérité : un backend charge les
+    données au démarrage puis reçoit, à chaque écriture différée, la liste
+    des mutations accumulées depuis la précédente. Le travail est découpé en
+    deux temps : `prepare` (sous le verrou du stockage, sans E/S) fige ce
+    qu'il faut écrire, puis `write` effectue les E/S bloquantes hors verrou,
+    depuis l'exécuteur d'E/S du stockage.
+    """
+
+    def load(self) -> Dict[str, Dict]:
+        raise NotImplementedError
+
+    def prepare(self, records: List[Dict], factions: Mapping[str, Mapping]) -> Any:
+        """Fige les données à écrire (appelé sous le verrou du stockage, `factions` est l'instantané publié)"""
+        raise NotImplementedError
+
+    def serialize(self, payload: Any) -> Any:
+        """Termine hors verrou la préparation d'une écriture ; rien à faire par défaut"""
+        return payload
+
+    def write(self, payload: Any):
+        """Effectue l'écriture préparée par `prepare` (hors verrou)"""
+        raise NotImplementedError
+
+    def needs_compaction(self, closing: bool = False) -> bool:
+        """Indique s'il faut réécrire un état de référence (toujours tenté à l'arrêt si `closing`)"""
+        return False
+
+    def prepare_compaction(self, factions: Mapping[str, Mapping]) -> Any:
+        """Sérialise un état de référence complet depuis un instantané immuable (appelé hors verrou)"""
+        return None
+
+    def write_compaction(self, payload: Any):
+        """Écrit l'état de référence préparé ; ne fait rien par défaut"""
+
+    def payload_size(self, payload: Any) -> int:
+        """Taille en octets d'une écriture préparée, si elle est connue (0 sinon)"""
+        return 0
+
+    def stored_size(self) -> int:
+        """Taille des données sur disque, en octets"""
+        return 0
+
+    def close(self):
+        """Libère les ressources du backend"""
+
+
+def _plain(value: Any) -> Any:
+    """Convertit pour json les enregistrements publiés (Mapping en lecture seule)"""
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def iter_records(records: List[Dict]) -> Iterator[Dict]:
+    """Parcourt les mutations en dépliant les lots ({"b": [...]})"""
+    for record in records:
+        if "b" in record:
+            yield from record["b"]
+        else:
+            yield record
+
+
+def apply_record(factions: Dict[str, Dict], record: Dict):
+    """Applique une mutation ({"f", "p", "v"}, création {"f", "c"} ou lot {"b"}) aux données"""
+    if "b" in record:
+        for item in record["b"]:
+            apply_record(factions, item)
+        return
+    if "c" in record:
+        factions[record["f"]] = record["c"]
+        return
+    *parents, key = record["p"].split(".")
+    target = factions[record["f"]]
+    for parent in parents:
+        target = target.setdefault(parent, {})
+    target[key] = record["v"]
+
+
+class JsonBackend(StorageBackend):
+    """Instantané JSON, éventuellement complété d'un journal de mutations.
+
+    Avec le journal, chaque mutation devient une ligne JSON compacte ajoutée
+    à la fin du fichier journal au lieu d'une réécriture complète de
+    l'instantané. Un lot de mutations tient sur une seule ligne : une ligne
+    tronquée par un arrêt brutal est ignorée en entier, le lot n'est donc
+    jamais rejoué à moitié. Le journal est rejoué au chargement, puis replié
+    dans un nouvel instantané dès qu'il dépasse `compact_threshold` octets.
+    """
+
+    def __init__(self, filename: str, journal: bool = True, compact_threshold: int = 1024 * 1024):
+        self.filename = filename
+        self.journal_filename = os.path.splitext(filename)[0] + ".journal" if journal else None
+        self.compact_threshold = compact_threshold
+        self._ensure_data_file()
+
+    def _ensure_data_file(self):
+        """Assure que le fichier de données des factions existe"""
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        if not os.path.exists(self.filename):
+            self._write_file(self._dump({}))
+
+    def _read_file(self) -> Dict:
+        """Charge les données des factions depuis le fichier JSON"""
+        try:
+            with open(self.filename, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Erreur lors du chargement des factions: {e}")
+            return {}
+
+    def _dump(self, factions: Mapping[str, Mapping]) -> Union[str, bytes]:
+        """Sérialise un instantané complet (dictionnaires ou enregistrements Faction publiés)"""
+        return json.dumps(factions if isinstance(factions, dict) else dict(factions), indent=4, default=_plain)
+
+    def _write_file(self, content: Union[str, bytes]):
+        """Écrit l'instantané dans un fichier temporaire puis le renomme (écriture atomique)"""
+        directory = os.path.dirname(self.filename) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".factions-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb' if isinstance(content, bytes) else 'w') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp crée le fichier en 0600, on garde des droits de lecture usuels
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.filename)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load(self) -> Dict[str, Dict]:
+        factions = self._read_file()
+        if self.journal_filename:
+            self._replay_journal(factions)
+        return factions
+
+    def _replay_journal(self, factions: Dict[str, Dict]):
+        """Rejoue le journal (et un éventuel journal en cours de compaction) sur l'instantané"""
+        replayed = 0
+        for path in (self.journal_filename + ".compacting", self.journal_filename):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Dernière ligne tronquée par un arrêt brutal : on l'ignore
+                        print(f"Entrée de journal illisible ignorée dans {path}")
+                        continue
+                    apply_record(factions, record)
+                    replayed += 1
+        if replayed:
+            print(f"{replayed} mutations rejouées depuis le journal")
+
+    def prepare(self, records: List[Dict], factions: Mapping[str, Mapping]) -> Union[str, bytes, Mapping]:
+        if not self.journal_filename:
+            # Sans journal, l'instantané immuable sera sérialisé en entier hors verrou
+            return factions
+        return "".join(json.dumps(record, separators=(',', ':')) + "\n" for record in records)
+
+    def serialize(self, payload: Union[str, bytes, Mapping]) -> Union[str, bytes]:
+        return self._dump(payload) if isinstance(payload, Mapping) else payload
+
+    def write(self, payload: Union[str, bytes]):
+        if not self.journal_filename:
+            self._write_file(payload)
+            return
+        # Toutes les mutations de la fenêtre partent en une seule écriture
+        with open(self.journal_filename, 'a') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def payload_size(self, payload: Union[str, bytes, None]) -> int:
+        if isinstance(payload, bytes):
+            return len(payload)
+        return len(payload.encode("utf-8")) if payload else 0
+
+    def stored_size(self) -> int:
+        paths = [self.filename]
+        if self.journal_filename:
+            paths += [self.journal_filename, self.journal_filename + ".compacting"]
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+    def _journal_size(self) -> int:
+        try:
+            return os.path.getsize(self.journal_filename)
+        except OSError:
+            return 0
+
+    def needs_compaction(self, closing: bool = False) -> bool:
+        if not self.journal_filename:
+            return False
+        if closing:
+            # Repart d'un instantané propre et d'un journal vide
+            return self._journal_size() > 0 or os.path.exists(self.journal_filename + ".compacting")
+        return self._journal_size() > self.compact_threshold
+
+    def prepare_compaction(self, factions: Mapping[str, Mapping]) -> Union[str, bytes, None]:
+        if not self.journal_filename:
+            return None
+        return self._dump(factions)
+
+    def write_compaction(self, content: Union[str, bytes, None]):
+        """Replie le journal dans un nouvel instantané"""
+        if content is None:
+            return
+        compacting = self.journal_filename + ".compacting"
+        if os.path.exists(self.journal_filename):
+            if os.path.exists(compacting):
+                # Une compaction précédente a échoué : on conserve ses entrées
+                with open(compacting, 'a') as dst, open(self.journal_filename, 'r') as src:
+                    dst.write(src.read())
+                os.remove(self.journal_filename)
+            else:
+                os.replace(self.journal_filename, compacting)
+        self._write_file(content)
+        if os.path.exists(compacting):
+            os.remove(compacting)
+
+
+class BinaryBackend(JsonBackend):
+    """Instantané binaire compact (voir faction_snapshot), avec le même journal JSON.
+
+    L'instantané est lu à travers mmap et écrit sans mise en page : sur une
+    grosse économie, chargement et compaction sont bien plus rapides qu'avec
+    un instantané JSON indenté, et le fichier est plus petit.
+    """
+
+    def _dump(self, factions: Mapping[str, Mapping]) -> bytes:
+        return encode(factions)
+
+    def _read_file(self) -> Dict:
+        """Charge les données des factions depuis l'instantané binaire"""
+        try:
+            return read_snapshot(self.filename)
+        except Exception as e:
+            print(f"Erreur lors du chargement des factions: {e}")
+            return {}
+
+
+class SqliteBackend(StorageBackend):
+    """Base SQLite (mode WAL) avec une ligne par faction, ressource et bâtiment.
+
+    Les mutations sont traduites en UPDATE/UPSERT ciblés sur les lignes
+    concernées : un transfert ne touche que deux lignes de `factions`.
+    """
+
+    COLUMNS = ("leader", "balance", "currency_name", "exchange_rate", "role_id",
+               "category_id", "text_channel_id", "voice_channel_id")
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS factions (
+            name TEXT PRIMARY KEY,
+            leader INTEGER NOT NULL,
+            balance INTEGER NOT NULL DEFAULT 0,
+            currency_name TEXT NOT NULL,
+            exchange_rate REAL NOT NULL DEFAULT 1,
+            role_id INTEGER,
+            category_id INTEGER,
+            text_channel_id INTEGER,
+            voice_channel_id INTEGER,
+            extra TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE INDEX IF NOT EXISTS idx_factions_role_id ON factions(role_id);
+        CREATE INDEX IF NOT EXISTS idx_factions_leader ON factions(leader);
+        CREATE TABLE IF NOT EXISTS resources (
+            faction TEXT NOT NULL REFERENCES factions(name) ON DELETE CASCADE,
+            resource TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            PRIMARY KEY (faction, resource)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS buildings (
+            faction TEXT NOT NULL REFERENCES factions(name) ON DELETE CASCADE,
+            building TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            PRIMARY KEY (faction, building)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        # La connexion n'est utilisée que depuis l'exécuteur d'E/S (un seul thread) et à l'arrêt
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+
+    def load(self) -> Dict[str, Dict]:
+        factions = {}
+        cursor = self.conn.execute(f"SELECT name, {', '.join(self.COLUMNS)}, extra FROM factions")
+        for row in cursor:
+            data = dict(zip(self.COLUMNS, row[1:-1]))
+            data.update(json.loads(row[-1]))
+            data["resources"] = {}
+            data["buildings"] = {}
+            factions[row[0]] = data
+        for faction, resource, amount in self.conn.execute("SELECT faction, resource, amount FROM resources"):
+            factions[faction]["resources"][resource] = amount
+        for faction, building, level in self.conn.execute("SELECT faction, building, level FROM buildings"):
+            factions[faction]["buildings"][building] = level
+        return factions
+
+    def _extra(self, data: Mapping) -> str:
+        return json.dumps({key: value for key, value in data.items()
+                           if key not in self.COLUMNS and key not in ("resources", "buildings")})
+
+    def _faction_statements(self, name: str, data: Mapping) -> List[Tuple[str, tuple]]:
+        """Instructions qui (ré)écrivent entièrement une faction"""
+        placeholders = ", ".join("?" for _ in self.COLUMNS)
+        statements = [
+            (f"INSERT OR REPLACE INTO factions (name, {', '.join(self.COLUMNS)}, extra) VALUES (?, {placeholders}, ?)",
+             (name, *(data.get(column) for column in self.COLUMNS), self._extra(data))),
+            ("DELETE FROM resources WHERE faction = ?", (name,)),
+            ("DELETE FROM buildings WHERE faction = ?", (name,)),
+        ]
+        statements += [("INSERT INTO resources (faction, resource, amount) VALUES (?, ?, ?)", (name, resource, amount))
+                       for resource, amount in data.get("resources", {}).items()]
+        statements += [("INSERT INTO buildings (faction, building, level) VALUES (?, ?, ?)", (name, building, level))
+                       for building, level in data.get("buildings", {}).items()]
+        return statements
+
+    def prepare(self, records: List[Dict], factions: Mapping[str, Mapping]) -> List[Tuple[str, tuple]]:
+        # Seule la dernière valeur de chaque champ compte dans une fenêtre d'écriture
+        latest = {}
+        # Les lots sont écrits dans la même transaction que le reste de la fenêtre
+        for record in iter_records(records):
+            if "c" in record:
+                latest = {key: value for key, value in latest.items() if key[0] != record["f"]}
+                latest[(record["f"], None)] = None
+            else:
+                latest.pop((record["f"], record["p"]), None)
+                latest[(record["f"], record["p"])] = record["v"]
+
+        statements = []
+        for (name, path), value in latest.items():
+            if path is None:
+                # Création : la faction est écrite telle qu'elle est en mémoire maintenant
+                statements += self._faction_statements(name, factions[name])
+                continue
+            head, _, key = path.partition(".")
+            if head == "resources" and key:
+                statements.append((
+                    "INSERT INTO resources (faction, resource, amount) VALUES (?, ?, ?) "
+                    "ON CONFLICT(faction, resource) DO UPDATE SET amount = excluded.amount",
+                    (name, key, value)
+                ))
+            elif head == "buildings" and key:
+                statements.append((
+                    "INSERT INTO buildings (faction, building, level) VALUES (?, ?, ?) "
+                    "ON CONFLICT(faction, building) DO UPDATE SET level = excluded.level",
+                    (name, key, value)
+                ))
+            elif head in ("resources", "buildings"):
+                # Remplacement complet d'un sous-dictionnaire : on réécrit la faction
+                statements += self._faction_statements(name, factions[name])
+            elif head in self.COLUMNS and not key:
+                statements.append((f"UPDATE factions SET {head} = ? WHERE name = ?", (value, name)))
+            else:
+                # Champ sans colonne dédiée : conservé dans la colonne JSON `extra`
+                statements.append(("UPDATE factions SET extra = ? WHERE name = ?", (self._extra(factions[name]), name)))
+        return statements
+
+    def write(self, statements: List[Tuple[str, tuple]]):
+        with self.conn:
+            for sql, params in statements:
+                self.conn.execute(sql, params)
+
+    def payload_size(self, statements: List[Tuple[str, tuple]]) -> int:
+        # Volume approximatif : valeurs des paramètres, sans le texte SQL ni la mise en page de SQLite
+        return sum(len(str(value).encode("utf-8")) for _, params in statements for value in params)
+
+    def stored_size(self) -> int:
+        paths = (self.filename, self.filename + "-wal")
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+    def close(self):
+        self.conn.close()
+
+
+def create_backend(backend: str, filename: str, journal: bool = True) -> StorageBackend:
+    """Instancie le backend demandé ("json", "binary" ou "sqlite")"""
+    if backend == "json":
+        return JsonBackend(filename, journal=journal)
+    if backend == "binary":
+        if filename.endswith(".json"):
+            filename = os.path.splitext(filename)[0] + ".bin"
+        return BinaryBackend(filename, journal=journal)
+    if backend == "sqlite":
+        if filename.endswith(".json"):
+            filename = os.path.splitext(filename)[0] + ".db"
+        return SqliteBackend(filename)
+    raise ValueError(f"Backend de stockage inconnu: {backend}")
+
+
+def migrate_json_to_sqlite(json_filename: str, sqlite_filename: str) -> int:
+    """Importe les factions d'un fichier JSON (journal compris) dans une base SQLite"""
+    factions = JsonBackend(json_filename).load()
+    target = SqliteBackend(sqlite_filename)
+    for name, data in factions.items():
+        target.write(target._faction_statements(name, data))
+    target.close()
+    return len(factions)
+
+
+if __name__ == "__main__":
+    # Usage: python faction_storage.py data/factions.json data/factions.db
+    source = sys.argv[1] if len(sys.argv) > 1 else "data/factions.json"
+    destination = sys.argv[2] if len(sys.argv) > 2 else "data/factions.db"
+    count = migrate_json_to_sqlite(source, destination)
+    print(f"{count} factions importées de {source} vers {destination}")
@@ -0,0 +1,404 @@
+import asyncio
+import atexit
+import contextlib
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Set, Tuple
+from faction_record import Faction, FactionLayout
+from faction_storage import JsonBackend, StorageBackend, apply_record, iter_records
+from metrics import ERRORS, STORAGE_BYTES, STORAGE_DURATION
+
+# Marque un champ absent avant une mutation, pour pouvoir l'annuler
+_MISSING = object()
+
+
+class Snapshot(NamedTuple):
+    """État publié des factions, immuable : à lire sans verrou, jamais à modifier"""
+    version: int
+    last_modified: float
+    factions: Mapping[str, Mapping]
+
+
+class FactionStore:
+    """Stockage en mémoire des factions avec écriture différée.
+
+    Les données sont chargées une seule fois au démarrage puis servies depuis
+    la mémoire. Chaque mutation marque la faction concernée comme modifiée et
+    est transmise au backend de persistance ; une tâche d'arrière-plan
+    regroupe les mutations d'une fenêtre de `flush_interval` secondes en une
+    seule écriture.
+
+    Les E/S bloquantes passent toutes par un exécuteur dédié à un seul
+    thread, ce qui garde les écritures ordonnées et libère la boucle
+    d'événements : le verrou n'est tenu que le temps de figer les données.
+
+    Après chaque mutation (ou chaque lot), un instantané immuable est publié
+    en copie sur écriture : seules les factions modifiées sont recopiées, les
+    autres sont partagées avec l'instantané précédent. Les copies publiées
+    sont des enregistrements Faction compacts, en lecture seule. Les lecteurs
+    d'autres threads (tableau de bord web) lisent `snapshot` sans verrou.
+    """
+
+    def __init__(self, backend: StorageBackend, flush_interval: float = 2.0):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="faction-io")
+        self._lock = threading.RLock()
+        self._dirty: Set[str] = set()
+        self._pending: List[Dict] = []
+        # Mutations du lot en cours avec leur valeur précédente (None hors lot)
+        self._batch: Optional[List[Tuple[Dict, Any]]] = None
+        self._stop_event = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closed = False
+        # Incrémenté à chaque mutation : permet aux vues dérivées de savoir si elles sont à jour
+        self.version = 0
+        # Date (epoch) de la dernière mutation, pour les en-têtes Last-Modified
+        self.last_modified = time.time()
+        with STORAGE_DURATION.time(operation="load"):
+            self._factions: Dict[str, Dict] = backend.load()
+        # Taille des données sur disque, tenue à jour après chaque écriture (estimation de l'empreinte)
+        self.stored_bytes = backend.stored_size()
+        STORAGE_BYTES.inc(self.stored_bytes, operation="load")
+        # Factions modifiées depuis la dernière publication de l'instantané
+        self._unpublished: Set[str] = set()
+        # Ordre des tableaux des enregistrements publiés, commun à toutes les factions
+        self.layout = FactionLayout()
+        self._published: Dict[str, Mapping] = {name: self._freeze(data) for name, data in self._factions.items()}
+        self.snapshot = Snapshot(self.version, self.last_modified, MappingProxyType(self._published))
+        # Appelés avec les mutations validées, après publication de l'instantané
+        self._listeners: List[Callable[[List[Dict]], None]] = []
+
+    @classmethod
+    def from_json(cls, filename: str, flush_interval: float = 2.0, journal: bool = True) -> "FactionStore":
+        return cls(JsonBackend(filename, journal=journal), flush_interval=flush_interval)
+
+    # Lecture
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._factions
+
+    def __len__(self) -> int:
+        return len(self._factions)
+
+    def get(self, name: str) -> Optional[Dict]:
+        """Renvoie les données d'une faction (à ne pas modifier directement)"""
+        return self._factions.get(name)
+
+    def names(self) -> Iterator[str]:
+        return iter(list(self._factions))
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        return iter(list(self._factions.items()))
+
+    def copy(self, names: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        """Renvoie une copie indépendante de toutes les factions, ou seulement de `names` (dans cet ordre)"""
+        with self._lock:
+            if names is None:
+                return copy.deepcopy(self._factions)
+            return {name: copy.deepcopy(self._factions[name]) for name in names if name in self._factions}
+
+    # Mutations
+
+    def _lookup(self, name: str, path: str) -> Any:
+        target = self._factions[name]
+        for key in path.split("."):
+            if not isinstance(target, dict) or key not in target:
+                return _MISSING
+            target = target[key]
+        return copy.deepcopy(target)
+
+    def _record(self, record: Dict, previous: Any = _MISSING):
+        """Enregistre une mutation déjà appliquée en mémoire (appelé sous verrou)"""
+        if self._batch is not None:
+            self._batch.append((record, previous))
+        else:
+            self._pending.append(record)
+        self._dirty.add(record["f"])
+        self._unpublished.add(record["f"])
+        self.version += 1
+        self.last_modified = time.time()
+        if self._batch is None:
+            self._publish()
+            self._notify([record])
+
+    def _freeze(self, data: Dict) -> Mapping:
+        """Copie publiée d'une faction : un enregistrement compact, ou une copie si une valeur n'y tient pas"""
+        try:
+            return Faction.from_dict(data, self.layout)
+        except (TypeError, OverflowError):
+            return copy.deepcopy(data)
+
+    def _publish(self):
+        """Publie un nouvel instantané immuable (appelé sous verrou)"""
+        if not self._unpublished:
+            return
+        published = dict(self._published)
+        for name in self._unpublished:
+            if name in self._factions:
+                published[name] = self._freeze(self._factions[name])
+            else:
+                published.pop(name, None)
+        self._unpublished.clear()
+        self._published = published
+        # Une seule affectation d'attribut : un lecteur voit l'ancien ou le nouvel instantané
+        self.snapshot = Snapshot(self.version, self.last_modified, MappingProxyType(published))
+
+    def add_listener(self, listener: Callable[[List[Dict]], None]):
+        """Abonne `listener` aux mutations validées ; il est appelé sous verrou et doit rester rapide"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[List[Dict]], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, records: List[Dict]):
+        if not records:
+            return
+        for listener in self._listeners:
+            try:
+                listener(records)
+            except Exception as e:
+                print(f"Erreur dans un abonné aux modifications des factions: {e}")
+
+    def create(self, name: str, data: Dict):
+        """Ajoute une nouvelle faction"""
+        with self._lock:
+            if name in self._factions:
+                raise ValueError("Une faction avec ce nom existe déjà !")
+            self._factions[name] = data
+            self._record({"f": name, "c": data})
+
+    def set(self, name: str, path: str, value: Any):
+        """Modifie un champ d'une faction, `path` étant de la forme "resources.bois" """
+        with self._lock:
+            record = {"f": name, "p": path, "v": value}
+            previous = self._lookup(name, path) if self._batch is not None else _MISSING
+            apply_record(self._factions, record)
+            self._record(record, previous)
+
+    def increment(self, name: str, path: str, delta):
+        """Ajoute `delta` à un champ numérique et renvoie la nouvelle valeur"""
+        with self._lock:
+            *parents, key = path.split(".")
+            target = self._factions[name]
+            for parent in parents:
+                target = target.get(parent, {})
+            value = target.get(key, 0) + delta
+            self.set(name, path, value)
+            return value
+
+    def _rollback(self, batch: List[Tuple[Dict, Any]]):
+        for record, previous in reversed(batch):
+            if "c" in record:
+                self._factions.pop(record["f"], None)
+                continue
+            if previous is not _MISSING:
+                apply_record(self._factions, {"f": record["f"], "p": record["p"], "v": previous})
+                continue
+            *parents, key = record["p"].split(".")
+            target = self._factions[record["f"]]
+            for parent in parents:
+                target = target[parent]
+            target.pop(key, None)
+        self.version += 1
+        self.last_modified = time.time()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Regroupe les mutations du bloc en une seule écriture, appliquée entièrement ou pas du tout.
+
+        Le verrou du stockage est tenu pendant tout le bloc, qui ne doit donc
+        pas attendre (`await`). Si le bloc lève une exception, les mutations
+        déjà faites en mémoire sont annulées et rien n'est écrit ; sinon
+        elles partent au backend sous la forme d'un seul enregistrement.
+        """
+        with self._lock:
+            if self._batch is not None:
+                # Lot imbriqué : il fait partie du lot englobant
+                yield
+                return
+            self._batch = []
+            committed = []
+            try:
+                yield
+            except BaseException:
+                self._rollback(self._batch)
+                raise
+            else:
+                committed = [record for record, _ in self._batch]
+                if committed:
+                    self._pending.append({"b": committed})
+            finally:
+                self._batch = None
+                self._publish()
+            self._notify(committed)
+
+    @property
+    def dirty(self) -> Set[str]:
+        """Factions modifiées depuis la dernière écriture"""
+        return set(self._dirty)
+
+    # Écriture différée
+
+    def _requeue(self, records: List[Dict]):
+        """Remet en tête des mutations en attente celles d'une écriture qui a échoué"""
+        with self._lock:
+            # Les mutations seront retentées à la prochaine écriture
+            self._pending[:0] = records
+            self._dirty.update(record["f"] for record in iter_records(records))
+
+    def _flush_job(self) -> bool:
+        """Prépare sous verrou puis écrit hors verrou ; exécuté sur l'exécuteur d'E/S"""
+        with self._lock:
+            if not self._pending:
+                return False
+            records = self._pending
+            # L'instantané publié reflète toutes les mutations : la sérialisation peut se faire hors verrou
+            payload = self.backend.prepare(records, self.snapshot.factions)
+            self._pending = []
+            self._dirty.clear()
+        try:
+            with STORAGE_DURATION.time(operation="write"):
+                payload = self.backend.serialize(payload)
+                self.backend.write(payload)
+        except Exception as e:
+            print(f"Erreur lors de l'enregistrement des factions: {e}")
+            ERRORS.inc(source="storage", type=type(e).__name__)
+            self._requeue(records)
+            raise
+        STORAGE_BYTES.inc(self.backend.payload_size(payload), operation="write")
+        if self.backend.needs_compaction():
+            self._compact_job()
+        self.stored_bytes = self.backend.stored_size()
+        return True
+
+    def _compact_job(self):
+        """Replie le journal dans un état de référence ; exécuté sur l'exécuteur d'E/S.
+
+        Seule la bascule est faite sous verrou : l'instantané publié (qui
+        inclut les mutations en attente, qui n'ont donc plus à être
+        journalisées) et les mutations en attente sont pris ensemble. La
+        sérialisation complète se fait ensuite hors verrou, sur cet
+        instantané immuable.
+        """
+        with self._lock:
+            snapshot = self.snapshot
+            records = self._pending
+            self._pending = []
+            self._dirty.clear()
+        try:
+            payload = self.backend.prepare_compaction(snapshot.factions)
+            if payload is not None:
+                with STORAGE_DURATION.time(operation="compaction"):
+                    self.backend.write_compaction(payload)
+        except Exception as e:
+            print(f"Erreur lors de la compaction des factions: {e}")
+            ERRORS.inc(source="storage", type=type(e).__name__)
+            self._requeue(records)
+            raise
+        if payload is None:
+            # Pas d'état de référence pour ce backend : les mutations restent à écrire
+            self._requeue(records)
+            return
+        STORAGE_BYTES.inc(self.backend.payload_size(payload), operation="compaction")
+        self.stored_bytes = self.backend.stored_size()
+
+    def _run_io_sync(self, func: Callable):
+        """Exécute `func` sur l'exécuteur d'E/S et attend son résultat.
+
+        À la sortie de l'interpréteur, l'exécuteur est arrêté avant les
+        fonctions atexit et n'accepte plus de travail : son thread a terminé
+        les écritures en cours, `func` s'exécute alors sur le thread appelant.
+        """
+        try:
+            future = self.io_executor.submit(func)
+        except RuntimeError:
+            return func()
+        return future.result()
+
+    def flush(self) -> bool:
+        """Écrit les modifications en attente et attend la fin de l'écriture"""
+        return self._run_io_sync(self._flush_job)
+
+    async def flush_async(self) -> bool:
+        """Écrit les modifications en attente sans bloquer la boucle d'événements"""
+        return await asyncio.wrap_future(self.io_executor.submit(self._flush_job))
+
+    async def run_io(self, func: Callable, *args):
+        """Exécute une opération de stockage bloquante sur l'exécuteur d'E/S"""
+        return await asyncio.wrap_future(self.io_executor.submit(func, *args))
+
+    async def _flush_loop_async(self):
+        while not self._stop_event.is_set():
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_async()
+            except Exception:
+                # L'erreur est déjà journalisée, on réessaiera au prochain cycle
+                pass
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def start(self):
+        """Démarre l'écriture différée : tâche asyncio si une boucle tourne, thread sinon"""
+        if self._flush_task is not None or self._flush_thread is not None:
+            return
+        self._stop_event.clear()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            self._flush_task = loop.create_task(self._flush_loop_async())
+        else:
+            self._flush_thread = threading.Thread(target=self._flush_loop, name="faction-store-flush", daemon=True)
+            self._flush_thread.start()
+        atexit.register(self.close)
+
+    def _stop(self) -> bool:
+        """Arrête l'écriture différée ; renvoie False si le stockage était déjà fermé"""
+        if self._closed:
+            return False
+        self._closed = True
+        self._stop_event.set()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+        return True
+
+    def _release(self):
+        self.io_executor.shutdown(wait=True)
+        self.backend.close()
+        # Un stockage fermé (serveur déchargé) ne doit pas rester référencé jusqu'à la sortie
+        atexit.unregister(self.close)
+
+    def close(self):
+        """Arrête l'écriture différée et enregistre les dernières modifications"""
+        if not self._stop():
+            return
+        self.flush()
+        if self.backend.needs_compaction(closing=True):
+            self._run_io_sync(self._compact_job)
+        self._release()
+
+    async def close_async(self):
+        """Comme close(), sans bloquer la boucle d'événements pendant l'écriture"""
+        if not self._stop():
+            return
+        await self.flush_async()
+        if self.backend.needs_compaction(closing=True):
+            await self.run_io(self._compact_job)
+        self._release()
@@ -0,0 +1,226 @@
+import asyncio
+import contextlib
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+import discord
+from building_catalog import BuildingCatalog
+from faction_manager import FactionManager
+from faction_storage import create_backend
+
+
+class GuildRegistry:
+    """Données des factions partitionnées par serveur Discord.
+
+    Chaque serveur a ses propres fichiers (`data_dir/<id>/factions.json`) et
+    son propre FactionManager, chargé hors de la boucle d'événements à la
+    première commande qui le concerne. Les serveurs chargés sont tenus dans
+    un LRU : quand la taille de leurs données dépasse `memory_budget`, les
+    moins récemment utilisés sont enregistrés puis déchargés. Un serveur
+    utilisé par une commande en cours, ou épinglé (tableau de bord), n'est
+    jamais déchargé. Mémoire et coût d'une commande dépendent ainsi des
+    serveurs actifs, pas du nombre total de serveurs.
+    """
+
+    def __init__(self, data_dir: str = "data/guilds", backend: str = "json", flush_interval: float = 2.0,
+                 memory_budget: int = 64 * 1024 * 1024, catalog_filename: str = "data/buildings.json",
+                 lean_members: bool = False):
+        self.data_dir = data_dir
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.memory_budget = memory_budget
+        self.lean_members = lean_members
+        # Catalogue des bâtiments commun à tous les serveurs
+        self.catalog = BuildingCatalog(catalog_filename)
+        self._managers: "OrderedDict[int, FactionManager]" = OrderedDict()
+        self._loading: Dict[int, asyncio.Task] = {}
+        self._unloading: Dict[int, asyncio.Task] = {}
+        self._leases: Dict[int, int] = {}
+        # Serveurs attendus par get() : chargés mais pas encore rendus (ni loués par acquire())
+        self._acquiring: Dict[int, int] = {}
+        self._pinned: Set[int] = set()
+        # Serveurs dont l'index des membres a été construit depuis le cache Discord
+        self._indexed: Set[int] = set()
+        self.evictions = 0
+
+    def filename(self, guild_id: int) -> str:
+        return os.path.join(self.data_dir, str(guild_id), "factions.json")
+
+    def loaded(self) -> List[FactionManager]:
+        return list(self._managers.values())
+
+    def memory_usage(self) -> int:
+        """Taille des données des serveurs chargés (octets sur disque, estimation de l'empreinte)"""
+        return sum(manager.store.stored_bytes for manager in self._managers.values())
+
+    def peek(self, guild_id: int) -> Optional[FactionManager]:
+        """Gestionnaire du serveur s'il est chargé, sans le charger ni le marquer comme utilisé"""
+        return self._managers.get(guild_id)
+
+    # Chargement
+
+    def _create(self, guild_id: int) -> FactionManager:
+        return FactionManager(
+            filename=self.filename(guild_id),
+            flush_interval=self.flush_interval,
+            backend=self.backend,
+            catalog=self.catalog,
+            lean_members=self.lean_members
+        )
+
+    async def _load(self, guild_id: int) -> FactionManager:
+        try:
+            unloading = self._unloading.get(guild_id)
+            if unloading is not None:
+                # Le serveur est en cours de déchargement : on relit ce qu'il vient d'écrire
+                await unloading
+            manager = await asyncio.get_running_loop().run_in_executor(None, self._create, guild_id)
+            manager.start()
+            self._managers[guild_id] = manager
+        finally:
+            del self._loading[guild_id]
+        await self._evict(keep=guild_id)
+        return manager
+
+    async def load(self, guild_id: int) -> FactionManager:
+        """Gestionnaire du serveur, chargé au besoin"""
+        manager = self._managers.get(guild_id)
+        if manager is not None:
+            self._managers.move_to_end(guild_id)
+            return manager
+        if guild_id not in self._loading:
+            self._loading[guild_id] = asyncio.get_running_loop().create_task(self._load(guild_id))
+        return await asyncio.shield(self._loading[guild_id])
+
+    async def get(self, guild: Optional[discord.Guild]) -> FactionManager:
+        """Gestionnaire du serveur, avec l'index des membres construit depuis son cache"""
+        if guild is None:
+            raise ValueError("Cette commande doit être utilisée sur un serveur !")
+        # Tant que le chargement n'est pas rendu, un autre chargement ne doit pas décharger ce serveur
+        self._acquiring[guild.id] = self._acquiring.get(guild.id, 0) + 1
+        try:
+            manager = await self.load(guild.id)
+        finally:
+            count = self._acquiring.pop(guild.id) - 1
+            if count > 0:
+                self._acquiring[guild.id] = count
+        if guild.id not in self._indexed:
+            manager.index.build_members([guild])
+            self._indexed.add(guild.id)
+        return manager
+
+    # Utilisation et déchargement
+
+    async def acquire(self, guild: discord.Guild) -> FactionManager:
+        """Comme get(), en empêchant le déchargement jusqu'à release()"""
+        manager = await self.get(guild)
+        # Pas d'attente entre le retour de get() et la prise du bail : le serveur ne peut pas être déchargé entre-temps
+        self._leases[guild.id] = self._leases.get(guild.id, 0) + 1
+        return manager
+
+    def release(self, guild_id: int):
+        count = self._leases.get(guild_id, 0) - 1
+        if count > 0:
+            self._leases[guild_id] = count
+        else:
+            self._leases.pop(guild_id, None)
+
+    @contextlib.asynccontextmanager
+    async def use(self, guild: discord.Guild):
+        manager = await self.acquire(guild)
+        try:
+            yield manager
+        finally:
+            self.release(guild.id)
+
+    def pin(self, guild_id: int):
+        """Garde le serveur chargé en permanence"""
+        self._pinned.add(guild_id)
+
+    async def unload(self, guild_id: int):
+        """Enregistre puis décharge un serveur"""
+        manager = self._managers.pop(guild_id, None)
+        if manager is None:
+            return
+        self._indexed.discard(guild_id)
+        task = self._unloading[guild_id] = asyncio.get_running_loop().create_task(manager.close_async())
+        try:
+            await task
+        finally:
+            del self._unloading[guild_id]
+        self.evictions += 1
+
+    async def _evict(self, keep: Optional[int] = None):
+        """Décharge les serveurs les moins récemment utilisés tant que le budget est dépassé"""
+        for guild_id in list(self._managers):
+            if self.memory_usage() <= self.memory_budget:
+                return
+            if guild_id == keep or guild_id in self._pinned or self._leases.get(guild_id) or guild_id in self._acquiring:
+                continue
+            await self.unload(guild_id)
+
+    def close(self):
+        """Enregistre et ferme tous les serveurs chargés (arrêt du bot)"""
+        for manager in self._managers.values():
+            manager.close()
+        self._managers.clear()
+
+    # Reprise des données d'avant le partitionnement
+
+    def _legacy_paths(self, filename: str) -> List[str]:
+        if self.backend == "sqlite":
+            database = os.path.splitext(filename)[0] + ".db"
+            return [database, database + "-wal", database + "-shm"]
+        if self.backend == "binary":
+            filename = os.path.splitext(filename)[0] + ".bin"
+        journal = os.path.splitext(filename)[0] + ".journal"
+        return [filename, journal, journal + ".compacting"]
+
+    async def migrate_legacy(self, filename: str, guilds: Iterable[discord.Guild]) -> int:
+        """Répartit les factions de l'ancien fichier unique entre les serveurs ; renvoie leur nombre.
+
+        Une faction revient au serveur qui possède son rôle (au seul serveur
+        du bot s'il n'y en a qu'un). L'ancien fichier est ensuite renommé en
+        `.migre` : il garde les factions qui n'ont pu être attribuées.
+        """
+        paths = self._legacy_paths(filename)
+        if not os.path.exists(paths[0]):
+            return 0
+        backend = create_backend(self.backend, filename)
+        try:
+            factions = await asyncio.get_running_loop().run_in_executor(None, backend.load)
+        finally:
+            backend.close()
+        if not factions:
+            return 0
+        guilds = list(guilds)
+        by_guild: Dict[int, List[str]] = {}
+        unassigned = []
+        for name, data in factions.items():
+            owner = next((guild for guild in guilds if guild.get_role(data.get("role_id"))), None)
+            if owner is None and len(guilds) == 1:
+                owner = guilds[0]
+            if owner is None:
+                unassigned.append(name)
+            else:
+                by_guild.setdefault(owner.id, []).append(name)
+        migrated = 0
+        for guild in guilds:
+            names = by_guild.get(guild.id)
+            if not names:
+                continue
+            async with self.use(guild) as manager:
+                with manager.store.batch():
+                    for name in names:
+                        if name not in manager.store:
+                            manager.store.create(name, factions[name])
+                            manager.index.add_faction(name, factions[name]["role_id"])
+                            migrated += 1
+                manager.index.build_members([guild])
+                await manager.store.flush_async()
+        for path in paths:
+            if os.path.exists(path):
+                os.replace(path, path + ".migre")
+        if unassigned:
+            print(f"⚠️ Factions sans serveur, conservées dans {paths[0]}.migre : {', '.join(unassigned)}")
+        return migrated
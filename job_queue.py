@@ -0,0 +1,106 @@
+import asyncio
+import itertools
+import time
+from typing import Awaitable, Callable, List, Optional
+from metrics import ERRORS, JOB_WAIT
+
+# Priorités : les plus petites passent en premier
+HIGH = 0     # interactions Discord (délai de 3 secondes déjà entamé)
+NORMAL = 1   # commandes des joueurs
+LOW = 2      # opérations d'administration sur toutes les factions
+
+
+class JobQueue:
+    """File de travaux bornée et prioritaire, traitée par des tâches de fond.
+
+    Les commandes accusent réception tout de suite puis confient le travail
+    lourd (stockage, appels à l'API Discord) à la file ; le résultat est
+    renvoyé à l'appelant par un futur. À priorité égale, l'ordre d'arrivée
+    est respecté. Quand la file est pleine, le travail est refusé plutôt
+    que d'attendre sans limite.
+
+    Au plus `workers` travaux s'exécutent en même temps. Si une place est
+    libre et que rien n'attend, `run` exécute le travail directement dans
+    la tâche appelante : la file n'ajoute alors aucun aller-retour.
+    """
+
+    def __init__(self, workers: int = 4, max_size: int = 100):
+        self.worker_count = workers
+        self.max_size = max_size
+        self.active = 0
+        self._sequence = itertools.count()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        """Nombre de travaux en attente"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def saturated(self) -> bool:
+        """Indique si un nouveau travail attendrait derrière d'autres"""
+        return self._slots is not None and (self._slots.locked() or self.depth > 0)
+
+    async def _work(self):
+        while True:
+            _, _, name, factory, future, queued_at = await self._queue.get()
+            try:
+                if future.cancelled():
+                    # L'appelant a abandonné : inutile d'exécuter le travail
+                    continue
+                async with self._slots:
+                    JOB_WAIT.observe(time.perf_counter() - queued_at, job=name)
+                    self.active += 1
+                    try:
+                        result = await factory()
+                    except Exception as e:
+                        if not future.cancelled():
+                            future.set_exception(e)
+                    else:
+                        if not future.cancelled():
+                            future.set_result(result)
+                    finally:
+                        self.active -= 1
+            finally:
+                self._queue.task_done()
+
+    def submit(self, name: str, factory: Callable[[], Awaitable], priority: int = NORMAL) -> asyncio.Future:
+        """Met un travail en file et renvoie le futur de son résultat"""
+        if self._queue is None:
+            raise RuntimeError("La file de travaux n'est pas démarrée")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((priority, next(self._sequence), name, factory, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            ERRORS.inc(source="job_queue", type="QueueFull")
+            raise ValueError("Le bot est surchargé, réessayez dans quelques instants !")
+        return future
+
+    async def run(self, name: str, factory: Callable[[], Awaitable], priority: int = NORMAL):
+        """Exécute un travail via la file et attend son résultat"""
+        if self._slots is not None and not self._slots.locked() and not self._queue.qsize():
+            async with self._slots:
+                JOB_WAIT.observe(0.0, job=name)
+                self.active += 1
+                try:
+                    return await factory()
+                finally:
+                    self.active -= 1
+        return await self.submit(name, factory, priority)
+
+    def start(self):
+        """Démarre les tâches de traitement sur la boucle courante"""
+        if self._workers:
+            return
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue(maxsize=self.max_size)
+            self._slots = asyncio.Semaphore(self.worker_count)
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._work()) for _ in range(self.worker_count)]
+
+    def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
@@ -1,6 +1,7 @@
 
-from flask import Flask
+from flask import Flask, Response
 from threading import Thread
+from metrics import REGISTRY
 
 app = Flask('keep_alive')
 
@@ -8,6 +9,10 @@ app = Flask('keep_alive')
 def home():
     return "Le bot est actif"
 
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), content_type=REGISTRY.CONTENT_TYPE)
+
 def run():
     app.run(host='0.0.0.0', port=8080)
 
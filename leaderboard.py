@@ -0,0 +1,249 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+from building_catalog import BuildingCatalog
+from exchange import RATE_SCALE, to_fixed
+from faction_store import FactionStore
+
+# Classement par défaut et taille d'une page de classement
+DEFAULT_BOARD = "solde"
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+Entry = Tuple[int, str]
+
+
+class RankedIndex:
+    """Multiensemble trié de couples (clé, nom) avec accès par rang.
+
+    Les entrées sont réparties dans des sous-listes triées d'au plus
+    2 * `load` éléments. Un arbre de Fenwick sur la taille des sous-listes
+    donne le rang d'une entrée et l'entrée d'un rang en O(log n). Insérer
+    ou retirer ne décale qu'une sous-liste : le coût ne dépend pas du nombre
+    total d'entrées.
+    """
+
+    def __init__(self, entries: Iterable[Entry] = (), load: int = 256):
+        self.load = load
+        ordered = sorted(entries)
+        self._lists: List[List[Entry]] = [ordered[i:i + load] for i in range(0, len(ordered), load)]
+        self._maxes: List[Entry] = [sub[-1] for sub in self._lists]
+        self._len = len(ordered)
+        self._build_tree()
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _build_tree(self):
+        tree = [0] + [len(sub) for sub in self._lists]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update_tree(self, position: int, delta: int):
+        i = position + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, position: int) -> int:
+        """Nombre d'entrées dans les sous-listes avant `position`"""
+        total = 0
+        i = position
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, rank: int) -> Tuple[int, int]:
+        """(sous-liste, indice dans la sous-liste) de l'entrée de rang `rank` (à partir de 0)"""
+        position = 0
+        bit = 1 << (len(self._tree) - 1).bit_length()
+        while bit:
+            following = position + bit
+            if following < len(self._tree) and self._tree[following] <= rank:
+                position = following
+                rank -= self._tree[following]
+            bit >>= 1
+        return position, rank
+
+    def add(self, entry: Entry):
+        if not self._lists:
+            self._lists.append([entry])
+            self._maxes.append(entry)
+            self._len = 1
+            self._build_tree()
+            return
+        position = min(bisect_left(self._maxes, entry), len(self._lists) - 1)
+        sub = self._lists[position]
+        insort(sub, entry)
+        self._maxes[position] = sub[-1]
+        self._len += 1
+        if len(sub) > 2 * self.load:
+            # Sous-liste trop longue : coupée en deux, l'arbre est reconstruit (rare, en O(n / load))
+            self._lists[position:position + 1] = [sub[:self.load], sub[self.load:]]
+            self._maxes[position:position + 1] = [sub[self.load - 1], sub[-1]]
+            self._build_tree()
+        else:
+            self._update_tree(position, 1)
+
+    def remove(self, entry: Entry):
+        """Retire une entrée ; lève KeyError si elle est absente"""
+        position = bisect_left(self._maxes, entry)
+        if position == len(self._lists):
+            raise KeyError(entry)
+        sub = self._lists[position]
+        i = bisect_left(sub, entry)
+        if i == len(sub) or sub[i] != entry:
+            raise KeyError(entry)
+        del sub[i]
+        self._len -= 1
+        if not sub:
+            del self._lists[position]
+            del self._maxes[position]
+            self._build_tree()
+            return
+        self._maxes[position] = sub[-1]
+        self._update_tree(position, -1)
+
+    def rank(self, entry: Entry) -> int:
+        """Nombre d'entrées strictement avant `entry`"""
+        position = bisect_left(self._maxes, entry)
+        if position == len(self._lists):
+            return self._len
+        return self._prefix(position) + bisect_left(self._lists[position], entry)
+
+    def slice(self, start: int, count: int) -> List[Entry]:
+        """Entrées de rang `start` à `start + count` (exclu)"""
+        if start >= self._len or count <= 0:
+            return []
+        position, i = self._locate(max(0, start))
+        entries: List[Entry] = []
+        while position < len(self._lists) and len(entries) < count:
+            entries.extend(self._lists[position][i:i + count - len(entries)])
+            position += 1
+            i = 0
+        return entries
+
+
+class Rank(NamedTuple):
+    rank: int
+    name: str
+    value: float
+
+
+class Ranking(NamedTuple):
+    board: str
+    total: int
+    entries: List[Rank]
+    # Rang de la faction demandée, même hors de la page
+    own: Optional[Rank]
+
+
+class Leaderboards:
+    """Classements des factions tenus à jour à chaque mutation.
+
+    Un classement par critère : solde ramené en monnaie générale par le taux
+    de change, chaque ressource, total des niveaux de bâtiments. Chacun est
+    un RankedIndex de couples (-valeur, nom), construit à la première
+    demande depuis l'instantané publié. Ensuite, le stockage notifie chaque
+    mutation validée (transferts, ajouts, constructions, taux de change,
+    production, imports...) et seule l'entrée de la faction concernée est
+    déplacée, en O(log n). Le top K et le rang d'une faction ne parcourent
+    jamais toute l'économie.
+    """
+
+    def __init__(self, store: FactionStore, catalog: BuildingCatalog):
+        self.store = store
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._boards: Dict[str, RankedIndex] = {}
+        # classement -> nom -> entrée actuelle, pour la retirer à la prochaine mise à jour
+        self._entries: Dict[str, Dict[str, Entry]] = {}
+        self._catalog_version = catalog.version
+        store.add_listener(self._on_records)
+
+    def boards(self) -> List[str]:
+        """Critères de classement disponibles"""
+        return [DEFAULT_BOARD, *self.catalog.resources, "batiments"]
+
+    def _value(self, board: str, data: Mapping) -> int:
+        """Valeur classée d'une faction (le solde en millionièmes de monnaie générale)"""
+        if board == DEFAULT_BOARD:
+            return data.get("balance", 0) * to_fixed(data.get("exchange_rate", 1))
+        if board == "batiments":
+            return sum(data.get("buildings", {}).values())
+        return data.get("resources", {}).get(board, 0)
+
+    def _display(self, board: str, key: int) -> float:
+        return -key / RATE_SCALE if board == DEFAULT_BOARD else -key
+
+    def _board(self, board: str) -> RankedIndex:
+        """Classement demandé, construit depuis l'instantané à la première demande (sous verrou)"""
+        if self._catalog_version != self.catalog.version:
+            # Ressources ou bâtiments du catalogue modifiés : les classements sont reconstruits
+            self._boards.clear()
+            self._entries.clear()
+            self._catalog_version = self.catalog.version
+        index = self._boards.get(board)
+        if index is None:
+            if board not in self.boards():
+                raise ValueError(f"Classement '{board}' inconnu ! Disponibles : {', '.join(self.boards())}")
+            entries = {name: (-self._value(board, data), name)
+                       for name, data in self.store.snapshot.factions.items()}
+            index = self._boards[board] = RankedIndex(entries.values())
+            self._entries[board] = entries
+        return index
+
+    def _update(self, board: str, name: str):
+        index = self._boards[board]
+        entries = self._entries[board]
+        data = self.store.get(name)
+        # Nouvelle clé calculée avant de retirer l'ancienne : si le calcul échoue, la faction reste classée
+        entry = (-self._value(board, data), name) if data is not None else None
+        previous = entries.pop(name, None)
+        if previous is not None:
+            index.remove(previous)
+        if entry is not None:
+            entries[name] = entry
+            index.add(entry)
+
+    def _on_records(self, records: List[Dict]):
+        """Appelé par le stockage, sous son verrou : seules les factions touchées sont reclassées"""
+        with self._lock:
+            if not self._boards:
+                return
+            changed: Dict[str, set] = {}
+            for record in records:
+                if "c" in record:
+                    boards = self._boards.keys()
+                else:
+                    head, _, key = record["p"].partition(".")
+                    if head in ("balance", "exchange_rate"):
+                        boards = (DEFAULT_BOARD,)
+                    elif head == "buildings":
+                        boards = ("batiments",)
+                    elif head == "resources":
+                        boards = (key,) if key else self.catalog.resources
+                    else:
+                        continue
+                changed.setdefault(record["f"], set()).update(board for board in boards if board in self._boards)
+            for name, boards in changed.items():
+                for board in boards:
+                    self._update(board, name)
+
+    def ranking(self, board: str = DEFAULT_BOARD, start: int = 0, count: int = PAGE_SIZE,
+                faction: Optional[str] = None) -> Ranking:
+        """Page du classement à partir du rang `start` (0 = premier), avec le rang de `faction`"""
+        count = max(1, min(count, MAX_PAGE_SIZE))
+        with self._lock:
+            index = self._board(board)
+            entries = [Rank(start + i + 1, name, self._display(board, key))
+                       for i, (key, name) in enumerate(index.slice(max(0, start), count))]
+            own = None
+            entry = self._entries[board].get(faction) if faction else None
+            if entry is not None:
+                own = Rank(index.rank(entry) + 1, faction, self._display(board, entry[0]))
+            return Ranking(board, len(index), entries, own)
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+from faction_store import FactionStore
+
+# Champs affichés par le tableau de bord ; les autres (production, horodatages...) ne sont pas diffusés
+FEED_FIELDS = ("balance", "exchange_rate", "currency_name", "resources", "buildings")
+# Commentaire SSE envoyé en l'absence d'événement pour garder la connexion ouverte
+HEARTBEAT_INTERVAL = 15.0
+
+Subscription = Union[queue.Queue, asyncio.Queue]
+
+
+class LiveFeed:
+    """Flux des modifications de factions pour le tableau de bord (Server-Sent Events).
+
+    Le stockage notifie chaque mutation validée ; le flux les regroupe par
+    faction, en ne gardant que la dernière valeur de chaque champ. À chaque
+    tick, un seul message contenant les différences compactes de toutes les
+    factions modifiées est diffusé aux abonnés : une rafale de transferts
+    donne une mise à jour par faction, pas une par mutation. Un abonné trop
+    lent pour suivre est déconnecté (il se reconnecte et recharge la page).
+    """
+
+    def __init__(self, store: FactionStore, tick: float = 0.5, max_queue: int = 100):
+        self.store = store
+        self.tick = tick
+        self.max_queue = max_queue
+        self.sequence = 0
+        self._lock = threading.Lock()
+        self._changes: Dict[str, Dict] = {}
+        # (boucle de l'abonné ou None pour un thread, file de messages)
+        self._subscribers: List[Tuple[Optional[asyncio.AbstractEventLoop], Subscription]] = []
+        self._stop_event = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        store.add_listener(self._on_records)
+
+    def _on_records(self, records: List[Dict]):
+        """Appelé par le stockage, sous son verrou : on se contente d'accumuler"""
+        with self._lock:
+            for record in records:
+                diff = self._changes.setdefault(record["f"], {})
+                if "c" in record:
+                    diff.clear()
+                    diff["new"] = True
+                    continue
+                head, _, key = record["p"].partition(".")
+                if head not in FEED_FIELDS:
+                    continue
+                value = dict(record["v"]) if isinstance(record["v"], dict) else record["v"]
+                if key:
+                    diff.setdefault(head, {})[key] = value
+                else:
+                    diff[head] = value
+
+    def flush(self) -> Optional[str]:
+        """Diffuse les modifications accumulées depuis le dernier tick ; renvoie le message envoyé"""
+        with self._lock:
+            changes = {name: diff for name, diff in self._changes.items() if diff}
+            self._changes = {}
+        if not changes:
+            return None
+        self.sequence += 1
+        message = (f"id: {self.sequence}\nevent: factions\n"
+                   f"data: {json.dumps(changes, separators=(',', ':'), ensure_ascii=False)}\n\n")
+        for loop, subscription in list(self._subscribers):
+            if loop is None:
+                self._offer(subscription, message)
+            else:
+                loop.call_soon_threadsafe(self._offer, subscription, message)
+        return message
+
+    def _offer(self, subscription: Subscription, message: str):
+        try:
+            subscription.put_nowait(message)
+        except (queue.Full, asyncio.QueueFull):
+            # Abonné trop lent : on vide sa file et on lui signale de se déconnecter
+            self.unsubscribe(subscription)
+            while not subscription.empty():
+                subscription.get_nowait()
+            subscription.put_nowait(None)
+
+    # Abonnements
+
+    def subscribe(self) -> queue.Queue:
+        """Abonnement lu depuis un thread (serveur Flask) ; None signale la fin du flux"""
+        subscription = queue.Queue(self.max_queue)
+        self._subscribers.append((None, subscription))
+        return subscription
+
+    def subscribe_async(self) -> asyncio.Queue:
+        """Abonnement lu depuis la boucle courante (serveur aiohttp) ; None signale la fin du flux"""
+        subscription = asyncio.Queue(self.max_queue)
+        self._subscribers.append((asyncio.get_running_loop(), subscription))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers = [entry for entry in self._subscribers if entry[1] is not subscription]
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    # Tick
+
+    async def _tick_loop_async(self):
+        while not self._stop_event.is_set():
+            await asyncio.sleep(self.tick)
+            self.flush()
+
+    def _tick_loop(self):
+        while not self._stop_event.wait(self.tick):
+            self.flush()
+
+    def start(self):
+        """Démarre le tick : tâche asyncio si une boucle tourne, thread sinon"""
+        if self._task is not None or self._thread is not None:
+            return
+        self._stop_event.clear()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            self._task = loop.create_task(self._tick_loop_async())
+        else:
+            self._thread = threading.Thread(target=self._tick_loop, name="live-feed", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._thread = None
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Optional
+
+
+class EventLoopLagMonitor:
+    """Mesure le retard de la boucle d'événements.
+
+    Une tâche se réveille toutes les `interval` secondes et compare l'heure
+    réelle de réveil à l'heure prévue : l'écart correspond au temps pendant
+    lequel la boucle était bloquée (E/S synchrones, calculs longs...).
+    """
+
+    def __init__(self, interval: float = 0.5, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stall_count = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                self.stall_count += 1
+                print(f"⚠️ Boucle d'événements bloquée pendant {lag * 1000:.0f} ms")
+
+    def start(self):
+        """Démarre la surveillance sur la boucle courante"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
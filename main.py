@@ -1,28 +1,81 @@
+import asyncio
 import os
 import discord
 from discord.ext import commands
 from discord import app_commands
+import io
 import json
-from faction_manager import FactionManager
+import time
+from typing import Optional
+from aio_web import AioWebServer
+from bulk_economy import MAX_IMPORT_BYTES, detect_format
+from building_embeds import BuildingEmbeds
+from guild_registry import GuildRegistry
+from job_queue import HIGH, LOW, NORMAL, JobQueue
 from web_app import start_server
 from keep_alive import keep_alive
+from leaderboard import DEFAULT_BOARD, PAGE_SIZE
+from loop_monitor import EventLoopLagMonitor
+from metrics import COMMAND_DURATION, ERRORS, REGISTRY
 
 # Configuration du bot avec les intents nécessaires
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
-faction_manager = FactionManager()
+# MEMBER_CACHE=lean : aucun membre gardé en cache ni chargé par découpage au démarrage. Les
+# membres des factions sont résolus à la demande, depuis les rôles reçus avec chaque commande,
+# et seul l'index compact membre → faction du bot est conservé
+LEAN_MEMBER_CACHE = os.getenv('MEMBER_CACHE', 'full') == 'lean'
+bot = commands.Bot(
+    command_prefix="!",
+    intents=intents,
+    member_cache_flags=discord.MemberCacheFlags.none() if LEAN_MEMBER_CACHE else discord.MemberCacheFlags.from_intents(intents),
+    chunk_guilds_at_startup=not LEAN_MEMBER_CACHE
+)
+# Données des factions par serveur, chargées à la demande et déchargées au-delà du budget mémoire
+guilds = GuildRegistry(
+    data_dir=os.getenv('FACTION_DATA_DIR', 'data/guilds'),
+    backend=os.getenv('FACTION_BACKEND', 'json'),
+    flush_interval=float(os.getenv('FACTION_FLUSH_INTERVAL', '2.0')),
+    memory_budget=int(float(os.getenv('FACTION_MEMORY_BUDGET_MB', '64')) * 1024 * 1024),
+    lean_members=LEAN_MEMBER_CACHE
+)
+# Ancien fichier unique, réparti entre les serveurs au premier démarrage
+LEGACY_DATA_FILE = os.getenv('FACTION_DATA_FILE', 'data/factions.json')
+building_embeds = BuildingEmbeds(guilds.catalog)
+loop_monitor = EventLoopLagMonitor(threshold=float(os.getenv('LOOP_LAG_THRESHOLD', '0.1')))
+# Travaux lourds des commandes, exécutés après l'accusé de réception
+job_queue = JobQueue(
+    workers=int(os.getenv('JOB_WORKERS', '4')),
+    max_size=int(os.getenv('JOB_QUEUE_SIZE', '100'))
+)
+# Au-delà de ce délai (en secondes), une commande préfixée affiche l'indicateur de saisie
+TYPING_DELAY = float(os.getenv('TYPING_DELAY', '1.0'))
 
-# Démarrage des deux serveurs web avant le bot
-print("Démarrage de l'interface web principale...")
-start_server()
-print("Interface web principale démarrée sur http://0.0.0.0:5000")
+# Métriques lues à chaque exposition sur /metrics
+REGISTRY.gauge("cosmosum_event_loop_lag_seconds", "Dernier retard mesuré de la boucle d'événements", lambda: loop_monitor.last_lag)
+REGISTRY.gauge("cosmosum_event_loop_lag_max_seconds", "Plus grand retard de la boucle d'événements", lambda: loop_monitor.max_lag)
+REGISTRY.gauge("cosmosum_event_loop_stalls", "Nombre de blocages de la boucle au-delà du seuil", lambda: loop_monitor.stall_count)
+REGISTRY.gauge("cosmosum_factions", "Nombre de factions des serveurs chargés",
+               lambda: sum(len(manager.store.snapshot.factions) for manager in guilds.loaded()))
+REGISTRY.gauge("cosmosum_faction_members", "Nombre de membres appartenant à une faction (serveurs chargés)",
+               lambda: sum(manager.index.member_count() for manager in guilds.loaded()))
+REGISTRY.gauge("cosmosum_storage_pending_factions", "Factions modifiées en attente d'écriture",
+               lambda: sum(len(manager.store.dirty) for manager in guilds.loaded()))
+REGISTRY.gauge("cosmosum_storage_size_bytes", "Taille sur disque des données des serveurs chargés", guilds.memory_usage)
+REGISTRY.gauge("cosmosum_guilds_loaded", "Serveurs dont les données sont en mémoire", lambda: len(guilds.loaded()))
+REGISTRY.gauge("cosmosum_guild_evictions", "Serveurs déchargés pour respecter le budget mémoire", lambda: guilds.evictions)
+REGISTRY.gauge("cosmosum_job_queue_depth", "Travaux en attente dans la file", lambda: job_queue.depth)
+REGISTRY.gauge("cosmosum_job_workers_busy", "Tâches de la file occupées par un travail", lambda: job_queue.active)
+
+# WEB_SERVER=aiohttp sert le tableau de bord et le keep_alive depuis la boucle du bot
+USE_AIOHTTP = os.getenv('WEB_SERVER', 'flask') == 'aiohttp'
+aio_web: Optional[AioWebServer] = None
+# Serveur affiché par le tableau de bord (par défaut le premier serveur du bot)
+DASHBOARD_GUILD_ID = os.getenv('DASHBOARD_GUILD_ID')
+dashboard_started = False
 
-print("Démarrage du serveur keep_alive...")
-keep_alive()
-print("Serveur keep_alive démarré sur http://0.0.0.0:8080")
 
 # Boutons pour Créer une Faction et Rejoindre une Faction
 class BoutonsFaction(discord.ui.View):
@@ -49,11 +102,14 @@ class ModalCreationFaction(discord.ui.Modal, title="Créer une Faction"):
 
     async def on_submit(self, interaction: discord.Interaction):
         nom = self.nom_faction.value.strip()
+        # Accusé de réception immédiat : la création peut dépasser les 3 secondes accordées par Discord
+        await interaction.response.defer(ephemeral=True, thinking=True)
         try:
-            resultat = await faction_manager.create_faction(interaction, nom)
-            await interaction.response.send_message(resultat, ephemeral=True)
+            async with guilds.use(interaction.guild) as faction_manager:
+                resultat = await job_queue.run("create_faction", lambda: faction_manager.create_faction(interaction, nom), HIGH)
+            await interaction.followup.send(resultat, ephemeral=True)
         except Exception as e:
-            await interaction.response.send_message(f"❌ Erreur: {str(e)}", ephemeral=True)
+            await interaction.followup.send(f"❌ Erreur: {str(e)}", ephemeral=True)
 
 class ModalRejoindreFacton(discord.ui.Modal, title="Rejoindre une Faction"):
     nom_faction = discord.ui.TextInput(
@@ -65,21 +121,133 @@ class ModalRejoindreFacton(discord.ui.Modal, title="Rejoindre une Faction"):
 
     async def on_submit(self, interaction: discord.Interaction):
         nom = self.nom_faction.value.strip()
+        await interaction.response.defer(ephemeral=True, thinking=True)
         try:
-            resultat = await faction_manager.join_faction(interaction, nom)
-            await interaction.response.send_message(resultat, ephemeral=True)
+            async with guilds.use(interaction.guild) as faction_manager:
+                resultat = await job_queue.run("join_faction", lambda: faction_manager.join_faction(interaction, nom), HIGH)
+            await interaction.followup.send(resultat, ephemeral=True)
         except Exception as e:
-            await interaction.response.send_message(f"❌ Erreur: {str(e)}", ephemeral=True)
+            await interaction.followup.send(f"❌ Erreur: {str(e)}", ephemeral=True)
+
+@bot.event
+async def setup_hook():
+    global aio_web
+    # La surveillance et la file de travaux tournent sur la boucle du bot
+    # (l'écriture différée de chaque serveur démarre à son chargement)
+    loop_monitor.start()
+    job_queue.start()
+    if USE_AIOHTTP:
+        # Keep-alive et métriques disponibles dès le lancement, quel que soit le serveur affiché
+        aio_web = AioWebServer()
+        await aio_web.start_keep_alive()
+
+async def _typing_until(ctx, done: asyncio.Event):
+    async with ctx.typing():
+        await done.wait()
+
+
+async def run_job(ctx, name: str, factory, priority: int = NORMAL):
+    """Confie un travail à la file et accuse réception seulement si l'attente le justifie.
+
+    Une commande d'application est reportée (délai de 3 secondes de
+    Discord). Une commande préfixée n'a pas de délai : l'indicateur de
+    saisie, qui coûte un appel à l'API, n'est affiché que si le travail
+    attend derrière d'autres ou dure plus de TYPING_DELAY secondes.
+    """
+    if ctx.interaction is not None:
+        await ctx.defer()
+        return await job_queue.run(name, factory, priority)
+    if job_queue.saturated:
+        async with ctx.typing():
+            return await job_queue.run(name, factory, priority)
+    done = asyncio.Event()
+    typing = []
+    timer = asyncio.get_running_loop().call_later(
+        TYPING_DELAY, lambda: typing.append(asyncio.ensure_future(_typing_until(ctx, done))))
+    try:
+        return await job_queue.run(name, factory, priority)
+    finally:
+        timer.cancel()
+        done.set()
+        if typing:
+            # Un échec de l'indicateur de saisie ne doit pas faire échouer la commande
+            await asyncio.gather(*typing, return_exceptions=True)
+
+async def start_dashboard():
+    """Démarre le tableau de bord sur les données du serveur affiché (le keep_alive tourne déjà)"""
+    global dashboard_started
+    if dashboard_started or not bot.guilds:
+        return
+    dashboard_started = True
+    guild = bot.get_guild(int(DASHBOARD_GUILD_ID)) if DASHBOARD_GUILD_ID else bot.guilds[0]
+    if guild is None:
+        print(f"Serveur {DASHBOARD_GUILD_ID} introuvable : tableau de bord désactivé")
+        return
+    manager = await guilds.get(guild)
+    # Le tableau de bord lit en continu ce serveur : il n'est jamais déchargé
+    guilds.pin(guild.id)
+    if USE_AIOHTTP:
+        await aio_web.start_dashboard(manager)
+    else:
+        print("Démarrage de l'interface web principale...")
+        start_server(manager)
+        print(f"Interface web principale démarrée sur http://0.0.0.0:5000 (serveur '{guild.name}')")
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
+    # Le serveur reste chargé pendant toute la commande
+    if ctx.guild is not None:
+        await guilds.acquire(ctx.guild)
+
+@bot.after_invoke
+async def record_command_duration(ctx):
+    # Appelé même si la commande a échoué
+    COMMAND_DURATION.observe(time.perf_counter() - ctx.started_at, command=ctx.command.qualified_name)
+    if ctx.guild is not None:
+        guilds.release(ctx.guild.id)
+
+@bot.event
+async def on_command_error(ctx, error):
+    # Erreurs non gérées par les commandes elles-mêmes (arguments, permissions...)
+    ERRORS.inc(source="command", type=type(getattr(error, "original", error)).__name__)
+    if not isinstance(error, commands.CommandNotFound):
+        print(f"Erreur dans la commande {ctx.command}: {error}")
 
 @bot.event
 async def on_ready():
     print(f"Bot est prêt ! Connecté en tant que {bot.user}")
+    migrated = await guilds.migrate_legacy(LEGACY_DATA_FILE, bot.guilds)
+    if migrated:
+        print(f"{migrated} factions de {LEGACY_DATA_FILE} réparties entre les serveurs")
+    await start_dashboard()
     try:
         bot.add_view(BoutonsFaction())
         print("Boutons de faction enregistrés avec succès")
     except Exception as e:
         print(f"Erreur lors de la configuration: {e}")
 
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    # Seuls les changements de rôles peuvent modifier l'appartenance à une faction
+    # Un serveur non chargé n'a pas d'index à tenir à jour : il sera construit au chargement
+    manager = guilds.peek(after.guild.id)
+    if manager is not None and before.roles != after.roles:
+        manager.index.update_member(after)
+
+@bot.event
+async def on_raw_member_remove(payload: discord.RawMemberRemoveEvent):
+    # Version brute : reçue même pour les membres absents du cache
+    manager = guilds.peek(payload.guild_id)
+    if manager is not None:
+        manager.index.remove_member(payload.user)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    manager = guilds.peek(role.guild.id)
+    if manager is not None:
+        manager.index.remove_role(role)
+
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def configchoix(ctx):
@@ -109,7 +277,8 @@ async def configchoix_error(ctx, error):
 async def taux(ctx, taux: float):
     """Définit le taux de change de votre faction (1 unité = X monnaie générale)"""
     try:
-        result = await faction_manager.set_exchange_rate(ctx.interaction, taux)
+        faction_manager = await guilds.get(ctx.guild)
+        result = await run_job(ctx, "taux", lambda: faction_manager.set_exchange_rate(ctx.author, taux))
         await ctx.send(f"✅ {result}")
     except ValueError as e:
         await ctx.send(f"❌ {str(e)}")
@@ -121,18 +290,41 @@ async def taux(ctx, taux: float):
 async def ajouter(ctx, faction: str, montant: int):
     """[Admin] Ajoute de la monnaie à une faction"""
     try:
-        result = await faction_manager.add_currency(ctx.interaction, faction, montant)
+        faction_manager = await guilds.get(ctx.guild)
+        result = await run_job(ctx, "ajouter", lambda: faction_manager.add_currency(ctx.author, faction, montant))
         await ctx.send(f"✅ {result}")
     except ValueError as e:
         await ctx.send(f"❌ {str(e)}")
     except Exception as e:
         await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
 
+@bot.command()
+async def cotation(ctx, faction: str, montant: int):
+    """Affiche le montant que recevrait une autre faction, sans effectuer le transfert"""
+    try:
+        faction_manager = await guilds.get(ctx.guild)
+        user_faction = faction_manager.get_user_faction(ctx.author)
+        if not user_faction:
+            await ctx.send("❌ Vous n'appartenez à aucune faction !")
+            return
+        quote = faction_manager.get_quote(user_faction, faction, montant)
+        source_currency = faction_manager.store.get(user_faction)["currency_name"]
+        target_currency = faction_manager.store.get(faction)["currency_name"]
+        await ctx.send(
+            f"💱 {quote.amount} {source_currency} → {quote.converted} {target_currency} "
+            f"(taux: {quote.rate:.4f})"
+        )
+    except ValueError as e:
+        await ctx.send(f"❌ {str(e)}")
+    except Exception as e:
+        await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
+
 @bot.command()
 async def transferer(ctx, faction: str, montant: int):
     """Transfère de la monnaie à une autre faction selon les taux de change"""
     try:
-        result = await faction_manager.transfer_currency(ctx.interaction, faction, montant)
+        faction_manager = await guilds.get(ctx.guild)
+        result = await run_job(ctx, "transferer", lambda: faction_manager.transfer_currency(ctx.author, faction, montant))
         await ctx.send(f"✅ {result}")
     except ValueError as e:
         await ctx.send(f"❌ {str(e)}")
@@ -143,20 +335,14 @@ async def transferer(ctx, faction: str, montant: int):
 async def solde(ctx):
     """Affiche le solde de votre faction"""
     try:
-        factions = faction_manager._load_factions()
-        user_faction = None
-        
-        for faction_name, faction_data in factions.items():
-            role = ctx.guild.get_role(faction_data["role_id"])
-            if role and role in ctx.author.roles:
-                user_faction = faction_name
-                break
+        faction_manager = await guilds.get(ctx.guild)
+        user_faction = faction_manager.get_user_faction(ctx.author)
                 
         if not user_faction:
             await ctx.send("❌ Vous n'êtes pas membre d'une faction !")
             return
             
-        faction_data = factions[user_faction]
+        faction_data = faction_manager.store.get(user_faction)
         await ctx.send(f"💰 Faction '{user_faction}': {faction_data['balance']} {faction_data['currency_name']} (Taux de change: 1 {faction_data['currency_name']} = {faction_data['exchange_rate']} monnaie générale)")
     except Exception as e:
         await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
@@ -165,7 +351,8 @@ async def solde(ctx):
 async def ressources(ctx):
     """Affiche les ressources de votre faction"""
     try:
-        resources = await faction_manager.get_resources(ctx.interaction)
+        faction_manager = await guilds.get(ctx.guild)
+        resources = await run_job(ctx, "ressources", lambda: faction_manager.get_resources(ctx.author))
         
         embed = discord.Embed(
             title="📦 Ressources de votre faction",
@@ -187,22 +374,12 @@ async def ressources(ctx):
 async def ajouterressource(ctx, faction: str, ressource: str, montant: int):
     """[Admin] Ajoute des ressources à une faction"""
     try:
+        faction_manager = await guilds.get(ctx.guild)
         # Pour les admins, on ajoute directement à la faction spécifiée
-        factions = faction_manager._load_factions()
-        
-        if faction not in factions:
-            await ctx.send(f"❌ La faction '{faction}' n'existe pas !")
-            return
-            
-        valid_resources = ["bois", "pierre", "fer", "or"]
-        if ressource not in valid_resources:
-            await ctx.send(f"❌ Ressource invalide ! Les ressources disponibles sont: {', '.join(valid_resources)}")
-            return
-            
-        factions[faction]["resources"][ressource] += montant
-        faction_manager._save_factions(factions)
-        
-        await ctx.send(f"✅ {montant} {ressource} ajoutés à la faction '{faction}' !")
+        result = await run_job(ctx, "ajouterressource", lambda: faction_manager.add_resource_to_faction(faction, ressource, montant))
+        await ctx.send(f"✅ {result}")
+    except ValueError as e:
+        await ctx.send(f"❌ {str(e)}")
     except Exception as e:
         await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
 
@@ -210,21 +387,14 @@ async def ajouterressource(ctx, faction: str, ressource: str, montant: int):
 async def batiments(ctx):
     """Affiche les bâtiments de votre faction"""
     try:
-        factions = faction_manager._load_factions()
-        user_faction = None
-        
-        for faction_name, faction_data in factions.items():
-            role = ctx.guild.get_role(faction_data["role_id"])
-            if role and role in ctx.author.roles:
-                user_faction = faction_name
-                break
+        faction_manager = await guilds.get(ctx.guild)
+        user_faction = faction_manager.get_user_faction(ctx.author)
                 
         if not user_faction:
             await ctx.send("❌ Vous n'êtes pas membre d'une faction !")
             return
             
-        faction_buildings = factions[user_faction].get("buildings", {})
-        available_buildings = faction_manager.get_available_buildings()
+        faction_buildings = faction_manager.store.get(user_faction).get("buildings", {})
         
         if not faction_buildings:
             await ctx.send("📦 Votre faction n'a pas encore construit de bâtiments.")
@@ -236,13 +406,10 @@ async def batiments(ctx):
         )
         
         for building_name, level in faction_buildings.items():
-            building_info = available_buildings[building_name]
-            level_info = building_info["niveaux"][level]
-            embed.add_field(
-                name=f"{building_info['nom']} (Niveau {level})",
-                value=f"**Description:** {building_info['description']}\n**Bonus actuel:** {level_info['bonus']}",
-                inline=False
-            )
+            field = building_embeds.level_field(building_name, level)
+            if field:
+                name, value = field
+                embed.add_field(name=name, value=value, inline=False)
             
         await ctx.send(embed=embed)
     except Exception as e:
@@ -252,7 +419,8 @@ async def batiments(ctx):
 async def construire(ctx, batiment: str):
     """Construit ou améliore un bâtiment pour votre faction"""
     try:
-        result = await faction_manager.build(ctx.interaction, batiment)
+        faction_manager = await guilds.get(ctx.guild)
+        result = await run_job(ctx, "construire", lambda: faction_manager.build(ctx.author, batiment))
         await ctx.send(f"✅ {result}")
     except ValueError as e:
         await ctx.send(f"❌ {str(e)}")
@@ -263,42 +431,191 @@ async def construire(ctx, batiment: str):
 async def batimentsdispo(ctx):
     """Affiche les bâtiments disponibles à la construction"""
     try:
-        available_buildings = faction_manager.get_available_buildings()
+        await ctx.send(embed=building_embeds.available())
+    except Exception as e:
+        await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
+
+@bot.command()
+async def transfererressource(ctx, faction: str, ressource: str, montant: int):
+    """Transfère des ressources à une autre faction"""
+    try:
+        faction_manager = await guilds.get(ctx.guild)
+        result = await run_job(ctx, "transfererressource", lambda: faction_manager.transfer_resource(ctx.author, faction, ressource, montant))
+        await ctx.send(f"✅ {result}")
+    except ValueError as e:
+        await ctx.send(f"❌ {str(e)}")
+    except Exception as e:
+        await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
+
+@bot.command()
+async def transfertmultiple(ctx, *transferts: str):
+    """Effectue plusieurs transferts en une fois (ex: !transfertmultiple Alpha:100 Beta:bois:50)"""
+    try:
+        faction_manager = await guilds.get(ctx.guild)
+        legs = []
+        for transfert in transferts:
+            parts = transfert.split(":")
+            if len(parts) == 2:
+                faction, montant = parts
+                ressource = "monnaie"
+            elif len(parts) == 3:
+                faction, ressource, montant = parts
+            else:
+                raise ValueError(f"Format invalide pour '{transfert}' ! Utilisez faction:montant ou faction:ressource:montant")
+            try:
+                legs.append((faction, ressource, int(montant)))
+            except ValueError:
+                raise ValueError(f"Montant invalide pour '{transfert}' !")
+        result = await run_job(ctx, "transfertmultiple", lambda: faction_manager.batch_transfer(ctx.author, legs))
+        await ctx.send(f"✅ {result}")
+    except ValueError as e:
+        await ctx.send(f"❌ {str(e)}")
+    except Exception as e:
+        await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def taxe(ctx, pourcentage: float):
+    """[Admin] Prélève un pourcentage du solde de toutes les factions"""
+    try:
+        faction_manager = await guilds.get(ctx.guild)
+        result = await run_job(ctx, "taxe", lambda: faction_manager.tax_factions(pourcentage), LOW)
+        await ctx.send(f"✅ {result}")
+    except ValueError as e:
+        await ctx.send(f"❌ {str(e)}")
+    except Exception as e:
+        await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def evenement(ctx, ressource: str, pourcentage: float):
+    """[Admin] Fait varier une ressource en pourcentage pour toutes les factions"""
+    try:
+        faction_manager = await guilds.get(ctx.guild)
+        result = await run_job(ctx, "evenement", lambda: faction_manager.apply_resource_event(ressource, pourcentage), LOW)
+        await ctx.send(f"✅ {result}")
+    except ValueError as e:
+        await ctx.send(f"❌ {str(e)}")
+    except Exception as e:
+        await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def economie(ctx):
+    """[Admin] Affiche les statistiques globales de l'économie"""
+    try:
+        faction_manager = await guilds.get(ctx.guild)
+        stats = faction_manager.get_economy_statistics()
         
         embed = discord.Embed(
-            title="🏗️ Bâtiments disponibles",
-            description="Liste des bâtiments que vous pouvez construire pour votre faction",
-            color=discord.Color.gold()
+            title="📊 Économie du serveur",
+            color=discord.Color.purple()
+        )
+        embed.add_field(name="Factions", value=str(stats["factions"]), inline=True)
+        embed.add_field(name="Masse monétaire", value=f"{stats['general_total']:.2f} monnaie générale", inline=True)
+        embed.add_field(name="Solde médian", value=f"{stats['general_median']:.2f}", inline=True)
+        if stats["richest"]:
+            embed.add_field(name="Faction la plus riche", value=stats["richest"], inline=True)
+        embed.add_field(
+            name="📦 Ressources totales",
+            value="\n".join(f"{resource.capitalize()}: {amount}" for resource, amount in stats["resources"].items()),
+            inline=False
         )
+        embed.add_field(name="🏗️ Niveaux de bâtiments", value=str(stats["building_levels"]), inline=True)
         
-        for building_id, building_info in available_buildings.items():
-            # Créer une description avec les coûts pour chaque niveau
-            description = f"**{building_info['description']}**\n\n"
-            
-            for level, level_info in building_info["niveaux"].items():
-                costs = ", ".join([f"{amount} {resource}" for resource, amount in level_info["cout"].items()])
-                description += f"**Niveau {level}:** {costs}\n*Bonus:* {level_info['bonus']}\n\n"
-                
+        await ctx.send(embed=embed)
+    except ValueError as e:
+        await ctx.send(f"❌ {str(e)}")
+    except Exception as e:
+        await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
+
+@bot.command()
+async def classement(ctx, critere: str = DEFAULT_BOARD, page: int = 1):
+    """Classement des factions : solde, une ressource ou batiments"""
+    try:
+        faction_manager = await guilds.get(ctx.guild)
+        if page < 1:
+            raise ValueError("Le numéro de page doit être positif !")
+        critere = critere.lower()
+        user_faction = faction_manager.get_user_faction(ctx.author)
+        ranking = faction_manager.leaderboards.ranking(critere, (page - 1) * PAGE_SIZE, PAGE_SIZE, user_faction)
+        unit = "monnaie générale" if critere == DEFAULT_BOARD else "niveaux" if critere == "batiments" else critere
+
+        def amount(value) -> str:
+            return f"{value:.2f}" if critere == DEFAULT_BOARD else str(value)
+
+        embed = discord.Embed(
+            title=f"🏆 Classement : {critere.capitalize()}",
+            color=discord.Color.gold()
+        )
+        if ranking.entries:
+            embed.description = "\n".join(
+                f"**{entry.rank}.** {entry.name} — {amount(entry.value)} {unit}" for entry in ranking.entries
+            )
+        else:
+            embed.description = "Aucune faction à cette page."
+        if ranking.own:
             embed.add_field(
-                name=f"{building_info['nom']} (`{building_id}`)",
-                value=description,
+                name="Votre faction",
+                value=f"#{ranking.own.rank} sur {ranking.total} — {amount(ranking.own.value)} {unit}",
                 inline=False
             )
-            
+        pages = max(1, -(-ranking.total // PAGE_SIZE))
+        embed.set_footer(text=f"Page {page}/{pages} — !classement {critere} <page>")
+
         await ctx.send(embed=embed)
+    except ValueError as e:
+        await ctx.send(f"❌ {str(e)}")
     except Exception as e:
         await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
 
 @bot.command()
-async def transfererressource(ctx, faction: str, ressource: str, montant: int):
-    """Transfère des ressources à une autre faction"""
+@commands.has_permissions(administrator=True)
+async def importer(ctx):
+    """[Admin] Applique un fichier CSV ou JSON joint (faction, champ, valeur, mode delta/absolu) en une seule fois"""
     try:
-        result = await faction_manager.transfer_resource(ctx.interaction, faction, ressource, montant)
+        faction_manager = await guilds.get(ctx.guild)
+        if not ctx.message.attachments:
+            raise ValueError("Joignez un fichier .csv, .json ou .jsonl à la commande !")
+        attachment = ctx.message.attachments[0]
+        fmt = detect_format(attachment.filename)
+        if attachment.size > MAX_IMPORT_BYTES:
+            raise ValueError(f"Fichier trop volumineux ! Taille maximale: {MAX_IMPORT_BYTES // (1024 * 1024)} Mo")
+        stream = io.BytesIO(await attachment.read())
+        result = await run_job(ctx, "importer", lambda: faction_manager.bulk_update(stream, fmt), LOW)
         await ctx.send(f"✅ {result}")
     except ValueError as e:
         await ctx.send(f"❌ {str(e)}")
     except Exception as e:
         await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
 
-# Exécution du bot avec le token depuis la variable d'environnement
-bot.run(os.getenv('DISCORD_TOKEN'))
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def exporter(ctx, format: str = "csv"):
+    """[Admin] Exporte les soldes et ressources de toutes les factions (csv ou json)"""
+    try:
+        faction_manager = await guilds.get(ctx.guild)
+        fp = await run_job(ctx, "exporter", lambda: faction_manager.export_economy(format.lower()), LOW)
+        with fp:
+            extension = "csv" if format.lower() == "csv" else "jsonl"
+            await ctx.send("✅ Export de l'économie", file=discord.File(fp, filename=f"economie.{extension}"))
+    except ValueError as e:
+        await ctx.send(f"❌ {str(e)}")
+    except Exception as e:
+        await ctx.send(f"❌ Une erreur s'est produite: {str(e)}")
+
+if __name__ == "__main__":
+    # Importer ce module (bancs d'essai) définit les commandes sans rien démarrer
+    if not USE_AIOHTTP:
+        # Le keep_alive démarre avant le bot ; le tableau de bord attend de connaître le serveur affiché
+        print("Démarrage du serveur keep_alive...")
+        keep_alive()
+        print("Serveur keep_alive démarré sur http://0.0.0.0:8080")
+
+    try:
+        # Exécution du bot avec le token depuis la variable d'environnement
+        bot.run(os.getenv('DISCORD_TOKEN'))
+    finally:
+        # Enregistre les dernières modifications en attente de tous les serveurs avant de quitter,
+        # même si le bot s'arrête sur une erreur
+        guilds.close()
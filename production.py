@@ -0,0 +1,44 @@
+from typing import Dict, Mapping, Tuple
+from building_catalog import BuildingCatalog
+
+SECONDS_PER_DAY = 86400
+
+
+def production_rates(catalog: BuildingCatalog, buildings: Mapping[str, int]) -> Dict[str, float]:
+    """Calcule la production journalière d'une faction à partir de ses bâtiments.
+
+    Les bâtiments producteurs (mine, scierie...) fournissent un vecteur de
+    production ; les bonus en pourcentage (quartier général, forge)
+    s'additionnent et multiplient l'ensemble.
+    """
+    resources = catalog.resources
+    base = [0] * len(resources)
+    bonus = 0
+    for building_id, level in buildings.items():
+        building = catalog.get(building_id)
+        level_info = building.level(level) if building else None
+        if level_info is None:
+            continue
+        for i, amount in enumerate(level_info.production_vector):
+            base[i] += amount
+        bonus += level_info.production_bonus
+    factor = 1 + bonus / 100
+    return {resource: amount * factor for resource, amount in zip(resources, base) if amount}
+
+
+def accrue(rates: Mapping[str, float], carry: Mapping[str, float],
+           elapsed: float) -> Tuple[Dict[str, int], Dict[str, float]]:
+    """Production accumulée en forme close sur `elapsed` secondes.
+
+    Renvoie les unités entières produites par ressource et les fractions
+    restantes, reportées au prochain calcul pour ne rien perdre.
+    """
+    gained = {}
+    remainder = {}
+    for resource, rate in rates.items():
+        total = rate * elapsed / SECONDS_PER_DAY + carry.get(resource, 0.0)
+        whole = int(total)
+        if whole:
+            gained[resource] = whole
+        remainder[resource] = total - whole
+    return gained, remainder
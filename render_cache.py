@@ -0,0 +1,56 @@
+import gzip
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, NamedTuple, Tuple
+
+
+class CachedPage(NamedTuple):
+    etag: str
+    last_modified: float
+    body: bytes
+    gzip_body: bytes
+
+
+class RenderCache:
+    """Pages rendues mises en cache par version des données.
+
+    Chaque page est rendue au plus une fois par version (celle du stockage
+    et, le cas échéant, du catalogue) et conservée en clair et compressée
+    en gzip. L'ETag est dérivé de la version : un client à jour reçoit un
+    304 sans rendu ni compression. Au-delà de `max_pages` pages (une par
+    combinaison de paramètres), les moins récemment servies sont oubliées.
+    """
+
+    def __init__(self, compress_level: int = 6, max_pages: int = 256):
+        self.compress_level = compress_level
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+        self._pages: "OrderedDict[str, Tuple[Hashable, CachedPage]]" = OrderedDict()
+
+    def get(self, name: str, version: Hashable, last_modified: float, render: Callable[[], str]) -> CachedPage:
+        """Renvoie la page `name` pour `version`, en la rendant si nécessaire"""
+        with self._lock:
+            cached = self._pages.get(name)
+            if cached and cached[0] == version:
+                self._pages.move_to_end(name)
+                return cached[1]
+        body = render().encode("utf-8")
+        tag = "-".join(str(part) for part in version) if isinstance(version, tuple) else str(version)
+        page = CachedPage(
+            # Le nom peut contenir des paramètres de requête : l'ETag n'en garde qu'une empreinte
+            etag=f"{zlib.crc32(name.encode('utf-8')):08x}-{tag}",
+            last_modified=last_modified,
+            body=body,
+            gzip_body=gzip.compress(body, self.compress_level)
+        )
+        with self._lock:
+            self._pages[name] = (version, page)
+            self._pages.move_to_end(name)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
@@ -1,29 +1,120 @@
-from flask import Flask, render_template
-import json
+import queue
+from flask import Flask, Response, jsonify, render_template, request
+from typing import Callable, Optional
+from dashboard import Dashboard
 from faction_manager import FactionManager
+from live_feed import HEARTBEAT_INTERVAL
 
 app = Flask(__name__)
-faction_manager = FactionManager()
+# Partagé avec le bot via start_server() : les pages lisent les instantanés immuables
+# publiés par son stockage, sans verrou ni accès disque
+faction_manager: Optional[FactionManager] = None
+dashboard: Optional[Dashboard] = None
+
+def cached_page(name: str, render: Callable[[], str]) -> Response:
+    """Sert une page rendue une seule fois par version des données, avec ETag, 304 et gzip"""
+    page = dashboard.cached(name, render)
+    if_none_match = request.if_none_match.contains if request.if_none_match else None
+    if dashboard.is_not_modified(page, if_none_match, request.if_modified_since):
+        response = Response(status=304)
+    elif "gzip" in request.accept_encodings:
+        response = Response(page.gzip_body, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(page.body, mimetype='text/html')
+    response.set_etag(page.etag)
+    response.last_modified = dashboard.last_modified(page)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Le navigateur garde la page mais revalide à chaque fois (réponse 304 quasi gratuite)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/')
 def home():
     """Page d'accueil"""
-    factions = faction_manager._load_factions()
-    return render_template('index.html', faction_count=len(factions))
+    return cached_page('index', lambda: render_template('index.html', **dashboard.home_context()))
 
 @app.route('/factions')
 def factions():
-    """Liste des factions"""
-    factions = faction_manager._load_factions()
-    return render_template('factions.html', factions=factions)
+    """Liste paginée des factions"""
+    return cached_page(
+        'factions?' + request.query_string.decode('utf-8', 'replace'),
+        lambda: render_template('factions.html', **dashboard.factions_context(request.args))
+    )
+
+@app.route('/api/factions')
+def api_factions():
+    """Factions au format JSON, triées, filtrées et paginées"""
+    try:
+        return jsonify(dashboard.factions_json(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/classement')
+def classement():
+    """Classement des factions par critère"""
+    return cached_page(
+        'classement?' + request.query_string.decode('utf-8', 'replace'),
+        lambda: render_template('classement.html', **dashboard.leaderboard_context(request.args))
+    )
+
+@app.route('/api/classement')
+def api_classement():
+    """Page d'un classement au format JSON, avec le rang d'une faction"""
+    try:
+        return jsonify(dashboard.leaderboard_json(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/quote')
+def quote():
+    """Cotation d'un transfert de monnaie entre deux factions"""
+    try:
+        return jsonify(dashboard.quote_json(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/stream')
+def stream():
+    """Flux Server-Sent Events des modifications de factions"""
+    subscription = dashboard.feed.subscribe()
+
+    def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = subscription.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            dashboard.feed.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/health')
+def health():
+    """État du service"""
+    return jsonify(dashboard.health())
 
 def run():
     """Démarre le serveur Flask"""
     app.run(host='0.0.0.0', port=5000)
 
-def start_server():
+def start_server(manager: Optional[FactionManager] = None):
     """Démarre le serveur dans un thread séparé"""
     from threading import Thread
+    global faction_manager, dashboard
+    if manager is None:
+        manager = FactionManager()
+        manager.start()
+    faction_manager = manager
+    dashboard = Dashboard(manager)
+    dashboard.feed.start()
     t = Thread(target=run)
     t.daemon = True
     t.start()